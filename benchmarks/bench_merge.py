@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Benchmark merging a per-file partial result into a growing global result.
+Compares `sum_dicts`, which copies both inputs, with the in place `merge_counts`
+and the array backed `EmojiCounts` merge. The cost of an in place merge should
+stay flat as the global result grows.
+
+-k  : Number of keys in each partial result
+-n  : Number of merges timed at each global size
+"""
+import argparse
+import random
+from timeit import default_timer as timer
+
+from twitter_search import get_catalog, merge_counts, sum_dicts
+from twitter_search.aggregate import EmojiTally
+
+GLOBAL_SIZES = (1000, 10000, 100000, 1000000)
+
+
+def parse_cli_args():
+    """Parse the CLI arguments for the benchmark.
+
+    Returns:
+        argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark merging of partial results",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "-k", "--keys", type=int, default=2000, help="Number of keys in each partial result"
+    )
+    parser.add_argument(
+        "-n", "--number", type=int, default=20, help="Number of merges timed at each global size"
+    )
+    return parser.parse_args()
+
+
+def time_merges(merge, make_global, partials):
+    """Average time of merging each partial into the global result.
+
+    Args:
+        merge (function): Takes the global result and a partial, returns the new global result
+        make_global (function): Builds a fresh global result
+        partials (list): Partial results
+
+    Returns:
+        float: Time per merge in ms
+    """
+    result = make_global()
+    start_t = timer()
+    for partial in partials:
+        result = merge(result, partial)
+    return (timer() - start_t) * 1e3 / len(partials)
+
+
+def run(keys, number):
+    """Time each merge method for each global size and print a table.
+
+    Args:
+        keys (int): Number of keys in each partial result
+        number (int): Number of merges timed at each global size
+    """
+    random.seed(0)
+    print("{:>10s} {:>16s} {:>16s}".format("global", "sum_dicts ms", "merge_counts ms"))
+    for size in GLOBAL_SIZES:
+        global_dict = {"k{}".format(i): 1 for i in range(size)}
+        partials = [
+            {"k{}".format(random.randrange(2 * size)): 1 for _ in range(keys)} for _ in range(number)
+        ]
+        t_sum = time_merges(sum_dicts, lambda: dict(global_dict), partials)
+        t_merge = time_merges(merge_counts, lambda: dict(global_dict), partials)
+        print("{:>10d} {:>16.3f} {:>16.3f}".format(size, t_sum, t_merge))
+
+    # Array backed counters have a fixed size so the merge cost is constant
+    field = EmojiTally()
+    n_emoji = len(get_catalog())
+    partials = []
+    for _ in range(number):
+        partial = field.new()
+        for _ in range(keys):
+            partial.add_id(random.randrange(n_emoji))
+        partials.append(partial)
+    t_array = time_merges(field.merge, field.new, partials)
+    print("EmojiCounts merge ({:d} emoji) : {:.3f} ms".format(n_emoji, t_array))
+
+
+if __name__ == "__main__":
+
+    args = parse_cli_args()
+    run(args.keys, args.number)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Benchmark the start up cost of the twitter_search package. Each repeat runs in a
+fresh interpreter so that nothing is cached between measurements. Exits with a
+non-zero status if the median of any phase exceeds its budget.
+
+Phases:
+    import      : Cold `import twitter_search`
+    catalog     : Construction of the shared `EmojiCatalog`
+    first_match : First call to `find_all` on an emoji tweet
+
+-n  : Number of fresh interpreters to run
+--budget-import      : Budget for the import phase (ms)
+--budget-catalog     : Budget for the catalog phase (ms)
+--budget-first-match : Budget for the first match phase (ms)
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# Code run in each fresh interpreter, prints the time of each phase in ms as json
+PHASES_SRC = """
+import json
+from timeit import default_timer as timer
+
+times = {}
+
+t0 = timer()
+import twitter_search
+times["import"] = (timer() - t0) * 1e3
+
+t0 = timer()
+twitter_search.get_catalog()
+times["catalog"] = (timer() - t0) * 1e3
+
+t0 = timer()
+twitter_search.find_all("first match \\U0001F52B in a tweet \\U0001F602\\U0001F602")
+times["first_match"] = (timer() - t0) * 1e3
+
+print(json.dumps(times))
+"""
+
+
+def parse_cli_args():
+    """Parse the CLI arguments for the benchmark.
+
+    Returns:
+        argparse.Namespace
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark twitter_search start up time",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "-n", "--repeats", type=int, default=7, help="Number of fresh interpreters to run"
+    )
+    parser.add_argument(
+        "--budget-import", type=float, default=250.0, help="Budget for the import phase (ms)"
+    )
+    parser.add_argument(
+        "--budget-catalog", type=float, default=50.0, help="Budget for the catalog phase (ms)"
+    )
+    parser.add_argument(
+        "--budget-first-match", type=float, default=5.0, help="Budget for the first match phase (ms)"
+    )
+    return parser.parse_args()
+
+
+def measure_once():
+    """Run all phases in a fresh interpreter.
+
+    Returns:
+        dict: Phase name to elapsed time in ms
+    """
+    output = subprocess.check_output([sys.executable, "-c", PHASES_SRC])
+    return json.loads(output.decode("utf-8").strip().splitlines()[-1])
+
+
+def run(repeats, budgets):
+    """Run the benchmark and compare the median of each phase to its budget.
+
+    Args:
+        repeats (int): Number of fresh interpreters to run
+        budgets (dict): Phase name to budget in ms
+
+    Returns:
+        bool: True if all phases are within budget
+    """
+    samples = [measure_once() for _ in range(repeats)]
+
+    ok = True
+    for phase, budget in budgets.items():
+        times = [s[phase] for s in samples]
+        median = statistics.median(times)
+        status = "ok" if median <= budget else "OVER BUDGET"
+        ok = ok and median <= budget
+        print(
+            "{:<12s}: median {:8.2f} ms  min {:8.2f} ms  budget {:8.2f} ms  {}".format(
+                phase, median, min(times), budget, status
+            )
+        )
+
+    return ok
+
+
+if __name__ == "__main__":
+
+    args = parse_cli_args()
+
+    BUDGETS = {
+        "import": args.budget_import,
+        "catalog": args.budget_catalog,
+        "first_match": args.budget_first_match,
+    }
+
+    if not run(args.repeats, BUDGETS):
+        sys.exit(1)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Extract a Twitter archive (from archive.org) once into a columnar store of the
+tweets with emoji and counts of the rest. Analyses run over the store with
+--extract instead of decompressing and parsing the archive again. Files with
+an up to date extract are skipped, so an interrupted extract can be rerun.
+
+-p  : Path to the Twitter archive
+-d  : How many days to extract (for testing)
+-hr : How many hours to extract (for testing)
+-o  : Directory of the extract store
+-n  : Number of worker processes
+"""
+import argparse
+from timeit import default_timer as timer
+
+from twitter_search.data import get_all_files
+from twitter_search.extract import build_extract
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Extract a Twitter archive (from archive.org)",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "-p",
+        "--data_path",
+        default="/your/data/path/archive-twitter-2016-08/",
+        help="Path to the Twitter archive",
+    )
+    parser.add_argument(
+        "-d", "--days", type=int, default=31, help="How many days to extract (for testing)"
+    )
+    parser.add_argument(
+        "-hr", "--hours", type=int, default=24, help="How many hours to extract (for testing)"
+    )
+    parser.add_argument(
+        "-o", "--output_dir", default="extract", help="Directory of the extract store"
+    )
+    parser.add_argument(
+        "-n",
+        "--processes",
+        type=int,
+        default=0,
+        help="Number of worker processes (0 for the cpu count)",
+    )
+    args = parser.parse_args()
+
+    start_t = timer()
+    filenames = get_all_files(args.data_path, days=args.days, hours=args.hours)
+    stats = build_extract(filenames, args.data_path, args.output_dir, args.processes)
+    print("Elapsed Time          : {:.2f} min".format((timer() - start_t) / 60))
+    print("Files Extracted       : {:d}".format(stats["files"]))
+    print("Files Up to Date      : {:d}".format(stats["skipped"]))
+    print("Total Tweets          : {:d}".format(stats["tweets"]))
+    print("Total Tweets w/ Emoji : {:d}".format(stats["tweets_wemoji"]))
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Search a Twitter archive (from archive.org) running the gun emoji and time emoji
+analyses together, so the archive is decompressed and parsed only once. Results
+of each analysis are saved to a subdirectory of the output directory.
+
+-p  : Path to the Twitter archive
+-d  : How many days to search (for testing)
+-hr : How many hours to search (for testing)
+--extract : Extract store (from extract_archive.py) to run over instead of the archive
+--sample : Fraction of tweets to sample, counts are saved scaled with estimates.csv of 95% intervals
+--sample_seed  : Seed of the sample
+--sample_files : Sample whole files instead of tweets
+-o  : Directory to save the results in
+-n  : Number of worker processes
+-b  : How many files each worker reduces before sending back results
+--autotune : Choose the processes (up to -n) and batch size from timed trials, saved to run_log.json
+--max_tasks    : Most tasks dispatched to the workers and not finished
+--max_unmerged : Most finished results waiting to be merged
+--max_rss      : Resident MB per worker above which fewer tasks are dispatched
+--producers : Decompress and parse processes of a staged pipeline
+--consumers : Analysis processes of a staged pipeline
+--workdir : Shared work directory to split the files between several nodes
+--node    : Unique name of this node
+-c  : File to save progress to every --checkpoint_files files or --checkpoint_seconds seconds
+--resume : Skip files completed in the checkpoint and continue from its results
+--cache  : Directory of per-file results to reuse for unchanged files
+"""
+from full_search_gun_emoji_analysis import GunAnalysis
+from full_search_time_in_emoji_analysis import MATCHES, TimeAnalysis
+from twitter_search.pipeline import MultiAnalysis, main
+from twitter_search.unicode_codes import EMOJI_UNICODE
+
+if __name__ == "__main__":
+
+    main(MultiAnalysis([GunAnalysis(EMOJI_UNICODE[":pistol:"]), TimeAnalysis(MATCHES)]))
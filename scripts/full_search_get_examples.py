@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Search a Twitter archive (from archive.org) for example English tweets of each
+pattern in `MATCHLIST`. Up to `MAX_EXAMPLES` examples of each pattern are
+sampled uniformly from the matches, and the search stops once every pattern
+has all its examples.
+
+-p  : Path to the Twitter archive
+-d  : How many days to search (for testing)
+-hr : How many hours to search (for testing)
+-o  : Directory to save the results in
+-n  : Number of worker processes
+--max_tasks    : Most tasks dispatched to the workers and not finished
+--max_unmerged : Most finished results waiting to be merged
+--max_rss      : Resident MB per worker above which fewer tasks are dispatched
+-c  : File to save progress to every --checkpoint_files files or --checkpoint_seconds seconds
+--resume : Skip files completed in the checkpoint and continue from its results
+--cache  : Directory of per-file results to reuse for unchanged files
+"""
+from twitter_search.examples import ExampleAnalysis
+from twitter_search.pipeline import main
+from twitter_search.unicode_codes import EMOJI_UNICODE
+
+# Character sequences to find examples of
+MATCHLIST = [
+    EMOJI_UNICODE[":pistol:"],
+    EMOJI_UNICODE[":face_without_mouth:"] + EMOJI_UNICODE[":pistol:"],
+    EMOJI_UNICODE[":upside-down_face:"] + EMOJI_UNICODE[":pistol:"],
+    EMOJI_UNICODE[":police_officer:"] + EMOJI_UNICODE[":pistol:"],
+    EMOJI_UNICODE[":pistol:"] + EMOJI_UNICODE[":police_officer:"],
+    EMOJI_UNICODE[":kitchen_knife:"] + EMOJI_UNICODE[":pistol:"] + EMOJI_UNICODE[":bomb:"],
+    EMOJI_UNICODE[":rooster:"] + EMOJI_UNICODE[":pistol:"],
+    EMOJI_UNICODE[":collision:"] + EMOJI_UNICODE[":pistol:"],
+    EMOJI_UNICODE[":broken_heart:"] + EMOJI_UNICODE[":pistol:"],
+]
+
+# Examples kept of each pattern
+MAX_EXAMPLES = 200
+
+if __name__ == "__main__":
+
+    main(ExampleAnalysis(MATCHLIST, MAX_EXAMPLES))
@@ -7,20 +7,39 @@ occur before and after a chosen target. Also counts total number of emoji charac
 -p  : Path to the Twitter archive
 -d  : How many days to search (for testing)
 -hr : How many hours to search (for testing)
+--extract : Extract store (from extract_archive.py) to run over instead of the archive
+--sample : Fraction of tweets to sample, counts are saved scaled with estimates.csv of 95% intervals
+--sample_seed  : Seed of the sample
+--sample_files : Sample whole files instead of tweets
+-o  : Directory to save the results in
+-n  : Number of worker processes
+-b  : How many files each worker reduces before sending back results
+--autotune : Choose the processes (up to -n) and batch size from timed trials, saved to run_log.json
+--max_tasks    : Most tasks dispatched to the workers and not finished
+--max_unmerged : Most finished results waiting to be merged
+--max_rss      : Resident MB per worker above which fewer tasks are dispatched
+-s  : Aggregate emoji counters in shared memory instead of sending them back
+--producers : Decompress and parse processes of a staged pipeline
+--consumers : Analysis processes of a staged pipeline
+--workdir : Shared work directory to split the files between several nodes
+--node    : Unique name of this node
+-c  : File to save progress to every --checkpoint_files files or --checkpoint_seconds seconds
+--resume : Skip files completed in the checkpoint and continue from its results
+--cache  : Directory of per-file results to reuse for unchanged files
 """
-import argparse
-import multiprocessing
-from timeit import default_timer as timer
+import os
 
 import pandas as pd
-from tqdm import tqdm
 
-from twitter_search import find_all, find_context, sum_dicts
-from twitter_search.data import get_all_files, read_zip, unpack_files
+from twitter_search import find_all, find_context, get_catalog
+from twitter_search.aggregate import EmojiTally, Results, Tally, Total
+from twitter_search.ngrams import NgramTally
+from twitter_search.pipeline import Analysis, main
+from twitter_search.sketch import EmojiDistinctTally, TopKTally
 from twitter_search.unicode_codes import EMOJI_UNICODE
 
 
-class Results:
+class GunResults(Results):
 
     """Search results data class.
 
@@ -30,205 +49,166 @@ class Results:
         counter_total_match (int): Total number of tweets with the match character
         counter_total_tweets (int): Total number of tweets
         counter_total_tweets_wemoji (int): Total number of tweets with any emoji
-        counterdict_after (dict): Distribution of emoji after the match character
-        counterdict_before (dict): Distribution of emoji before the match character
-        counterdict_lang (dict): Distribution of tweet languages
-        counterdict_all_emoji (dict): Distribution of all emoji
+        counterdict_after (EmojiCounts): Distribution of emoji after the match character
+        counterdict_before (EmojiCounts): Distribution of emoji before the match character
+        counterdict_lang (Counts): Distribution of tweet languages
+        counterdict_all_emoji (EmojiCounts): Distribution of all emoji
+        topk_word_before (SpaceSaving): Most common words before the match word
+        topk_word_after (SpaceSaving): Most common words after the match word
+        distinct_users_emoji (EmojiHyperLogLogs): Approximate number of distinct users using each emoji
+        distinct_tweets_emoji (EmojiHyperLogLogs): Approximate number of distinct tweets with each emoji
+        ngrams_emoji (EmojiNgrams): Distribution of adjacent emoji bigrams and trigrams
     """
 
-    def __init__(self):
-        """Initialize all counters to 0 and counter dicts to be empty."""
-        self.counter_total_tweets = 0
-        self.counter_total_tweets_wemoji = 0
-        self.counter_total_match = 0
-        self.counter_total_before = 0
-        self.counter_total_after = 0
+    counter_total_tweets = Total()
+    counter_total_tweets_wemoji = Total()
+    counter_total_match = Total()
+    counter_total_before = Total()
+    counter_total_after = Total()
 
-        self.counterdict_before = {}
-        self.counterdict_after = {}
-        self.counterdict_lang = {}
-        self.counterdict_all_emoji = {}
+    counterdict_before = EmojiTally()
+    counterdict_after = EmojiTally()
+    counterdict_lang = Tally()
+    counterdict_all_emoji = EmojiTally()
 
+    topk_word_before = TopKTally()
+    topk_word_after = TopKTally()
 
-def worker(filename):
-    """The worker function, invoked in a process.
+    distinct_users_emoji = EmojiDistinctTally()
+    distinct_tweets_emoji = EmojiDistinctTally()
 
-    Args:
-        filename (str): Zipped file of tweets to process
+    ngrams_emoji = NgramTally()
 
-    Returns:
-        Results
+
+class GunAnalysis(Analysis):
+
+    """Context of a target character and distribution of all emoji.
+
+    Attributes:
+        match (str): Character to match
     """
-    results = Results()
 
-    for tweet in read_zip(filename):
+    name = "gun"
+    results_class = GunResults
+
+    def __init__(self, match):
+        """Set the character to match.
 
+        Args:
+            match (str)
+        """
+        self.match = match
+
+    def process(self, tweet, results):
+        """Adds one tweet to the results.
+
+        Args:
+            tweet (dict): Decoded tweet
+            results (GunResults): Updated in place
+        """
         # Count total number of tweets
         results.counter_total_tweets += 1
 
         # Count total numbers of emoji in tweet
         all_emoji, all_count = find_all(tweet["text"])
         if not all_emoji:
-            continue
+            return
         results.counter_total_tweets_wemoji += 1
-        for i, c in enumerate(all_emoji):
-            if c in results.counterdict_all_emoji.keys():
-                results.counterdict_all_emoji[c] += all_count[i]
-            else:
-                results.counterdict_all_emoji[c] = all_count[i]
+        for c, n in zip(all_emoji, all_count):
+            results.counterdict_all_emoji.add(c, n)
+        # Tweets and users without an id, e.g. in an extract, are not counted as distinct
+        tweet_id = tweet.get("id")
+        if tweet_id is not None:
+            results.distinct_tweets_emoji.add_many(all_emoji, tweet_id)
+        user_id = (tweet.get("user") or {}).get("id")
+        if user_id is not None:
+            results.distinct_users_emoji.add_many(all_emoji, user_id)
+        results.ngrams_emoji.add_text(tweet["text"])
 
         # Count number and context of match emoji
-        if MATCH in all_emoji:
+        if self.match in all_emoji:
             results.counter_total_match += 1
-            result = find_context(tweet["text"], MATCH)
+            result = find_context(tweet["text"], self.match)
+            catalog = get_catalog()
 
             # Before match
-            if result[0] in EMOJI_UNICODE.values():
+            if result[0] in catalog:
                 results.counter_total_before += 1
-
-                if result[0] in results.counterdict_before.keys():
-                    results.counterdict_before[result[0]] += 1
-                else:
-                    results.counterdict_before[result[0]] = 1
+                results.counterdict_before.add(result[0])
             # After match
-            if result[2] in EMOJI_UNICODE.values():
+            if result[2] in catalog:
                 results.counter_total_after += 1
-
-                if result[2] in results.counterdict_after.keys():
-                    results.counterdict_after[result[2]] += 1
-                else:
-                    results.counterdict_after[result[2]] = 1
-
-            try:
-                if tweet["lang"] in results.counterdict_lang.keys():
-                    results.counterdict_lang[tweet["lang"]] += 1
-                else:
-                    results.counterdict_lang[tweet["lang"]] = 1
-            except KeyError:
-                continue
-
-    return results
-
-
-def parse_cli_args():
-    """Parse the require CLI arguments for the run.
-
-    Returns:
-        argparse.Namespace
-    """
-    parser = argparse.ArgumentParser(
-        description="Search a Twitter archive (from archive.org)",
-        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
-    )
-    parser.add_argument(
-        "-p",
-        "--data_path",
-        default="/your/data/path/archive-twitter-2016-08/",
-        help="Path to the Twitter archive",
-    )
-    parser.add_argument(
-        "-d", "--days", type=int, default=31, help="How many days to search (for testing)"
-    )
-    parser.add_argument(
-        "-hr", "--hours", type=int, default=24, help="How many hours to search (for testing)"
-    )
-    parser.add_argument(
-        "-u", "--unpack", default=False, action="store_true", help="Unpack tar files"
-    )
-    return parser.parse_args()
-
-
-def run():
-    """Run the full search.
-
-    Returns:
-        Results
-    """
-    start_t = timer()
-    # Global counters
-    results_global = Results()
-    # Set multiprocessing cpu count
-    number_of_processes = multiprocessing.cpu_count()
-    multiprocessing.freeze_support()  # Prevent an error on Windows
-    # Create pool of processes
-    pool = multiprocessing.Pool(number_of_processes)
-    try:
-        # Run worker functions and use tqdm progress bar
-        processes = pool.imap_unordered(worker, all_files, chunksize=10)
-        for results in tqdm(processes, total=len(all_files), unit="files"):
-            if results is None:
-                continue
-            # Update all global counters
-            results_global.counter_total_tweets += results.counter_total_tweets
-            results_global.counter_total_tweets_wemoji += results.counter_total_tweets_wemoji
-            results_global.counter_total_match += results.counter_total_match
-            results_global.counter_total_before += results.counter_total_before
-            results_global.counter_total_after += results.counter_total_after
-            results_global.counterdict_before = sum_dicts(
-                results_global.counterdict_before, results.counterdict_before
-            )
-            results_global.counterdict_after = sum_dicts(
-                results_global.counterdict_after, results.counterdict_after
-            )
-            results_global.counterdict_lang = sum_dicts(
-                results_global.counterdict_lang, results.counterdict_lang
-            )
-            results_global.counterdict_all_emoji = sum_dicts(
-                results_global.counterdict_all_emoji, results.counterdict_all_emoji
-            )
-
-    except KeyboardInterrupt:
-        print("KeyboardInterrupt")
-    finally:
-        pool.terminate()
-        pool.join()
-    end_t = timer()
-    # Print outputs of the search run
-    print("Elapsed Time          : {:.2f} min".format((end_t - start_t) / 60))
-    print("Total Tweets          : {:d}".format(results_global.counter_total_tweets))
-    print("Total Tweets w/ Emoji : {:d}".format(results_global.counter_total_tweets_wemoji))
-    print("Total Matches         : {:d}".format(results_global.counter_total_match))
-    print("Total w/ Before       : {:d}".format(results_global.counter_total_before))
-    print("Total w/ After        : {:d}".format(results_global.counter_total_after))
-
-    return results_global
-
-
-def save_results(results):
-    """Save results to csv."""
-    # Convert output to dataframe
-    df_before = pd.DataFrame(
-        list(results.counterdict_before.items()), columns=["Emoji", "CountBefore"]
-    )
-    df_after = pd.DataFrame(
-        list(results.counterdict_after.items()), columns=["Emoji", "CountAfter"]
-    )
-    df_lang = pd.DataFrame(list(results.counterdict_lang.items()), columns=["Lang", "Count"])
-    df_allemoji = pd.DataFrame(
-        list(results.counterdict_all_emoji.items()), columns=["Emoji", "Count"]
-    )
-
-    # Merge before and after dataframes
-    df_all = pd.merge(df_before, df_after, on="Emoji", how="outer")
-
-    # Export results as CSV files
-    df_all.to_csv("./alldata.csv", encoding="utf-8")
-    df_lang.to_csv("./langdata.csv", encoding="utf-8")
-    df_allemoji.to_csv("./allemojidata.csv", encoding="utf-8")
+                results.counterdict_after.add(result[2])
+            # Words next to the match word, which an extract does not keep
+            if "extract" not in tweet:
+                if result[1] is not None:
+                    results.topk_word_before.add(result[1])
+                if result[3] is not None:
+                    results.topk_word_after.add(result[3])
+
+            if "lang" in tweet:
+                results.counterdict_lang.add(tweet["lang"])
+
+    def process_many(self, tweet, n, results):
+        """Adds n copies of one tweet, counting tweets without emoji directly."""
+        if find_all(tweet["text"])[0]:
+            super().process_many(tweet, n, results)
+        else:
+            results.counter_total_tweets += n
+
+    def summary(self, results):
+        return [
+            ("Total Tweets", results.counter_total_tweets),
+            ("Total Tweets w/ Emoji", results.counter_total_tweets_wemoji),
+            ("Total Matches", results.counter_total_match),
+            ("Total w/ Before", results.counter_total_before),
+            ("Total w/ After", results.counter_total_after),
+        ]
+
+    def save(self, results, output_dir="."):
+        """Save results to csv."""
+        # Convert output to dataframe
+        df_before = pd.DataFrame(
+            list(results.counterdict_before.items()), columns=["Emoji", "CountBefore"]
+        )
+        df_after = pd.DataFrame(
+            list(results.counterdict_after.items()), columns=["Emoji", "CountAfter"]
+        )
+        df_lang = pd.DataFrame(list(results.counterdict_lang.items()), columns=["Lang", "Count"])
+        df_allemoji = pd.DataFrame(
+            list(results.counterdict_all_emoji.items()), columns=["Emoji", "Count"]
+        )
+        df_distinct_users = pd.DataFrame(
+            results.distinct_users_emoji.items(), columns=["Emoji", "DistinctUsers"]
+        )
+        df_distinct_tweets = pd.DataFrame(
+            results.distinct_tweets_emoji.items(), columns=["Emoji", "DistinctTweets"]
+        )
+        df_ngrams = pd.DataFrame(results.ngrams_emoji.top(), columns=["Ngram", "Count"])
+        df_words_before = pd.DataFrame(
+            results.topk_word_before.top(), columns=["Word", "CountBefore", "Error"]
+        )
+        df_words_after = pd.DataFrame(
+            results.topk_word_after.top(), columns=["Word", "CountAfter", "Error"]
+        )
+
+        # Merge before and after dataframes
+        df_all = pd.merge(df_before, df_after, on="Emoji", how="outer")
+
+        # Merge distinct users and tweets dataframes
+        df_distinct = pd.merge(df_distinct_users, df_distinct_tweets, on="Emoji", how="outer")
+
+        # Export results as CSV files
+        df_all.to_csv(os.path.join(output_dir, "alldata.csv"), encoding="utf-8")
+        df_lang.to_csv(os.path.join(output_dir, "langdata.csv"), encoding="utf-8")
+        df_allemoji.to_csv(os.path.join(output_dir, "allemojidata.csv"), encoding="utf-8")
+        df_distinct.to_csv(os.path.join(output_dir, "distinctemojidata.csv"), encoding="utf-8")
+        df_ngrams.to_csv(os.path.join(output_dir, "emojingrams.csv"), encoding="utf-8")
+        df_words_before.to_csv(os.path.join(output_dir, "wordsbefore.csv"), encoding="utf-8")
+        df_words_after.to_csv(os.path.join(output_dir, "wordsafter.csv"), encoding="utf-8")
 
 
 if __name__ == "__main__":
 
-    args = parse_cli_args()
-
     # Character to match
-    MATCH = EMOJI_UNICODE[":pistol:"]
-
-    # Unpack and list all files
-    if args.unpack:
-        unpack_files(args.data_path)
-    all_files = get_all_files(args.data_path, days=args.days, hours=args.hours)
-
-    # Main search loop
-    RESULTS_GLOBAL = run()
-    save_results(RESULTS_GLOBAL)
+    main(GunAnalysis(EMOJI_UNICODE[":pistol:"]))
@@ -7,20 +7,42 @@ Finds distributions of those and all other emoji in the tweets.
 -p  : Path to the Twitter archive
 -d  : How many days to search (for testing)
 -hr : How many hours to search (for testing)
+--extract : Extract store (from extract_archive.py) to run over instead of the archive
+--sample : Fraction of tweets to sample, counts are saved scaled with estimates.csv of 95% intervals
+--sample_seed  : Seed of the sample
+--sample_files : Sample whole files instead of tweets
+-o  : Directory to save the results in
+-n  : Number of worker processes
+-b  : How many files each worker reduces before sending back results
+--autotune : Choose the processes (up to -n) and batch size from timed trials, saved to run_log.json
+--max_tasks    : Most tasks dispatched to the workers and not finished
+--max_unmerged : Most finished results waiting to be merged
+--max_rss      : Resident MB per worker above which fewer tasks are dispatched
+-s  : Aggregate emoji counters in shared memory instead of sending them back
+--producers : Decompress and parse processes of a staged pipeline
+--consumers : Analysis processes of a staged pipeline
+--workdir : Shared work directory to split the files between several nodes
+--node    : Unique name of this node
+-c  : File to save progress to every --checkpoint_files files or --checkpoint_seconds seconds
+--resume : Skip files completed in the checkpoint and continue from its results
+--cache  : Directory of per-file results to reuse for unchanged files
 """
-import argparse
-import multiprocessing
-from timeit import default_timer as timer
+import os
+import time
 
 import pandas as pd
-from tqdm import tqdm
 
-from twitter_search import find_all, find_all_if, sum_dicts
-from twitter_search.data import get_all_files, read_zip, unpack_files
+from twitter_search import find_all, find_all_if
+from twitter_search.aggregate import EmojiTally, FoldedEmojiTally, Results, Tally, Total
+from twitter_search.cooccurrence import CooccurrenceTally
+from twitter_search.cube import CubeTally
+from twitter_search.data import tweet_time
+from twitter_search.pipeline import Analysis, main
+from twitter_search.timeseries import HOUR, BucketedEmojiTally, TimeTally
 from twitter_search.unicode_codes import EMOJI_UNICODE
 
 
-class Results:
+class TimeResults(Results):
 
     """Search results data class.
 
@@ -28,320 +50,231 @@ class Results:
         counter_total_match (int): Total number of tweets with a match character
         counter_total_tweets (int): Total number of tweets
         counter_total_tweets_wemoji (int): Total number of tweets with any emoji
-        counterdict_lang (dict): Distribution of tweet languages
-        counterdict_all_emoji (dict): Distribution of all emoji
-        counterdict_all_emoji_if_match (dict): Distribution of all emoji when match is found
+        counterdict_lang (Counts): Distribution of tweet languages
+        counterdict_all_emoji (EmojiCounts): Distribution of all emoji
+        counterdict_all_emoji_views (FoldedEmojiCounts): Distribution of all emoji as written
+            and with skin tones and variation selectors folded to the base emoji
+        counterdict_all_emoji_if_match (EmojiCounts): Distribution of all emoji when match is found
+        counterdict_all_emoji_if_<group> (EmojiCounts): Distribution of all emoji when
+            a match from that group is found
+        cooccurrence_emoji (CooccurrenceMatrix): Number of tweets with each pair of emoji
+        timeseries_tweets (Counts): Number of tweets in each hour
+        timeseries_all_emoji (BucketedEmojiCounts): Distribution of all emoji in each hour
+        cube_lang_emoji (AggregateCube): Distribution of all emoji per language and hour
     """
 
-    def __init__(self):
-        """Initialize all counters to 0 and counter dicts to be empty."""
-        self.counter_total_tweets = 0
-        self.counter_total_tweets_wemoji = 0
-        self.counter_total_match = 0
+    counter_total_tweets = Total()
+    counter_total_tweets_wemoji = Total()
+    counter_total_match = Total()
 
-        self.counterdict_lang = {}
-        self.counterdict_all_emoji = {}
-        self.counterdict_all_emoji_if_match = {}
+    counterdict_lang = Tally()
+    counterdict_all_emoji = EmojiTally()
+    counterdict_all_emoji_views = FoldedEmojiTally()
+    counterdict_all_emoji_if_match = EmojiTally()
 
-        self.counterdict_all_emoji_if_clockfaces = {}
-        self.counterdict_all_emoji_if_hourglasses = {}
-        self.counterdict_all_emoji_if_soon = {}
-        self.counterdict_all_emoji_if_watch = {}
-        self.counterdict_all_emoji_if_stopwatch = {}
-        self.counterdict_all_emoji_if_mantelpiece_clock = {}
-        self.counterdict_all_emoji_if_timer_clock = {}
-        self.counterdict_all_emoji_if_alarm_clock = {}
+    counterdict_all_emoji_if_clockfaces = EmojiTally()
+    counterdict_all_emoji_if_hourglasses = EmojiTally()
+    counterdict_all_emoji_if_soon = EmojiTally()
+    counterdict_all_emoji_if_watch = EmojiTally()
+    counterdict_all_emoji_if_stopwatch = EmojiTally()
+    counterdict_all_emoji_if_mantelpiece_clock = EmojiTally()
+    counterdict_all_emoji_if_timer_clock = EmojiTally()
+    counterdict_all_emoji_if_alarm_clock = EmojiTally()
 
-    def add_to(self, key, val, attr):
-        """Adds a value to an given dictionary key for a given attribiute of the class.
+    cooccurrence_emoji = CooccurrenceTally()
 
-        Args:
-            key (str)
-            val (int)
-            attr (str)
-        """
-        d = getattr(self, attr)
-        if key in d.keys():
-            d[key] += val
-        else:
-            d[key] = val
-        setattr(self, attr, d)
+    timeseries_tweets = TimeTally()
+    timeseries_all_emoji = BucketedEmojiTally()
+    cube_lang_emoji = CubeTally()
 
 
-def worker(filename):
-    """The worker function, invoked in a process.
+def format_time(t):
+    """Format seconds since the epoch as a UTC date and time.
 
     Args:
-        filename (str): Zipped file of tweets to process
+        t (int)
 
     Returns:
-        Results
+        str
+    """
+    return time.strftime("%Y-%m-%d %H:%M", time.gmtime(t))
+
+
+class TimeAnalysis(Analysis):
+
+    """Distributions of time related characters and all other emoji.
+
+    Attributes:
+        matches (dict): Group name to the characters to match
+        matches_all (List[str]): Characters of all groups
     """
-    results = Results()
 
-    for tweet in read_zip(filename):
+    name = "time"
+    results_class = TimeResults
 
+    def __init__(self, matches):
+        """Set the characters to match.
+
+        Args:
+            matches (dict): Group name to the characters to match, each group needs a
+                counterdict_all_emoji_if_<group> field
+        """
+        self.matches = matches
+        self.matches_all = [emoji for lst in matches.values() for emoji in lst]
+
+    def process(self, tweet, results):
+        """Adds one tweet to the results.
+
+        Args:
+            tweet (dict): Decoded tweet
+            results (TimeResults): Updated in place
+        """
         # Count total number of tweets
         results.counter_total_tweets += 1
+        t = tweet_time(tweet)
+        if t is not None:
+            results.timeseries_tweets.add(t - t % HOUR)
 
         # Count total numbers of emoji in tweet
         all_emoji, all_count = find_all(tweet["text"])
         if not all_emoji:
-            continue
+            return
         results.counter_total_tweets_wemoji += 1
-        for i, c in enumerate(all_emoji):
-            if c in results.counterdict_all_emoji.keys():
-                results.counterdict_all_emoji[c] += all_count[i]
-            else:
-                results.counterdict_all_emoji[c] = all_count[i]
+        for c, n in zip(all_emoji, all_count):
+            results.counterdict_all_emoji.add(c, n)
+        results.counterdict_all_emoji_views.add_text(tweet["text"])
+        results.cooccurrence_emoji.add(all_emoji)
+        if t is not None:
+            results.timeseries_all_emoji.add_many(t, all_emoji, all_count)
+            results.cube_lang_emoji.add_many(tweet.get("lang"), t, all_emoji, all_count)
 
         # Count total numbers of emoji in tweet when there is a match
-        all_emoji, all_count = find_all_if(tweet["text"], MATCHES_ALL)
+        all_emoji, all_count = find_all_if(tweet["text"], self.matches_all)
         if not all_emoji:
-            continue
+            return
         results.counter_total_match += 1
-        for i, c in enumerate(all_emoji):
-            if c in results.counterdict_all_emoji_if_match.keys():
-                results.counterdict_all_emoji_if_match[c] += all_count[i]
-            else:
-                results.counterdict_all_emoji_if_match[c] = all_count[i]
-
-        try:
-            if tweet["lang"] in results.counterdict_lang.keys():
-                results.counterdict_lang[tweet["lang"]] += 1
-            else:
-                results.counterdict_lang[tweet["lang"]] = 1
-        except KeyError:
-            continue
+        for c, n in zip(all_emoji, all_count):
+            results.counterdict_all_emoji_if_match.add(c, n)
+
+        if "lang" not in tweet:
+            return
+        results.counterdict_lang.add(tweet["lang"])
 
         # Count total numbers of emoji in tweet for each match subset
-        for group in MATCHES:
-            all_emoji, all_count = find_all_if(tweet["text"], MATCHES[group])
+        for group in self.matches:
+            all_emoji, all_count = find_all_if(tweet["text"], self.matches[group])
             if not all_emoji:
                 continue
-            for i, c in enumerate(all_emoji):
-                attr_name = "counterdict_all_emoji_if_{}".format(group)
-                results.add_to(c, all_count[i], attr_name)
-
-    return results
-
-
-def parse_cli_args():
-    """Parse the require CLI arguments for the run.
-
-    Returns:
-        argparse.Namespace
-    """
-    parser = argparse.ArgumentParser(
-        description="Search a Twitter archive (from archive.org)",
-        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
-    )
-    parser.add_argument(
-        "-p",
-        "--data_path",
-        default="/your/data/path/archive-twitter-2016-08/",
-        help="Path to the Twitter archive",
-    )
-    parser.add_argument(
-        "-d", "--days", type=int, default=31, help="How many days to search (for testing)"
-    )
-    parser.add_argument(
-        "-hr", "--hours", type=int, default=24, help="How many hours to search (for testing)"
-    )
-    parser.add_argument(
-        "-u", "--unpack", default=False, action="store_true", help="Unpack tar files"
-    )
-    return parser.parse_args()
-
-
-def run():
-    """Run the full search.
-
-    Returns:
-        Results
-    """
-    start_t = timer()
-    # Global counters
-    results_global = Results()
-    # Set multiprocessing cpu count
-    number_of_processes = multiprocessing.cpu_count()
-    multiprocessing.freeze_support()  # Prevent an error on Windows
-    # Create pool of processes
-    pool = multiprocessing.Pool(number_of_processes)
-    try:
-        # Run worker functions and use tqdm progress bar
-        processes = pool.imap_unordered(worker, all_files, chunksize=10)
-        for results in tqdm(processes, total=len(all_files), unit="files"):
-            if results is None:
-                continue
-            # Update all global counters
-            results_global.counter_total_tweets += results.counter_total_tweets
-            results_global.counter_total_tweets_wemoji += results.counter_total_tweets_wemoji
-            results_global.counter_total_match += results.counter_total_match
-
-            results_global.counterdict_lang = sum_dicts(
-                results_global.counterdict_lang, results.counterdict_lang
-            )
-            results_global.counterdict_all_emoji = sum_dicts(
-                results_global.counterdict_all_emoji, results.counterdict_all_emoji
-            )
-            results_global.counterdict_all_emoji_if_match = sum_dicts(
-                results_global.counterdict_all_emoji_if_match,
-                results.counterdict_all_emoji_if_match
+            counts = getattr(results, "counterdict_all_emoji_if_{}".format(group))
+            for c, n in zip(all_emoji, all_count):
+                counts.add(c, n)
+
+    def process_many(self, tweet, n, results):
+        """Adds n copies of one tweet, counting tweets without emoji directly."""
+        if find_all(tweet["text"])[0]:
+            super().process_many(tweet, n, results)
+            return
+        results.counter_total_tweets += n
+        t = tweet_time(tweet)
+        if t is not None:
+            results.timeseries_tweets.add(t - t % HOUR, n)
+
+    def summary(self, results):
+        return [
+            ("Total Tweets", results.counter_total_tweets),
+            ("Total Tweets w/ Emoji", results.counter_total_tweets_wemoji),
+            ("Total Tweets w/ Match", results.counter_total_match),
+        ]
+
+    def save(self, results, output_dir="."):
+        """Save results to csv."""
+        # Convert output to dataframe
+        df_lang = pd.DataFrame(list(results.counterdict_lang.items()), columns=["Lang", "Count"])
+        df_allemoji = pd.DataFrame(
+            list(results.counterdict_all_emoji.items()), columns=["Emoji", "Count"]
+        )
+        views = results.counterdict_all_emoji_views
+        raw, folded = dict(views.raw.items()), dict(views.folded.items())
+        df_allemoji_views = pd.DataFrame(
+            [(c, raw.get(c, 0), folded.get(c, 0)) for c in sorted(set(raw) | set(folded))],
+            columns=["Emoji", "Raw", "Folded"],
+        )
+        df_allemoji_match = pd.DataFrame(
+            list(results.counterdict_all_emoji_if_match.items()), columns=["Emoji", "Count"]
+        )
+
+        df_tweets_hourly = pd.DataFrame(
+            [(format_time(t), n) for t, n in sorted(results.timeseries_tweets.items())],
+            columns=["Time", "Count"],
+        )
+        df_allemoji_hourly = pd.DataFrame(
+            [(format_time(t), c, n) for t, c, n in results.timeseries_all_emoji.items()],
+            columns=["Time", "Emoji", "Count"],
+        )
+
+        # Export results as CSV files
+        df_lang.to_csv(os.path.join(output_dir, "langdata.csv"), encoding="utf-8")
+        df_tweets_hourly.to_csv(os.path.join(output_dir, "tweetdata_hourly.csv"), encoding="utf-8")
+        df_allemoji_hourly.to_csv(os.path.join(output_dir, "allemojidata_hourly.csv"), encoding="utf-8")
+        df_allemoji.to_csv(os.path.join(output_dir, "allemojidata.csv"), encoding="utf-8")
+        df_allemoji_views.to_csv(os.path.join(output_dir, "allemojidata_folded.csv"), encoding="utf-8")
+        df_allemoji_match.to_csv(os.path.join(output_dir, "allemojidatamatch.csv"), encoding="utf-8")
+
+        results.cooccurrence_emoji.save(os.path.join(output_dir, "emojicooccurrence.bin"))
+        results.cube_lang_emoji.save(os.path.join(output_dir, "emojicube.bin"))
+
+        for group in self.matches:
+            counts = getattr(results, "counterdict_all_emoji_if_{}".format(group))
+            df_allemoji_group = pd.DataFrame(list(counts.items()), columns=["Emoji", "Count"])
+            df_allemoji_group.to_csv(
+                os.path.join(output_dir, "allemojidatamatch_{}.csv".format(group)), encoding="utf-8"
             )
 
-            results_global.counterdict_all_emoji_if_clockfaces = sum_dicts(
-                results_global.counterdict_all_emoji_if_clockfaces,
-                results.counterdict_all_emoji_if_clockfaces
-            )
-            results_global.counterdict_all_emoji_if_hourglasses = sum_dicts(
-                results_global.counterdict_all_emoji_if_hourglasses,
-                results.counterdict_all_emoji_if_hourglasses
-            )
-            results_global.counterdict_all_emoji_if_soon = sum_dicts(
-                results_global.counterdict_all_emoji_if_soon,
-                results.counterdict_all_emoji_if_soon
-            )
-            results_global.counterdict_all_emoji_if_watch = sum_dicts(
-                results_global.counterdict_all_emoji_if_watch,
-                results.counterdict_all_emoji_if_watch
-            )
-            results_global.counterdict_all_emoji_if_stopwatch = sum_dicts(
-                results_global.counterdict_all_emoji_if_stopwatch,
-                results.counterdict_all_emoji_if_stopwatch
-            )
-            results_global.counterdict_all_emoji_if_mantelpiece_clock = sum_dicts(
-                results_global.counterdict_all_emoji_if_mantelpiece_clock,
-                results.counterdict_all_emoji_if_mantelpiece_clock
-            )
-            results_global.counterdict_all_emoji_if_timer_clock = sum_dicts(
-                results_global.counterdict_all_emoji_if_timer_clock,
-                results.counterdict_all_emoji_if_timer_clock
-            )
-            results_global.counterdict_all_emoji_if_alarm_clock = sum_dicts(
-                results_global.counterdict_all_emoji_if_alarm_clock,
-                results.counterdict_all_emoji_if_alarm_clock
-            )
 
-    except KeyboardInterrupt:
-        print("KeyboardInterrupt")
-    finally:
-        pool.terminate()
-        pool.join()
-    end_t = timer()
-    # Print outputs of the search run
-    print("Elapsed Time          : {:.2f} min".format((end_t - start_t) / 60))
-    print("Total Tweets          : {:d}".format(results_global.counter_total_tweets))
-    print("Total Tweets w/ Emoji : {:d}".format(results_global.counter_total_tweets_wemoji))
-    print("Total Tweets w/ Match : {:d}".format(results_global.counter_total_match))
-
-    return results_global
-
-
-def save_results(results):
-    """Save results to csv."""
-    # Convert output to dataframe
-    df_lang = pd.DataFrame(list(results.counterdict_lang.items()), columns=["Lang", "Count"])
-    df_allemoji = pd.DataFrame(
-        list(results.counterdict_all_emoji.items()), columns=["Emoji", "Count"]
-    )
-    df_allemoji_match = pd.DataFrame(
-        list(results.counterdict_all_emoji_if_match.items()), columns=["Emoji", "Count"]
-    )
-
-    df_allemoji_clockfaces = pd.DataFrame(
-        list(results.counterdict_all_emoji_if_clockfaces.items()), columns=["Emoji", "Count"]
-    )
-    df_allemoji_hourglasses = pd.DataFrame(
-        list(results.counterdict_all_emoji_if_hourglasses.items()), columns=["Emoji", "Count"]
-    )
-    df_allemoji_soon = pd.DataFrame(
-        list(results.counterdict_all_emoji_if_soon.items()), columns=["Emoji", "Count"]
-    )
-    df_allemoji_watch = pd.DataFrame(
-        list(results.counterdict_all_emoji_if_watch.items()), columns=["Emoji", "Count"]
-    )
-    df_allemoji_stopwatch = pd.DataFrame(
-        list(results.counterdict_all_emoji_if_stopwatch.items()), columns=["Emoji", "Count"]
-    )
-    df_allemoji_mantelpiece_clock = pd.DataFrame(
-        list(results.counterdict_all_emoji_if_mantelpiece_clock.items()), columns=["Emoji", "Count"]
-    )
-    df_allemoji_timer_clock = pd.DataFrame(
-        list(results.counterdict_all_emoji_if_timer_clock.items()), columns=["Emoji", "Count"]
-    )
-    df_allemoji_alarm_clock = pd.DataFrame(
-        list(results.counterdict_all_emoji_if_alarm_clock.items()), columns=["Emoji", "Count"]
-    )
-
-    # Export results as CSV files
-    df_lang.to_csv("./langdata.csv", encoding="utf-8")
-    df_allemoji.to_csv("./allemojidata.csv", encoding="utf-8")
-    df_allemoji_match.to_csv("./allemojidatamatch.csv", encoding="utf-8")
-
-    df_allemoji_clockfaces.to_csv("./allemojidatamatch_clockfaces.csv", encoding="utf-8")
-    df_allemoji_hourglasses.to_csv("./allemojidatamatch_hourglasses.csv", encoding="utf-8")
-    df_allemoji_soon.to_csv("./allemojidatamatch_soon.csv", encoding="utf-8")
-    df_allemoji_watch.to_csv("./allemojidatamatch_watch.csv", encoding="utf-8")
-    df_allemoji_stopwatch.to_csv("./allemojidatamatch_stopwatch.csv", encoding="utf-8")
-    df_allemoji_mantelpiece_clock.to_csv("./allemojidatamatch_mantelpiece_clock.csv", encoding="utf-8")
-    df_allemoji_timer_clock.to_csv("./allemojidatamatch_timer_clock.csv", encoding="utf-8")
-    df_allemoji_alarm_clock.to_csv("./allemojidatamatch_alarm_clock.csv", encoding="utf-8")
+# Characters to match
+MATCHES = {
+    "clockfaces": [
+        # O'clock emoji
+        EMOJI_UNICODE[":one_o\u2019clock:"],
+        EMOJI_UNICODE[":two_o\u2019clock:"],
+        EMOJI_UNICODE[":three_o\u2019clock:"],
+        EMOJI_UNICODE[":four_o\u2019clock:"],
+        EMOJI_UNICODE[":five_o\u2019clock:"],
+        EMOJI_UNICODE[":six_o\u2019clock:"],
+        EMOJI_UNICODE[":seven_o\u2019clock:"],
+        EMOJI_UNICODE[":eight_o\u2019clock:"],
+        EMOJI_UNICODE[":nine_o\u2019clock:"],
+        EMOJI_UNICODE[":ten_o\u2019clock:"],
+        EMOJI_UNICODE[":eleven_o\u2019clock:"],
+        EMOJI_UNICODE[":twelve_o\u2019clock:"],
+        # Half past the hour emoji
+        EMOJI_UNICODE[":one-thirty:"],
+        EMOJI_UNICODE[":two-thirty:"],
+        EMOJI_UNICODE[":three-thirty:"],
+        EMOJI_UNICODE[":four-thirty:"],
+        EMOJI_UNICODE[":five-thirty:"],
+        EMOJI_UNICODE[":six-thirty:"],
+        EMOJI_UNICODE[":seven-thirty:"],
+        EMOJI_UNICODE[":eight-thirty:"],
+        EMOJI_UNICODE[":nine-thirty:"],
+        EMOJI_UNICODE[":ten-thirty:"],
+        EMOJI_UNICODE[":eleven-thirty:"],
+        EMOJI_UNICODE[":twelve-thirty:"],
+    ],
+    # Other clock and time related emoji
+    "hourglasses": [
+        EMOJI_UNICODE[":hourglass_done:"],
+        EMOJI_UNICODE[":hourglass_not_done:"],
+    ],
+    "soon": [EMOJI_UNICODE[":SOON_arrow:"]],
+    "watch": [EMOJI_UNICODE[":watch:"]],
+    "stopwatch": [EMOJI_UNICODE[":stopwatch:"]],
+    "mantelpiece_clock": [EMOJI_UNICODE[":mantelpiece_clock:"]],
+    "timer_clock": [EMOJI_UNICODE[":timer_clock:"]],
+    "alarm_clock": [EMOJI_UNICODE[":alarm_clock:"]],
+}
 
 
 if __name__ == "__main__":
 
-    args = parse_cli_args()
-
-    # Characters to match
-    MATCHES = {
-        "clockfaces": [
-            # O'clock emoji
-            EMOJI_UNICODE[":one_o\u2019clock:"],
-            EMOJI_UNICODE[":two_o\u2019clock:"],
-            EMOJI_UNICODE[":three_o\u2019clock:"],
-            EMOJI_UNICODE[":four_o\u2019clock:"],
-            EMOJI_UNICODE[":five_o\u2019clock:"],
-            EMOJI_UNICODE[":six_o\u2019clock:"],
-            EMOJI_UNICODE[":seven_o\u2019clock:"],
-            EMOJI_UNICODE[":eight_o\u2019clock:"],
-            EMOJI_UNICODE[":nine_o\u2019clock:"],
-            EMOJI_UNICODE[":ten_o\u2019clock:"],
-            EMOJI_UNICODE[":eleven_o\u2019clock:"],
-            EMOJI_UNICODE[":twelve_o\u2019clock:"],
-            # Half past the hour emoji
-            EMOJI_UNICODE[":one-thirty:"],
-            EMOJI_UNICODE[":two-thirty:"],
-            EMOJI_UNICODE[":three-thirty:"],
-            EMOJI_UNICODE[":four-thirty:"],
-            EMOJI_UNICODE[":five-thirty:"],
-            EMOJI_UNICODE[":six-thirty:"],
-            EMOJI_UNICODE[":seven-thirty:"],
-            EMOJI_UNICODE[":eight-thirty:"],
-            EMOJI_UNICODE[":nine-thirty:"],
-            EMOJI_UNICODE[":ten-thirty:"],
-            EMOJI_UNICODE[":eleven-thirty:"],
-            EMOJI_UNICODE[":twelve-thirty:"],
-        ],
-        # Other clock and time related emoji
-        "hourglasses": [
-            EMOJI_UNICODE[":hourglass_done:"],
-            EMOJI_UNICODE[":hourglass_not_done:"],
-        ],
-        "soon": [EMOJI_UNICODE[":SOON_arrow:"]],
-        "watch": [EMOJI_UNICODE[":watch:"]],
-        "stopwatch": [EMOJI_UNICODE[":stopwatch:"]],
-        "mantelpiece_clock": [EMOJI_UNICODE[":mantelpiece_clock:"]],
-        "timer_clock": [EMOJI_UNICODE[":timer_clock:"]],
-        "alarm_clock": [EMOJI_UNICODE[":alarm_clock:"]],
-    }
-    MATCHES_ALL = [emoji for lst in MATCHES.values() for emoji in lst]
-
-    # Unpack and list all files
-    if args.unpack:
-        unpack_files(args.data_path)
-    all_files = get_all_files(args.data_path, days=args.days, hours=args.hours)
-
-    # Main search loop
-    RESULTS_GLOBAL = run()
-    save_results(RESULTS_GLOBAL)
+    main(TimeAnalysis(MATCHES))
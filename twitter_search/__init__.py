@@ -1,3 +1,4 @@
+from twitter_search.catalog import EmojiCatalog, get_catalog  # noqa
 from twitter_search.twitter_search_funcs import *  # noqa
 
 __author__ = "Jane Solomon and Jeremy Smith"
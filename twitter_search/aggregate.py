@@ -0,0 +1,544 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Declarative results for search runs
+
+An analysis declares its counters once as class attributes of a `Results`
+subclass. Every instance then gets fresh storage for each field and merging
+and serialization are handled for all fields together.
+
+    class GunResults(Results):
+        counter_total_tweets = Total()
+        counterdict_lang = Tally()
+        counterdict_all_emoji = EmojiTally()
+
+"""
+import json
+from array import array
+
+from twitter_search.catalog import BOTH, get_catalog
+from twitter_search.twitter_search_funcs import merge_counts
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+__all__ = [
+    "Counts",
+    "EmojiCounts",
+    "Field",
+    "Total",
+    "Tally",
+    "EmojiTally",
+    "FoldedEmojiCounts",
+    "FoldedEmojiTally",
+    "Results",
+    "merge_arrays",
+    "scale_array",
+    "scale_count",
+    "batch_files",
+    "reduce_files",
+    "tree_merge",
+]
+
+# Batches per process when the batch size is chosen automatically
+BATCHES_PER_PROCESS = 4
+
+
+def merge_arrays(a, b):
+    """Add the int64 array b into the int64 array a in place. Uses a vectorized
+    numpy add on the array buffers when numpy is available and otherwise only
+    visits the non-zero entries of b.
+
+    Args:
+        a (array): Accumulator, updated in place
+        b (array)
+
+    Returns:
+        array: a
+    """
+    if np is not None:
+        va = np.frombuffer(a, dtype=np.int64)
+        np.add(va, np.frombuffer(b, dtype=np.int64), out=va)
+        del va
+        return a
+    for i, n in enumerate(b):
+        if n:
+            a[i] += n
+    return a
+
+
+def scale_count(n, factor):
+    """Count multiplied by a factor, rounded to an integer.
+
+    Args:
+        n (int)
+        factor (float)
+
+    Returns:
+        int
+    """
+    return int(round(n * factor))
+
+
+def scale_array(a, factor):
+    """Multiply the non-zero entries of an int64 array by a factor in place.
+
+    Args:
+        a (array): Updated in place
+        factor (float)
+
+    Returns:
+        array: a
+    """
+    for i, n in enumerate(a):
+        if n:
+            a[i] = int(round(n * factor))
+    return a
+
+
+class Counts(dict):
+
+    """Counter dict for keys which are not known in advance, e.g. languages."""
+
+    def add(self, key, n=1):
+        """Adds n to the count of a key.
+
+        Args:
+            key (hashable)
+            n (int, optional)
+        """
+        self[key] = self.get(key, 0) + n
+
+
+class EmojiCounts:
+
+    """Counts indexed by emoji id from the shared `EmojiCatalog`, stored in a typed array.
+
+    Pickles as the non-zero entries only so that sparse results are cheap to send
+    between processes.
+
+    Attributes:
+        counts (array): Emoji id to count
+    """
+
+    __slots__ = ("counts",)
+
+    def __init__(self, counts=None):
+        """Initialize all counts to 0 or to the given array.
+
+        Args:
+            counts (array, optional)
+        """
+        if counts is None:
+            counts = array("q", bytes(8 * len(get_catalog())))
+        self.counts = counts
+
+    def add(self, emoji, n=1):
+        """Adds n to the count of an emoji unicode string.
+
+        Args:
+            emoji (str)
+            n (int, optional)
+        """
+        self.counts[get_catalog().ids[emoji]] += n
+
+    def add_id(self, eid, n=1):
+        """Adds n to the count of an emoji id.
+
+        Args:
+            eid (int)
+            n (int, optional)
+        """
+        self.counts[eid] += n
+
+    def __getitem__(self, emoji):
+        return self.counts[get_catalog().ids[emoji]]
+
+    def __len__(self):
+        return len(self.counts) - self.counts.count(0)
+
+    def __eq__(self, other):
+        return isinstance(other, EmojiCounts) and self.counts == other.counts
+
+    def __repr__(self):
+        return "EmojiCounts({!r})".format(dict(self.items()))
+
+    def items(self):
+        """Emoji and counts of all emoji with a non-zero count.
+
+        Returns:
+            List[tuple]
+        """
+        emoji = get_catalog().emoji
+        return [(emoji[i], n) for i, n in enumerate(self.counts) if n]
+
+    def __reduce__(self):
+        nonzero = array("H", (i for i, n in enumerate(self.counts) if n))
+        values = array("q", (self.counts[i] for i in nonzero))
+        return _emoji_counts_from_sparse, (nonzero, values)
+
+
+def _emoji_counts_from_sparse(nonzero, values):
+    """Rebuilds `EmojiCounts` from its non-zero entries.
+
+    Args:
+        nonzero (array): Emoji ids with non-zero counts
+        values (array): Counts of those emoji ids
+
+    Returns:
+        EmojiCounts
+    """
+    result = EmojiCounts()
+    for i, n in zip(nonzero, values):
+        result.counts[i] = n
+    return result
+
+
+class FoldedEmojiCounts:
+
+    """Counts of emoji both as written and folded to their base emoji, filled from
+    a single `EmojiCatalog.match` pass over each text.
+
+    Attributes:
+        raw (EmojiCounts): Emoji sequences as written, modifiers on their own included
+        folded (EmojiCounts): Base emoji with skin tones and variation selectors folded away
+    """
+
+    __slots__ = ("raw", "folded")
+
+    def __init__(self, raw=None, folded=None):
+        """Initialize all counts to 0 or to the given counts.
+
+        Args:
+            raw (EmojiCounts, optional)
+            folded (EmojiCounts, optional)
+        """
+        self.raw = EmojiCounts() if raw is None else raw
+        self.folded = EmojiCounts() if folded is None else folded
+
+    def add_text(self, text, n=1):
+        """Adds n times every emoji in a text to both views.
+
+        Args:
+            text (str): Tweet text
+            n (int, optional)
+
+        Returns:
+            bool: Whether the text has any emoji
+        """
+        raw, folded = get_catalog().match(text, BOTH)
+        raw_counts, folded_counts = self.raw.counts, self.folded.counts
+        for eid in raw:
+            raw_counts[eid] += n
+        for eid in folded:
+            folded_counts[eid] += n
+        return bool(raw)
+
+    def __eq__(self, other):
+        return isinstance(other, FoldedEmojiCounts) and self.raw == other.raw and self.folded == other.folded
+
+    def __repr__(self):
+        return "FoldedEmojiCounts(raw={!r}, folded={!r})".format(self.raw, self.folded)
+
+
+class Field:
+
+    """Base class for a declared results field.
+
+    Attributes:
+        scalable (bool): Whether values are additive counts which `scale` can multiply,
+            e.g. to estimate the full archive from a sample
+    """
+
+    scalable = False
+
+    def new(self):
+        """Empty value of the field."""
+        raise NotImplementedError
+
+    def merge(self, a, b):
+        """Combine value b into value a, in place for mutable values.
+
+        Returns:
+            Merged value
+        """
+        raise NotImplementedError
+
+    def scale(self, value, factor):
+        """Multiply every count of a value by a factor, for `scalable` fields.
+
+        Returns:
+            Scaled value, may be the value scaled in place
+        """
+        raise NotImplementedError
+
+    def dump(self, value):
+        """Convert a value to a json serializable object."""
+        return value
+
+    def load(self, data):
+        """Convert a json object back to a value."""
+        return data
+
+
+class Total(Field):
+
+    """Scalar total, e.g. the number of tweets."""
+
+    scalable = True
+
+    def new(self):
+        return 0
+
+    def merge(self, a, b):
+        return a + b
+
+    def scale(self, value, factor):
+        return scale_count(value, factor)
+
+
+class Tally(Field):
+
+    """Counts of arbitrary keys stored in a dict."""
+
+    scalable = True
+
+    def new(self):
+        return Counts()
+
+    def merge(self, a, b):
+        return merge_counts(a, b)
+
+    def scale(self, value, factor):
+        return Counts((key, scale_count(n, factor)) for key, n in value.items())
+
+    def dump(self, value):
+        return dict(value)
+
+    def load(self, data):
+        return Counts(data)
+
+
+class EmojiTally(Field):
+
+    """Counts of emoji stored in an array indexed by emoji id."""
+
+    scalable = True
+
+    def new(self):
+        return EmojiCounts()
+
+    def merge(self, a, b):
+        merge_arrays(a.counts, b.counts)
+        return a
+
+    def scale(self, value, factor):
+        scale_array(value.counts, factor)
+        return value
+
+    def dump(self, value):
+        return dict(value.items())
+
+    def load(self, data):
+        value = EmojiCounts()
+        for emoji, n in data.items():
+            value.add(emoji, n)
+        return value
+
+
+class FoldedEmojiTally(Field):
+
+    """Raw and folded counts of emoji, see `FoldedEmojiCounts`."""
+
+    scalable = True
+
+    def new(self):
+        return FoldedEmojiCounts()
+
+    def merge(self, a, b):
+        merge_arrays(a.raw.counts, b.raw.counts)
+        merge_arrays(a.folded.counts, b.folded.counts)
+        return a
+
+    def scale(self, value, factor):
+        scale_array(value.raw.counts, factor)
+        scale_array(value.folded.counts, factor)
+        return value
+
+    def dump(self, value):
+        return {"raw": dict(value.raw.items()), "folded": dict(value.folded.items())}
+
+    def load(self, data):
+        value = FoldedEmojiCounts()
+        for view in ("raw", "folded"):
+            counts = getattr(value, view)
+            for emoji, n in data.get(view, {}).items():
+                counts.add(emoji, n)
+        return value
+
+
+class Results:
+
+    """Base class for search results. Subclasses declare their fields as class
+    attributes and each instance gets a new value for every field."""
+
+    def __init__(self):
+        """Initialize all fields to their empty values."""
+        for name, field in self.fields():
+            setattr(self, name, field.new())
+
+    @classmethod
+    def fields(cls):
+        """All declared fields in order of declaration.
+
+        Returns:
+            List[tuple]: (name, Field) pairs
+        """
+        if "_fields" not in cls.__dict__:
+            fields = {}
+            for klass in reversed(cls.__mro__):
+                fields.update((k, v) for k, v in vars(klass).items() if isinstance(v, Field))
+            cls._fields = list(fields.items())
+        return cls._fields
+
+    def merge(self, other):
+        """Merge another results object of the same class into this one in place.
+        The other object is not modified.
+
+        Args:
+            other (Results)
+
+        Returns:
+            Results: self
+        """
+        for name, field in self.fields():
+            setattr(self, name, field.merge(getattr(self, name), getattr(other, name)))
+        return self
+
+    def to_dict(self):
+        """Json serializable dict of all fields.
+
+        Returns:
+            dict
+        """
+        return {name: field.dump(getattr(self, name)) for name, field in self.fields()}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build results from the output of `to_dict`.
+
+        Args:
+            data (dict)
+
+        Returns:
+            Results
+        """
+        results = cls()
+        for name, field in cls.fields():
+            if name in data:
+                setattr(results, name, field.load(data[name]))
+        return results
+
+    def save(self, filename):
+        """Save results to a json file.
+
+        Args:
+            filename (str)
+        """
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, filename):
+        """Load results from a json file written by `save`.
+
+        Args:
+            filename (str)
+
+        Returns:
+            Results
+        """
+        with open(filename, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+def batch_files(filenames, batch_size=0, processes=1):
+    """Splits files into batches which are each reduced to a single result in a worker.
+    If no batch size is given there are `BATCHES_PER_PROCESS` batches per process,
+    so the parent does O(processes) merges while still balancing the load.
+
+    Args:
+        filenames (List[str])
+        batch_size (int, optional): Number of files per batch
+        processes (int, optional): Number of worker processes
+
+    Returns:
+        List[List[str]]
+    """
+    if not batch_size:
+        batch_size = -(-len(filenames) // (BATCHES_PER_PROCESS * processes)) or 1
+    return [filenames[i:i + batch_size] for i in range(0, len(filenames), batch_size)]
+
+
+def reduce_files(worker, filenames):
+    """Runs the worker function on each file and merges the results in the worker
+    process, so only one result per batch is sent back to the parent.
+
+    Args:
+        worker (function): Takes a filename and returns Results or None
+        filenames (List[str])
+
+    Returns:
+        Results: None if there are no results
+    """
+    merged = None
+    for filename in filenames:
+        results = worker(filename)
+        if results is None:
+            continue
+        if merged is None:
+            merged = results
+        else:
+            merged.merge(results)
+    return merged
+
+
+def _merge_pair(pair):
+    """Merges a pair of results, either of which may be None.
+
+    Args:
+        pair (tuple)
+
+    Returns:
+        Results
+    """
+    a, b = pair
+    if a is None:
+        return b
+    if b is not None:
+        a.merge(b)
+    return a
+
+
+def tree_merge(partials, pool=None):
+    """Merges results pairwise in rounds. With a pool each round of merges runs in
+    parallel, so the merge takes O(log n) rounds instead of n sequential merges.
+
+    Args:
+        partials (List[Results])
+        pool (multiprocessing.Pool, optional)
+
+    Returns:
+        Results: None if there are no results
+    """
+    partials = [p for p in partials if p is not None]
+    while len(partials) > 1:
+        pairs = list(zip(partials[0::2], partials[1::2]))
+        odd = partials[len(pairs) * 2:]
+        if pool is not None:
+            partials = pool.map(_merge_pair, pairs) + odd
+        else:
+            partials = [_merge_pair(pair) for pair in pairs] + odd
+    return partials[0] if partials else None
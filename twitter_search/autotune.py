@@ -0,0 +1,146 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Worker count and batch size autotuning
+
+The best number of worker processes depends on where the archive is stored: a
+local SSD keeps every core busy decompressing, while an external disk is
+seek-bound and runs faster with fewer readers. Before the main run the tuner
+times short trials over the first files, first halving the number of processes
+from the maximum, then growing the batch size, for as long as throughput
+improves. The results of the trial files are kept, so the warm-up costs only
+the extra pool start ups.
+
+Throughput is measured in compressed bytes per second, which is proportional
+to tweets per second for the files of one archive.
+
+"""
+import multiprocessing
+import os
+from timeit import default_timer as timer
+
+__all__ = ["Autotuner"]
+
+# Relative throughput gain needed to keep searching in the same direction
+MIN_GAIN = 0.05
+
+
+class Autotuner:
+
+    """Chooses the number of worker processes and the batch size from timed trials.
+
+    Attributes:
+        max_processes (int): Largest number of worker processes tried
+        batch_sizes (tuple): Batch sizes tried, in increasing order
+        batches_per_process (int): Batches each worker reduces in a trial
+        trials (List[dict]): Settings, files, seconds and bytes per second of each trial
+        processes (int): Chosen number of worker processes, None before tuning
+        batch_size (int): Chosen batch size, None before tuning
+    """
+
+    def __init__(self, max_processes=None, batch_sizes=(1, 2, 4, 8), batches_per_process=2):
+        """Configure a tuner.
+
+        Args:
+            max_processes (int, optional): Largest number of worker processes, the cpu count by default
+            batch_sizes (tuple, optional): Batch sizes tried, in increasing order
+            batches_per_process (int, optional): Batches each worker reduces in a trial
+        """
+        self.max_processes = max_processes or multiprocessing.cpu_count()
+        self.batch_sizes = batch_sizes
+        self.batches_per_process = batches_per_process
+        self.trials = []
+        self.processes = None
+        self.batch_size = None
+
+    def _trial(self, task, filenames, merge, processes, batch_size):
+        """Runs the task over files in a new pool and records the throughput.
+
+        Args:
+            task (function): Takes a batch of filenames and returns its results
+            filenames (List[str])
+            merge (function): Takes a batch and its results
+            processes (int)
+            batch_size (int)
+
+        Returns:
+            float: Bytes per second
+        """
+        batches = [filenames[i:i + batch_size] for i in range(0, len(filenames), batch_size)]
+        size = sum(os.path.getsize(filename) for filename in filenames)
+        start_t = timer()
+        pool = multiprocessing.Pool(processes)
+        try:
+            for batch, results in pool.imap_unordered(task, batches):
+                merge(batch, results)
+        finally:
+            pool.terminate()
+            pool.join()
+        seconds = timer() - start_t
+        rate = size / seconds if seconds > 0 else float("inf")
+        self.trials.append(
+            {
+                "processes": processes,
+                "batch_size": batch_size,
+                "files": len(filenames),
+                "seconds": seconds,
+                "bytes_per_second": rate,
+            }
+        )
+        print(
+            "Autotune trial {:3d} processes, batches of {:3d}: {:5d} files in {:.2f} s, {:.2f} MB/s".format(
+                processes, batch_size, len(filenames), seconds, rate / 1e6
+            )
+        )
+        return rate
+
+    def tune(self, task, filenames, merge):
+        """Times trials over the first files and chooses the settings with the
+        highest throughput. Stops early when the files run out.
+
+        Args:
+            task (function): Takes a batch of filenames and returns `(batch, results)`
+            filenames (List[str])
+            merge (function): Takes a batch and its results, called for every trial batch
+
+        Returns:
+            List[str]: The files not processed by the trials
+        """
+        remaining = list(filenames)
+
+        def run(processes, batch_size):
+            n = processes * batch_size * self.batches_per_process
+            if len(remaining) < n:
+                return None
+            trial_files = remaining[:n]
+            del remaining[:n]
+            return self._trial(task, trial_files, merge, processes, batch_size)
+
+        # Fewer processes while that is faster, at the smallest batch size
+        self.processes, self.batch_size = self.max_processes, self.batch_sizes[0]
+        best = run(self.processes, self.batch_size)
+        processes = self.max_processes // 2
+        while best is not None and processes >= 1:
+            rate = run(processes, self.batch_size)
+            if rate is None or rate < best * (1 + MIN_GAIN):
+                break
+            self.processes, best = processes, rate
+            processes //= 2
+
+        # Larger batches while that is faster, at the chosen number of processes
+        for batch_size in self.batch_sizes[1:]:
+            if best is None:
+                break
+            rate = run(self.processes, batch_size)
+            if rate is None or rate < best * (1 + MIN_GAIN):
+                break
+            self.batch_size, best = batch_size, rate
+        return remaining
+
+    def settings(self):
+        """Chosen settings and the trials they were chosen from, for the run log.
+
+        Returns:
+            dict
+        """
+        return {"processes": self.processes, "batch_size": self.batch_size, "trials": self.trials}
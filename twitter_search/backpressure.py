@@ -0,0 +1,140 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Bounded dispatch of tasks to a worker pool
+
+`Pool.imap_unordered` queues every task at once, and buffers finished results
+without limit while the parent is busy merging. Each worker also holds a whole
+decompressed file while it reads it, so on machines with many cores memory can
+spike. `Backpressure.imap` submits a task only while:
+
+- fewer than `max_tasks` tasks are running or queued in the pool,
+- fewer than `max_unmerged` finished results are waiting for the parent,
+- fewer workers than the pool size are over `max_rss` bytes resident. Each
+  worker over the limit takes one slot off the running tasks, down to one.
+
+At most `max_tasks + max_unmerged` results exist at once. Workers report
+their resident memory after each task, read from `/proc` so the memory limit
+only applies on Linux.
+
+"""
+import os
+import queue
+from functools import partial
+
+__all__ = ["Backpressure", "worker_rss"]
+
+# Tasks per process allowed in flight by default, so each worker has one queued
+TASKS_PER_PROCESS = 2
+
+
+def worker_rss():
+    """Resident memory of this process.
+
+    Returns:
+        int: Bytes, None where `/proc` is not available
+    """
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            resident = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident * os.sysconf("SC_PAGE_SIZE")
+
+
+def _measured(func, item):
+    """Runs a task and reports the worker's resident memory after it.
+
+    Returns:
+        tuple: Worker process id, resident bytes and the task's result
+    """
+    result = func(item)
+    return os.getpid(), worker_rss(), result
+
+
+class Backpressure:
+
+    """Limits on the work a pool holds at once.
+
+    Attributes:
+        max_tasks (int): Tasks submitted and not finished, 0 for twice the processes
+        max_unmerged (int): Finished results not yet taken, 0 for the processes
+        max_rss (int): Resident bytes per worker above which dispatch is throttled, 0 for no limit
+        throttled (int): Times dispatch waited because workers were over the memory limit
+        peak_rss (int): Largest resident memory reported by a worker, None if not measured
+    """
+
+    def __init__(self, max_tasks=0, max_unmerged=0, max_rss=0):
+        """Configure the limits.
+
+        Args:
+            max_tasks (int, optional): Tasks submitted and not finished
+            max_unmerged (int, optional): Finished results not yet taken
+            max_rss (int, optional): Resident bytes per worker
+        """
+        self.max_tasks = max_tasks
+        self.max_unmerged = max_unmerged
+        self.max_rss = max_rss
+        self.throttled = 0
+        self.peak_rss = None
+
+    def imap(self, pool, func, items, processes):
+        """Runs a function over items in a pool within the limits, like `imap_unordered`.
+
+        Args:
+            pool (multiprocessing.Pool)
+            func (function): Picklable function of one item
+            items (Iterable)
+            processes (int): Number of worker processes in the pool
+
+        Yields:
+            Results of the function, in the order they finish
+
+        Raises:
+            Exception: Any raised by the function in a worker
+        """
+        max_tasks = self.max_tasks or TASKS_PER_PROCESS * processes
+        max_unmerged = self.max_unmerged or processes
+        task = partial(_measured, func) if self.max_rss else func
+        ready = queue.Queue()
+        rss = {}
+        items = iter(items)
+        outstanding = 0
+        exhausted = False
+        while True:
+            while not exhausted:
+                finished = ready.qsize()
+                running = outstanding - finished
+                limit = max_tasks
+                if self.max_rss:
+                    over = sum(1 for value in rss.values() if value > self.max_rss)
+                    if over:
+                        limit = min(limit, max(processes - over, 1))
+                        if running >= limit:
+                            self.throttled += 1
+                if running >= limit or finished >= max_unmerged:
+                    break
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pool.apply_async(
+                    task,
+                    (item,),
+                    callback=lambda value: ready.put((True, value)),
+                    error_callback=lambda error: ready.put((False, error)),
+                )
+                outstanding += 1
+            if not outstanding:
+                return
+            ok, value = ready.get()
+            outstanding -= 1
+            if not ok:
+                raise value
+            if self.max_rss:
+                pid, value_rss, value = value
+                if value_rss is not None:
+                    rss[pid] = value_rss
+                    self.peak_rss = max(self.peak_rss or 0, value_rss)
+            yield value
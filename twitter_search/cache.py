@@ -0,0 +1,201 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent cache of per-file analysis results
+
+Each archive file's results are stored under the fingerprint of the analysis
+which produced them, so adding a counter or fixing one analysis only reprocesses
+that analysis. The parts of a `MultiAnalysis` are cached separately, so entries
+are shared with runs of each analysis on its own, and a pass over a file only
+runs the parts which missed the cache. An entry is reused while the file's size
+and modification time are unchanged, or when they changed but its content hash
+is the same. The hash of a new entry is taken from the read which processes the
+file, so a cold cache reads each file once.
+
+    cache = ResultCache("cache/")
+    results = cache.process(analysis, filename)
+
+"""
+import hashlib
+import os
+import pickle
+
+__all__ = ["FileDigest", "ResultCache", "file_hash"]
+
+CHUNK_SIZE = 1 << 20
+
+
+def file_hash(filename):
+    """Content hash of a file.
+
+    Args:
+        filename (str)
+
+    Returns:
+        str: Hex digest
+    """
+    h = hashlib.blake2b(digest_size=16)
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class FileDigest:
+
+    """Content hash of a file built from the bytes read while processing it, see
+    `file_hash`.
+
+    Attributes:
+        size (int): Number of bytes hashed
+    """
+
+    def __init__(self):
+        self._hash = hashlib.blake2b(digest_size=16)
+        self.size = 0
+
+    def update(self, data):
+        """Hash the next bytes of the file.
+
+        Args:
+            data (bytes)
+        """
+        self._hash.update(data)
+        self.size += len(data)
+
+    def hexdigest(self):
+        """Hash of the bytes so far.
+
+        Returns:
+            str: Hex digest
+        """
+        return self._hash.hexdigest()
+
+
+class ResultCache:
+
+    """Directory of cached results, one pickle per analysis fingerprint and file.
+    Instances only hold the directory, so they are cheap to send to workers.
+
+    Attributes:
+        directory (str)
+    """
+
+    def __init__(self, directory):
+        """Use a cache directory, created if needed.
+
+        Args:
+            directory (str)
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, analysis, filename):
+        """Entry path of a file's results for an analysis.
+
+        Args:
+            analysis (Analysis)
+            filename (str)
+
+        Returns:
+            str
+        """
+        key = hashlib.blake2b(os.path.abspath(filename).encode("utf-8"), digest_size=16).hexdigest()
+        subdir = "{}-{}".format(analysis.name, analysis.fingerprint())
+        return os.path.join(self.directory, subdir, key[:2], "{}.pickle".format(key))
+
+    def _write(self, path, entry):
+        """Write an entry atomically so concurrent workers never see a partial file."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp, "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def get(self, analysis, filename):
+        """Cached results of a file, if the file is unchanged.
+
+        Args:
+            analysis (Analysis)
+            filename (str)
+
+        Returns:
+            Results: None if there is no valid entry
+        """
+        path = self._path(analysis, filename)
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        stat = os.stat(filename)
+        if stat.st_size != entry["size"]:
+            return None
+        if stat.st_mtime_ns != entry["mtime"]:
+            # Touched or copied, reuse if the content is the same
+            if file_hash(filename) != entry["hash"]:
+                return None
+            entry["mtime"] = stat.st_mtime_ns
+            self._write(path, entry)
+        return entry["results"]
+
+    def _source(self, filename, digest=None):
+        """Identity of a file which entries are checked against.
+
+        Args:
+            filename (str)
+            digest (FileDigest, optional): Hash of the file from processing it, the
+                file is only read again if it was not read to the end
+
+        Returns:
+            dict
+        """
+        stat = os.stat(filename)
+        if digest is not None and digest.size == stat.st_size:
+            h = digest.hexdigest()
+        else:
+            h = file_hash(filename)
+        return {"filename": filename, "size": stat.st_size, "mtime": stat.st_mtime_ns, "hash": h}
+
+    def put(self, analysis, filename, results, source=None):
+        """Store the results of a file.
+
+        Args:
+            analysis (Analysis)
+            filename (str)
+            results (Results)
+            source (dict, optional): Identity of the file, read from it by default
+        """
+        entry = dict(source or self._source(filename), results=results)
+        self._write(self._path(analysis, filename), entry)
+
+    def process(self, analysis, filename):
+        """Results of a file from the cache, or processed and then cached. The
+        parts of a `MultiAnalysis` are looked up one by one, and the parts which
+        missed are run together in a single pass over the file.
+
+        Args:
+            analysis (Analysis)
+            filename (str)
+
+        Returns:
+            Results
+        """
+        analyses = getattr(analysis, "analyses", None)
+        if analyses is not None:
+            parts = [self.get(part, filename) for part in analyses]
+            missing = [i for i, part in enumerate(parts) if part is None]
+            if missing:
+                digest = FileDigest()
+                fresh = type(analysis)([analyses[i] for i in missing]).process_file(filename, digest)
+                source = self._source(filename, digest)
+                for i, part in zip(missing, fresh.parts):
+                    self.put(analyses[i], filename, part, source)
+                    parts[i] = part
+            return analysis.results_class(parts)
+        results = self.get(analysis, filename)
+        if results is None:
+            digest = FileDigest()
+            results = analysis.process_file(filename, digest)
+            self.put(analysis, filename, results, self._source(filename, digest))
+        return results
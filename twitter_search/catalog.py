@@ -0,0 +1,322 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Emoji catalog built from the unicode_codes data
+
+Every emoji sequence is given a small integer id so that aggregations can
+use arrays instead of dicts keyed by strings. Groups are the unicode block of
+the first code point of the sequence and subgroups are the kind of sequence
+(single character, flag, keycap, skin tone, ZWJ etc).
+
+Sequences with skin tone modifiers or variation selectors fold to their base
+emoji so that matches can be counted as written (raw), folded or both.
+
+"""
+import re
+from array import array
+
+from twitter_search.unicode_codes import EMOJI_ALIAS_UNICODE, EMOJI_UNICODE
+
+__all__ = ["EmojiCatalog", "get_catalog", "RAW", "FOLDED", "BOTH"]
+
+# Match modes
+RAW = "raw"
+FOLDED = "folded"
+BOTH = "both"
+
+VARIATION_SELECTOR = "\ufe0f"
+ZWJ = "\u200d"
+KEYCAP = "\u20e3"
+SKIN_TONES = frozenset(chr(c) for c in range(0x1F3FB, 0x1F400))
+REGIONAL_INDICATORS = frozenset(chr(c) for c in range(0x1F1E6, 0x1F200))
+TAGS = frozenset(chr(c) for c in range(0xE0020, 0xE0080))
+
+# Unicode blocks containing emoji as (first code point, last code point, name)
+BLOCKS = (
+    (0x0000, 0x007F, "Basic Latin"),
+    (0x0080, 0x00FF, "Latin-1 Supplement"),
+    (0x2000, 0x206F, "General Punctuation"),
+    (0x2100, 0x214F, "Letterlike Symbols"),
+    (0x2190, 0x21FF, "Arrows"),
+    (0x2300, 0x23FF, "Miscellaneous Technical"),
+    (0x2460, 0x24FF, "Enclosed Alphanumerics"),
+    (0x25A0, 0x25FF, "Geometric Shapes"),
+    (0x2600, 0x26FF, "Miscellaneous Symbols"),
+    (0x2700, 0x27BF, "Dingbats"),
+    (0x2900, 0x297F, "Supplemental Arrows-B"),
+    (0x2B00, 0x2BFF, "Miscellaneous Symbols and Arrows"),
+    (0x3000, 0x303F, "CJK Symbols and Punctuation"),
+    (0x3200, 0x32FF, "Enclosed CJK Letters and Months"),
+    (0x1F000, 0x1F02F, "Mahjong Tiles"),
+    (0x1F0A0, 0x1F0FF, "Playing Cards"),
+    (0x1F100, 0x1F1FF, "Enclosed Alphanumeric Supplement"),
+    (0x1F200, 0x1F2FF, "Enclosed Ideographic Supplement"),
+    (0x1F300, 0x1F5FF, "Miscellaneous Symbols and Pictographs"),
+    (0x1F600, 0x1F64F, "Emoticons"),
+    (0x1F680, 0x1F6FF, "Transport and Map Symbols"),
+    (0x1F780, 0x1F7FF, "Geometric Shapes Extended"),
+    (0x1F900, 0x1F9FF, "Supplemental Symbols and Pictographs"),
+    (0x1FA70, 0x1FAFF, "Symbols and Pictographs Extended-A"),
+)
+OTHER_BLOCK = "Other"
+
+SUBGROUPS = ("single", "presentation", "skin_tone", "modifier", "keycap", "flag", "tag", "zwj")
+
+
+def _strip_modifiers(emoji):
+    """Removes skin tone modifiers and variation selectors from an emoji sequence.
+
+    Args:
+        emoji (str)
+
+    Returns:
+        str
+    """
+    return "".join(c for c in emoji if c not in SKIN_TONES and c != VARIATION_SELECTOR) or emoji
+
+
+def _block(emoji):
+    """Finds the unicode block name of the first code point of an emoji.
+
+    Args:
+        emoji (str)
+
+    Returns:
+        str
+    """
+    cp = ord(emoji[0])
+    for first, last, name in BLOCKS:
+        if first <= cp <= last:
+            return name
+    return OTHER_BLOCK
+
+
+def _subgroup(emoji):
+    """Classifies an emoji sequence by its kind.
+
+    Args:
+        emoji (str)
+
+    Returns:
+        str
+    """
+    chars = set(emoji)
+    if ZWJ in chars:
+        return "zwj"
+    if KEYCAP in chars:
+        return "keycap"
+    if chars & TAGS:
+        return "tag"
+    if len(emoji) == 2 and chars <= REGIONAL_INDICATORS:
+        return "flag"
+    if chars & SKIN_TONES:
+        return "modifier" if len(emoji) == 1 else "skin_tone"
+    if VARIATION_SELECTOR in chars:
+        return "presentation"
+    return "single"
+
+
+class EmojiCatalog:
+
+    """Lookup tables for all emoji with integer ids.
+
+    Ids are assigned in the order of `EMOJI_UNICODE` so they are stable for a given
+    version of the unicode_codes data.
+
+    Attributes:
+        emoji (tuple): Id to emoji unicode string
+        ids (dict): Emoji unicode string to id
+        names (tuple): Id to emoji name
+        aliases (tuple): Id to emoji alias (same as the name if there is no alias)
+        group_ids (array): Id to group id
+        group_names (tuple): Group id to group name
+        subgroup_ids (array): Id to subgroup id
+        subgroup_names (tuple): Subgroup id to subgroup name
+        fold (array): Id to the id of its base emoji (itself if it has no base)
+    """
+
+    def __init__(self, emoji_unicode=EMOJI_UNICODE, alias_unicode=EMOJI_ALIAS_UNICODE):
+        """Build all lookup tables.
+
+        Args:
+            emoji_unicode (dict): Emoji name to unicode mapping
+            alias_unicode (dict): Emoji name and alias to unicode mapping
+        """
+        self.emoji = tuple(emoji_unicode.values())
+        self.names = tuple(emoji_unicode.keys())
+        self.ids = {e: i for i, e in enumerate(self.emoji)}
+
+        # Aliases are looked up through the unicode as several names map to one emoji
+        unicode_alias = {v: k for k, v in alias_unicode.items()}
+        self.aliases = tuple(unicode_alias.get(e, n) for e, n in zip(self.emoji, self.names))
+        self._by_name = {k: self.ids[v] for k, v in alias_unicode.items() if v in self.ids}
+        self._by_name.update((n, i) for i, n in enumerate(self.names))
+
+        self.group_names = tuple(name for _, _, name in BLOCKS) + (OTHER_BLOCK,)
+        group_index = {name: i for i, name in enumerate(self.group_names)}
+        self.group_ids = array("B", (group_index[_block(e)] for e in self.emoji))
+
+        self.subgroup_names = SUBGROUPS
+        subgroup_index = {name: i for i, name in enumerate(self.subgroup_names)}
+        self.subgroup_ids = array("B", (subgroup_index[_subgroup(e)] for e in self.emoji))
+
+        # Fold map from sequences with skin tones and variation selectors to the base
+        self.fold = array("H", (self.ids.get(_strip_modifiers(e), i) for i, e in enumerate(self.emoji)))
+        self._modifier_ids = frozenset(self.ids[c] for c in SKIN_TONES if c in self.ids)
+
+        # Longest match first, only starting at characters which can begin an emoji
+        self._lengths = sorted({len(e) for e in self.emoji}, reverse=True)
+        starts = sorted({e[0] for e in self.emoji})
+        self._starts = frozenset(starts)
+        self._start_re = re.compile("[{}]".format("".join(re.escape(c) for c in starts)))
+
+    def __len__(self):
+        return len(self.emoji)
+
+    def __contains__(self, emoji):
+        return emoji in self.ids
+
+    def __iter__(self):
+        return iter(self.emoji)
+
+    def id_of(self, emoji):
+        """Id of an emoji unicode string or None if it is not an emoji.
+
+        Args:
+            emoji (str)
+
+        Returns:
+            int
+        """
+        return self.ids.get(emoji)
+
+    def lookup(self, name):
+        """Id of an emoji from its name or alias, e.g. `:pistol:` or `:gun:`.
+
+        Args:
+            name (str)
+
+        Returns:
+            int
+
+        Raises:
+            KeyError: If the name is not known
+        """
+        return self._by_name[name]
+
+    def group_of(self, emoji):
+        """Group name of an emoji unicode string.
+
+        Args:
+            emoji (str)
+
+        Returns:
+            str
+        """
+        return self.group_names[self.group_ids[self.ids[emoji]]]
+
+    def subgroup_of(self, emoji):
+        """Subgroup name of an emoji unicode string.
+
+        Args:
+            emoji (str)
+
+        Returns:
+            str
+        """
+        return self.subgroup_names[self.subgroup_ids[self.ids[emoji]]]
+
+    def tokens(self, text):
+        """Finds all emoji sequences in a text, longest match first.
+
+        Args:
+            text (str): Tweet text
+
+        Returns:
+            List[tuple]: (start, end, id) of each match in order
+        """
+        if self._starts.isdisjoint(text):
+            return []
+
+        ids = self.ids
+        lengths = self._lengths
+        search = self._start_re.search
+        tokens = []
+        m = search(text)
+        while m is not None:
+            start = end = m.start()
+            for length in lengths:
+                eid = ids.get(text[start:start + length])
+                if eid is not None:
+                    end = start + length
+                    tokens.append((start, end, eid))
+                    break
+            m = search(text, max(end, start + 1))
+
+        return tokens
+
+    def match(self, text, mode=RAW):
+        """Finds the ids of all emoji in a text in a single pass. Raw ids are the
+        sequences as written. Folded ids replace each sequence with its base emoji and
+        drop skin tone modifiers which directly follow another emoji.
+
+        Args:
+            text (str): Tweet text
+            mode (str, optional): One of `RAW`, `FOLDED` or `BOTH`
+
+        Returns:
+            List[int] or tuple: Tuple of raw and folded id lists for `BOTH`
+
+        Raises:
+            ValueError: If the mode is not known
+        """
+        if mode not in (RAW, FOLDED, BOTH):
+            raise ValueError("Unknown match mode {!r}".format(mode))
+        tokens = self.tokens(text)
+        raw = [t[2] for t in tokens]
+        if mode == RAW:
+            return raw
+
+        fold = self.fold
+        modifiers = self._modifier_ids
+        folded = []
+        prev_end = -1
+        for start, end, eid in tokens:
+            if not (eid in modifiers and start == prev_end):
+                folded.append(fold[eid])
+            prev_end = end
+
+        if mode == FOLDED:
+            return folded
+        return raw, folded
+
+    def members(self, group):
+        """All emoji ids in a group or subgroup.
+
+        Args:
+            group (str): Group or subgroup name
+
+        Returns:
+            List[int]
+        """
+        if group in self.group_names:
+            gid, ids = self.group_names.index(group), self.group_ids
+        else:
+            gid, ids = self.subgroup_names.index(group), self.subgroup_ids
+        return [i for i, g in enumerate(ids) if g == gid]
+
+
+_CATALOG = None
+
+
+def get_catalog():
+    """Shared catalog for the default unicode_codes data. Built on first use so that
+    importing the package stays cheap.
+
+    Returns:
+        EmojiCatalog
+    """
+    global _CATALOG
+    if _CATALOG is None:
+        _CATALOG = EmojiCatalog()
+    return _CATALOG
@@ -0,0 +1,269 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sparse emoji co-occurrence counts
+
+Counts the number of tweets in which each pair of emoji appear together. Pairs
+are stored once with the smaller emoji id first, packed into a single integer
+key, and the diagonal holds the number of tweets containing each emoji. An
+index of the emoji paired with each emoji is built on the first `row` after
+new pairs are counted, so rows are lookups. The matrix saves to a compact
+little-endian binary file.
+
+"""
+import struct
+import sys
+from array import array
+from itertools import combinations
+
+from twitter_search.aggregate import Field, scale_count
+from twitter_search.catalog import get_catalog
+from twitter_search.twitter_search_funcs import merge_counts
+
+__all__ = ["CooccurrenceMatrix", "CooccurrenceTally"]
+
+MAGIC = b"TSCO"
+VERSION = 1
+HEADER = struct.Struct("<4sIIQ")
+
+
+class CooccurrenceMatrix:
+
+    """Symmetric emoji x emoji matrix of tweet counts stored sparsely.
+
+    Attributes:
+        size (int): Number of emoji ids
+        counts (dict): Packed pair key to number of tweets
+    """
+
+    def __init__(self, size=None):
+        """Initialize an empty matrix.
+
+        Args:
+            size (int, optional): Number of emoji ids, the catalog size by default
+        """
+        self.size = len(get_catalog()) if size is None else size
+        self.counts = {}
+        self._neighbours = None
+
+    def add_ids(self, ids):
+        """Counts one tweet containing the given emoji ids. Repeated ids are only
+        counted once.
+
+        Args:
+            ids (Iterable[int])
+        """
+        ids = sorted(set(ids))
+        self._neighbours = None
+        counts = self.counts
+        size = self.size
+        for i in ids:
+            key = i * size + i
+            counts[key] = counts.get(key, 0) + 1
+        for i, j in combinations(ids, 2):
+            key = i * size + j
+            counts[key] = counts.get(key, 0) + 1
+
+    def add(self, emoji):
+        """Counts one tweet containing the given emoji unicode strings.
+
+        Args:
+            emoji (Iterable[str])
+        """
+        ids = get_catalog().ids
+        self.add_ids(ids[c] for c in emoji)
+
+    def count_ids(self, i, j):
+        """Number of tweets containing both emoji ids.
+
+        Args:
+            i (int)
+            j (int)
+
+        Returns:
+            int
+        """
+        if i > j:
+            i, j = j, i
+        return self.counts.get(i * self.size + j, 0)
+
+    def count(self, a, b):
+        """Number of tweets containing both emoji, or containing `a` if `a == b`.
+
+        Args:
+            a (str)
+            b (str)
+
+        Returns:
+            int
+        """
+        ids = get_catalog().ids
+        return self.count_ids(ids[a], ids[b])
+
+    def row(self, emoji):
+        """Number of tweets containing each other emoji when `emoji` is present.
+
+        Args:
+            emoji (str)
+
+        Returns:
+            dict: Emoji unicode string to number of tweets
+        """
+        catalog = get_catalog()
+        k = catalog.ids[emoji]
+        return {catalog.emoji[j]: self.count_ids(k, j) for j in self.neighbours().get(k, ())}
+
+    def neighbours(self):
+        """Ids of the emoji appearing with each emoji id, indexed once until new
+        pairs are counted.
+
+        Returns:
+            dict: Emoji id to a list of other emoji ids
+        """
+        if self._neighbours is None:
+            size = self.size
+            neighbours = {}
+            for key in self.counts:
+                i, j = divmod(key, size)
+                if i != j:
+                    neighbours.setdefault(i, []).append(j)
+                    neighbours.setdefault(j, []).append(i)
+            self._neighbours = neighbours
+        return self._neighbours
+
+    def items(self):
+        """All non-zero entries including the diagonal.
+
+        Returns:
+            List[tuple]: (emoji, emoji, count)
+        """
+        emoji = get_catalog().emoji
+        size = self.size
+        items = []
+        for key, n in self.counts.items():
+            i, j = divmod(key, size)
+            items.append((emoji[i], emoji[j], n))
+        return items
+
+    def pairs(self):
+        """All off-diagonal pairs and their counts.
+
+        Returns:
+            List[tuple]: (emoji, emoji, count)
+        """
+        return [(a, b, n) for a, b, n in self.items() if a != b]
+
+    def merge(self, other):
+        """Merges another matrix into this one in place.
+
+        Args:
+            other (CooccurrenceMatrix)
+
+        Returns:
+            CooccurrenceMatrix: self
+        """
+        if self.size != other.size:
+            raise ValueError("Cannot merge matrices of different sizes")
+        self._neighbours = None
+        merge_counts(self.counts, other.counts)
+        return self
+
+    def _arrays(self):
+        """Sorted keys and their counts as arrays.
+
+        Returns:
+            tuple
+        """
+        keys = array("Q", sorted(self.counts))
+        values = array("q", (self.counts[k] for k in keys))
+        return keys, values
+
+    def save(self, filename):
+        """Save to a binary file of a header followed by the sorted keys and counts.
+
+        Args:
+            filename (str)
+        """
+        keys, values = self._arrays()
+        if sys.byteorder == "big":
+            keys.byteswap()
+            values.byteswap()
+        with open(filename, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, self.size, len(keys)))
+            keys.tofile(f)
+            values.tofile(f)
+
+    @classmethod
+    def load(cls, filename):
+        """Load a matrix written by `save`.
+
+        Args:
+            filename (str)
+
+        Returns:
+            CooccurrenceMatrix
+
+        Raises:
+            ValueError: If the file is not a co-occurrence matrix
+        """
+        with open(filename, "rb") as f:
+            magic, version, size, nnz = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError("{} is not a co-occurrence matrix file".format(filename))
+            keys, values = array("Q"), array("q")
+            keys.fromfile(f, nnz)
+            values.fromfile(f, nnz)
+        if sys.byteorder == "big":
+            keys.byteswap()
+            values.byteswap()
+        matrix = cls(size)
+        matrix.counts = dict(zip(keys, values))
+        return matrix
+
+    def __reduce__(self):
+        keys, values = self._arrays()
+        return _matrix_from_arrays, (self.size, keys, values)
+
+
+def _matrix_from_arrays(size, keys, values):
+    """Rebuilds a matrix from its key and count arrays.
+
+    Args:
+        size (int)
+        keys (array)
+        values (array)
+
+    Returns:
+        CooccurrenceMatrix
+    """
+    matrix = CooccurrenceMatrix(size)
+    matrix.counts = dict(zip(keys, values))
+    return matrix
+
+
+class CooccurrenceTally(Field):
+
+    """Emoji co-occurrence counts per tweet."""
+
+    scalable = True
+
+    def new(self):
+        return CooccurrenceMatrix()
+
+    def merge(self, a, b):
+        return a.merge(b)
+
+    def scale(self, value, factor):
+        value.counts = {key: scale_count(n, factor) for key, n in value.counts.items()}
+        return value
+
+    def dump(self, value):
+        return [list(item) for item in value.items()]
+
+    def load(self, data):
+        value = CooccurrenceMatrix()
+        ids = get_catalog().ids
+        for a, b, n in data:
+            i, j = sorted((ids[a], ids[b]))
+            value.counts[i * value.size + j] = n
+        return value
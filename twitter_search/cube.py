@@ -0,0 +1,327 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Language x emoji x time aggregate cube
+
+Emoji counts are kept per tweet language and time bucket with languages
+dictionary encoded as small integer ids. A cube saves to a binary file of
+sorted columns which `CubeFile` opens with mmap, so slices and rollups read
+only the pages they need and never require another pass over the archive.
+
+    cube = CubeFile("cube.bin")
+    cube.top("emoji", k=10, lang="ja")
+    cube.rollup(("lang",), emoji="🔫")
+
+"""
+import json
+import mmap
+import struct
+import sys
+from array import array
+
+from twitter_search.aggregate import Field, scale_count
+from twitter_search.catalog import get_catalog
+from twitter_search.timeseries import HOUR
+
+__all__ = ["AggregateCube", "CubeFile", "CubeTally"]
+
+MAGIC = b"TSCU"
+VERSION = 1
+PREAMBLE = struct.Struct("<4sII")
+DIMS = ("lang", "time", "emoji")
+
+# Bits of the packed (lang id, bucket, emoji id) cell key
+EMOJI_BITS = 16
+BUCKET_BITS = 32
+
+
+class _CubeQueries:
+
+    """Slice and rollup queries shared by in memory and mmap cubes. Subclasses
+    provide `langs`, `resolution` and `_rows`."""
+
+    def _lang_id(self, lang):
+        try:
+            return self.langs.index(lang)
+        except ValueError:
+            return None
+
+    def slice(self, lang=None, emoji=None, start=None, end=None):
+        """All non-zero cells matching the filters.
+
+        Args:
+            lang (str, optional): Tweet language
+            emoji (str, optional): Emoji unicode string
+            start (int, optional): First time in seconds since the epoch
+            end (int, optional): Time in seconds since the epoch to stop before
+
+        Returns:
+            Iterator[tuple]: (lang, bucket start time, emoji, count)
+        """
+        lang_id = None
+        if lang is not None:
+            lang_id = self._lang_id(lang)
+            if lang_id is None:
+                return
+        eid = None if emoji is None else get_catalog().ids[emoji]
+        lo = None if start is None else start // self.resolution
+        hi = None if end is None else -(-end // self.resolution)
+
+        langs, emoji_list, res = self.langs, get_catalog().emoji, self.resolution
+        for li, b, e, n in self._rows(lang_id):
+            if eid is not None and e != eid:
+                continue
+            if lo is not None and b < lo or hi is not None and b >= hi:
+                continue
+            yield langs[li], b * res, emoji_list[e], n
+
+    def rollup(self, dims, **filters):
+        """Sums counts over all dimensions not in `dims`.
+
+        Args:
+            dims (tuple): Dimensions to keep from "lang", "time" and "emoji"
+            **filters: Filters passed to `slice`
+
+        Returns:
+            dict: Tuple of the kept dimension values to count
+        """
+        positions = [DIMS.index(d) for d in dims]
+        totals = {}
+        for cell in self.slice(**filters):
+            key = tuple(cell[p] for p in positions)
+            totals[key] = totals.get(key, 0) + cell[3]
+        return totals
+
+    def top(self, dim, k=10, **filters):
+        """Most common values of one dimension, e.g. top emoji among `ja` tweets.
+
+        Args:
+            dim (str): One of "lang", "time" and "emoji"
+            k (int, optional): Number of values to return
+            **filters: Filters passed to `slice`
+
+        Returns:
+            List[tuple]: (value, count)
+        """
+        totals = self.rollup((dim,), **filters)
+        ranked = sorted(totals.items(), key=lambda kv: (-kv[1], kv[0]))[:k]
+        return [(key[0], n) for key, n in ranked]
+
+
+class AggregateCube(_CubeQueries):
+
+    """In memory cube built during a scan.
+
+    Attributes:
+        resolution (int): Width of each time bucket in seconds
+        langs (List[str]): Lang id to language code
+        cells (dict): Packed (lang id, bucket, emoji id) key to count
+    """
+
+    def __init__(self, resolution=HOUR):
+        """Initialize an empty cube.
+
+        Args:
+            resolution (int, optional): Width of each time bucket in seconds
+        """
+        self.resolution = resolution
+        self.langs = []
+        self._lang_ids = {}
+        self.cells = {}
+
+    def _encode_lang(self, lang):
+        lang_id = self._lang_ids.get(lang)
+        if lang_id is None:
+            lang_id = self._lang_ids[lang] = len(self.langs)
+            self.langs.append(lang)
+        return lang_id
+
+    def _lang_id(self, lang):
+        return self._lang_ids.get(lang)
+
+    def add_many(self, lang, t, emoji, counts):
+        """Adds the counts of the emoji in one tweet.
+
+        Args:
+            lang (str): Tweet language, "und" if None
+            t (int): Seconds since the epoch
+            emoji (List[str])
+            counts (List[int])
+        """
+        ids = get_catalog().ids
+        prefix = ((self._encode_lang(lang or "und") << BUCKET_BITS) | (t // self.resolution)) << EMOJI_BITS
+        cells = self.cells
+        for c, n in zip(emoji, counts):
+            key = prefix | ids[c]
+            cells[key] = cells.get(key, 0) + n
+
+    def _rows(self, lang_id=None):
+        bucket_mask = (1 << BUCKET_BITS) - 1
+        emoji_mask = (1 << EMOJI_BITS) - 1
+        for key, n in self.cells.items():
+            li = key >> (BUCKET_BITS + EMOJI_BITS)
+            if lang_id is None or li == lang_id:
+                yield li, (key >> EMOJI_BITS) & bucket_mask, key & emoji_mask, n
+
+    def merge(self, other):
+        """Merges another cube into this one in place, re-encoding its languages.
+
+        Args:
+            other (AggregateCube)
+
+        Returns:
+            AggregateCube: self
+        """
+        if self.resolution != other.resolution:
+            raise ValueError("Cannot merge cubes with different resolutions")
+        shift = BUCKET_BITS + EMOJI_BITS
+        remap = [self._encode_lang(lang) for lang in other.langs]
+        low_mask = (1 << shift) - 1
+        cells = self.cells
+        for key, n in other.cells.items():
+            key = (remap[key >> shift] << shift) | (key & low_mask)
+            cells[key] = cells.get(key, 0) + n
+        return self
+
+    def save(self, filename):
+        """Save to a binary file which `CubeFile` can memory map. Cells are sorted by
+        language, bucket and emoji id and stored as little-endian columns.
+
+        Args:
+            filename (str)
+        """
+        # Sort by language code so lang ranges are contiguous
+        order = sorted(range(len(self.langs)), key=lambda i: self.langs[i])
+        rank = {old: new for new, old in enumerate(order)}
+        rows = sorted((rank[li], b, e, n) for li, b, e, n in self._rows())
+
+        columns = [
+            array("q", (r[1] for r in rows)),
+            array("q", (r[3] for r in rows)),
+            array("H", (r[2] for r in rows)),
+            array("H", (r[0] for r in rows)),
+        ]
+        offsets = [0] * len(order)
+        ends = [0] * len(order)
+        for i, r in enumerate(rows):
+            if ends[r[0]] == 0:
+                offsets[r[0]] = i
+            ends[r[0]] = i + 1
+
+        header = json.dumps(
+            {
+                "resolution": self.resolution,
+                "langs": [self.langs[i] for i in order],
+                "lang_ranges": list(zip(offsets, ends)),
+                "n": len(rows),
+            }
+        ).encode("utf-8")
+        header += b" " * (-(PREAMBLE.size + len(header)) % 8)
+
+        with open(filename, "wb") as f:
+            f.write(PREAMBLE.pack(MAGIC, VERSION, len(header)))
+            f.write(header)
+            for column in columns:
+                if sys.byteorder == "big":
+                    column.byteswap()
+                column.tofile(f)
+
+
+class CubeFile(_CubeQueries):
+
+    """Read only cube memory mapped from a file written by `AggregateCube.save`.
+
+    Attributes:
+        resolution (int): Width of each time bucket in seconds
+        langs (List[str]): Lang id to language code
+        n (int): Number of non-zero cells
+    """
+
+    def __init__(self, filename):
+        """Memory map a cube file.
+
+        Args:
+            filename (str)
+
+        Raises:
+            ValueError: If the file is not a cube file
+        """
+        with open(filename, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_len = PREAMBLE.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError("{} is not a cube file".format(filename))
+        header = json.loads(self._mmap[PREAMBLE.size:PREAMBLE.size + header_len].decode("utf-8"))
+        self.resolution = header["resolution"]
+        self.langs = header["langs"]
+        self._lang_ranges = header["lang_ranges"]
+        self.n = header["n"]
+
+        buf = memoryview(self._mmap)
+        offset = PREAMBLE.size + header_len
+        self._columns = []
+        for code, size in (("q", 8), ("q", 8), ("H", 2), ("H", 2)):
+            column = buf[offset:offset + size * self.n].cast(code)
+            if sys.byteorder == "big":
+                column = array(code, column)
+                column.byteswap()
+            self._columns.append(column)
+            offset += size * self.n
+        self._buckets, self._counts, self._emoji, self._lang = self._columns
+
+    def _rows(self, lang_id=None):
+        if lang_id is None:
+            lo, hi = 0, self.n
+        else:
+            lo, hi = self._lang_ranges[lang_id]
+        buckets, counts, emoji, lang = self._buckets, self._counts, self._emoji, self._lang
+        for i in range(lo, hi):
+            yield lang[i], buckets[i], emoji[i], counts[i]
+
+    def close(self):
+        """Release the memory map."""
+        for column in self._columns:
+            if isinstance(column, memoryview):
+                column.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CubeTally(Field):
+
+    """Emoji counts per language and time bucket."""
+
+    scalable = True
+
+    def __init__(self, resolution=HOUR):
+        """Bucket width used for every value of the field.
+
+        Args:
+            resolution (int, optional): Width of each time bucket in seconds
+        """
+        self.resolution = resolution
+
+    def new(self):
+        return AggregateCube(self.resolution)
+
+    def merge(self, a, b):
+        return a.merge(b)
+
+    def scale(self, value, factor):
+        value.cells = {key: scale_count(n, factor) for key, n in value.cells.items()}
+        return value
+
+    def dump(self, value):
+        return list(value.slice())
+
+    def load(self, data):
+        value = self.new()
+        for lang, t, emoji, n in data:
+            value.add_many(lang, t, [emoji], [n])
+        return value
@@ -4,28 +4,56 @@
 Functions reading twitter data dumps
 """
 import bz2
+import calendar
 import json
 import os
 import tarfile
 
+MONTHS = {
+    "Jan": 1, "Feb": 2, "Mar": 3, "Apr": 4, "May": 5, "Jun": 6,
+    "Jul": 7, "Aug": 8, "Sep": 9, "Oct": 10, "Nov": 11, "Dec": 12,
+}
 
-def read_zip(filename):
+
+class _DigestReader:
+
+    """Binary file which passes every chunk read from it to a digest."""
+
+    def __init__(self, filename, digest):
+        self._f = open(filename, "rb")
+        self._digest = digest
+
+    def read(self, size=-1):
+        data = self._f.read(size)
+        self._digest.update(data)
+        return data
+
+    def close(self):
+        self._f.close()
+
+
+def read_zip(filename, digest=None):
     """Reads tweet zip file from https://archive.org/details/twitterstream.
 
     Args:
         filename (str)
+        digest (optional): Updated with the compressed bytes as they are read, e.g.
+            a hashlib hash, so the file is hashed without reading it again
 
     Yields:
         dict
     """
     # Decompress and decode .bz2 file
-    fbz = bz2.BZ2File(filename, "rb")
+    raw = None if digest is None else _DigestReader(filename, digest)
+    fbz = bz2.BZ2File(filename if raw is None else raw, "rb")
     try:
         fdec = fbz.read()
     except IOError:
         return None
     finally:
         fbz.close()
+        if raw is not None:
+            raw.close()
     fdecutf = fdec.decode("utf-8")
 
     # Loop through each line in file
@@ -39,6 +67,28 @@ def read_zip(filename):
         yield tweet
 
 
+def tweet_time(tweet):
+    """Time of a tweet in seconds since the epoch, from `timestamp_ms` if present
+    or from `created_at`, e.g. "Mon Aug 01 00:05:00 +0000 2016".
+
+    Args:
+        tweet (dict)
+
+    Returns:
+        int: None if the tweet has no time
+    """
+    if "timestamp_ms" in tweet:
+        return int(tweet["timestamp_ms"]) // 1000
+    created_at = tweet.get("created_at")
+    if created_at is None:
+        return None
+    _, month, day, hms, _, year = created_at.split(" ")
+    hour, minute, second = hms.split(":")
+    return calendar.timegm(
+        (int(year), MONTHS[month], int(day), int(hour), int(minute), int(second), 0, 0, 0)
+    )
+
+
 def unpack_files(data_path):
     """Unpacks tar files.
 
@@ -0,0 +1,104 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Example tweets of character patterns
+
+Collects up to `max_examples` example tweets of every pattern in a single pass
+over the archive. Each pattern keeps a `Reservoir`, so its examples are a
+uniform sample of every match seen rather than the first ones found. Files are
+scanned in a seeded random order and the run stops as soon as every pattern
+has a full reservoir, so the sample is spread over the whole month even when
+the scan ends early.
+
+    analysis = ExampleAnalysis([EMOJI_UNICODE[":pistol:"]], max_examples=200)
+    main(analysis)
+
+Examples are saved as `examples_<pattern>.txt`, numbered, with a blank line
+after each tweet.
+
+"""
+import os
+import random
+
+from twitter_search.aggregate import Results, Tally, Total
+from twitter_search.pipeline import Analysis
+from twitter_search.sampling import Reservoir, ReservoirTally, priority, tweet_key
+
+__all__ = ["ExampleAnalysis", "ExampleResults"]
+
+
+class ExampleResults(Results):
+
+    """Example tweets and match counts of each pattern."""
+
+    counter_total_tweets = Total()
+    counterdict_matches = Tally()
+    examples = ReservoirTally()
+
+
+class ExampleAnalysis(Analysis):
+
+    """Collects example tweets containing each of several patterns.
+
+    Attributes:
+        patterns (List[str]): Strings to match in the tweet text
+        max_examples (int): Examples kept of each pattern
+        lang (str): Language of the tweets to keep, None for any
+        seed (int): Seed of the file order and of the samples
+    """
+
+    name = "examples"
+    results_class = ExampleResults
+    stops_early = True
+    # Examples are the text of tweets, an extract keeps only emoji and gaps
+    extractable = False
+
+    def __init__(self, patterns, max_examples=200, lang="en", seed=0):
+        """Configure the patterns.
+
+        Args:
+            patterns (List[str])
+            max_examples (int, optional)
+            lang (str, optional)
+            seed (int, optional)
+        """
+        self.patterns = list(patterns)
+        self.max_examples = max_examples
+        self.lang = lang
+        self.seed = seed
+
+    def select(self, filenames):
+        """All files in a random order, fixed by the seed."""
+        filenames = list(filenames)
+        random.Random(self.seed).shuffle(filenames)
+        return filenames
+
+    def finished(self, results):
+        """Whether every pattern has all its examples."""
+        return all(pattern in results.examples and results.examples[pattern].full() for pattern in self.patterns)
+
+    def process(self, tweet, results):
+        results.counter_total_tweets += 1
+        if self.lang is not None and tweet.get("lang") != self.lang:
+            return
+        text = tweet["text"]
+        for pattern in self.patterns:
+            if pattern in text:
+                results.counterdict_matches.add(pattern)
+                if pattern not in results.examples:
+                    results.examples[pattern] = Reservoir(self.max_examples)
+                results.examples[pattern].add(priority(tweet_key(tweet), self.seed), text)
+
+    def summary(self, results):
+        lines = [("Total Tweets", results.counter_total_tweets)]
+        for pattern in self.patterns:
+            reservoir = results.examples.get(pattern, Reservoir(self.max_examples))
+            lines.append(("Examples {}".format(pattern), "{:d} of {:d} matches".format(len(reservoir.items), reservoir.seen)))
+        return lines
+
+    def save(self, results, output_dir="."):
+        for pattern in self.patterns:
+            reservoir = results.examples.get(pattern, Reservoir(self.max_examples))
+            with open(os.path.join(output_dir, "examples_{}.txt".format(pattern)), "w", encoding="utf-8") as f:
+                for i, text in enumerate(reservoir.sample(), 1):
+                    f.write("{:d}\n{}\n\n".format(i, text))
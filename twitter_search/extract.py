@@ -0,0 +1,381 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Columnar emoji extract of the archive
+
+A one time pass decompresses and parses each archive file and writes a small
+binary file of columns which `ExtractFile` opens with mmap. Analyses then run
+over the extract through `pipeline.ExtractAnalysis` without touching bz2 or
+JSON again.
+
+Tweets with emoji keep their id, time, dictionary encoded language, user id
+and their text as a sequence of tokens with offsets into one token column. The
+tokens are the emoji ids of `EmojiCatalog.tokens`, `SPACE` for a run of spaces
+and `GAP` for a run of any other characters, so everything which depends on
+emoji and their neighbours (counts, adjacency, n-grams, co-occurrence) is the
+same as on the archive, while words are not kept. Tweets without emoji are
+kept only as counts by language and minute.
+
+Analyses see skeleton tweets with the keys `text`, `id`, `timestamp_ms`, `lang`
+and `user` (as its id), when present in the original, plus `extract` set to True.
+
+Each archive file `<root>/<day>/<hour>/<name>.json.bz2` has its extract at
+`<store>/<day>/<hour>/<name>.tse`:
+
+    preamble    magic, version, header length
+    header      json: catalog hash, langs, row counts, source file size and mtime
+    ids         int64[n]        tweet id, -1 if missing
+    times       int64[n]        timestamp in ms, -1 if missing
+    users       int64[n]        user id, -1 if missing
+    offsets     int64[n + 1]    start of each tweet's tokens
+    total_times int64[m]        minute of the counted tweets in seconds, -1 if missing
+    total_count int64[m]        number of tweets without emoji
+    langs       uint16[n]       lang id, MISSING if missing
+    total_langs uint16[m]
+    tokens      uint16[tokens]  emoji ids, SPACE and GAP
+
+"""
+import hashlib
+import json
+import mmap
+import multiprocessing
+import os
+import struct
+import sys
+from array import array
+from functools import partial
+
+from tqdm import tqdm
+
+from twitter_search.catalog import get_catalog
+from twitter_search.data import get_all_files, read_zip, tweet_time
+
+__all__ = ["ExtractFile", "build_extract", "decode_tokens", "encode_text", "extract_file", "store_files", "store_path"]
+
+MAGIC = b"TSEX"
+VERSION = 1
+PREAMBLE = struct.Struct("<4sII")
+EXTENSION = ".tse"
+
+# Tokens which are not emoji ids, and the lang id of tweets without a language
+SPACE = 0xFFFE
+GAP = 0xFFFF
+MISSING = 0xFFFF
+
+# Stands in for a run of characters other than spaces and emoji in skeleton tweets
+GAP_CHAR = "\ufffd"
+
+# Seconds per bucket of the counts of tweets without emoji
+TOTALS_RESOLUTION = 60
+
+_catalog_hash = None
+
+
+def catalog_hash():
+    """Hash of the emoji catalog which token ids refer to.
+
+    Returns:
+        str
+    """
+    global _catalog_hash
+    if _catalog_hash is None:
+        state = "\n".join(get_catalog().emoji).encode("utf-8")
+        _catalog_hash = hashlib.blake2b(state, digest_size=8).hexdigest()
+    return _catalog_hash
+
+
+def encode_text(text):
+    """Tokens of a tweet text.
+
+    Args:
+        text (str)
+
+    Returns:
+        array: Token ids, empty if the text has no emoji
+    """
+    tokens = array("H")
+    prev = 0
+    for start, end, eid in get_catalog().tokens(text):
+        if start > prev:
+            tokens.append(SPACE if text[prev:start].strip(" ") == "" else GAP)
+        tokens.append(eid)
+        prev = end
+    if tokens and prev < len(text):
+        tokens.append(SPACE if text[prev:].strip(" ") == "" else GAP)
+    return tokens
+
+
+def decode_tokens(tokens):
+    """Skeleton text of tokens.
+
+    Args:
+        tokens (Iterable[int])
+
+    Returns:
+        str
+    """
+    emoji = get_catalog().emoji
+    return "".join(" " if t == SPACE else GAP_CHAR if t == GAP else emoji[t] for t in tokens)
+
+
+def store_path(filename, root, store):
+    """Extract file of an archive file.
+
+    Args:
+        filename (str): Archive file
+        root (str): Archive path
+        store (str): Extract store path
+
+    Returns:
+        str
+    """
+    relative = os.path.relpath(filename, root)
+    for suffix in (".bz2", ".json"):
+        if relative.endswith(suffix):
+            relative = relative[:-len(suffix)]
+    return os.path.join(store, relative + EXTENSION)
+
+
+def store_files(store, days=31, hours=24):
+    """Lists the extract files of a store, like `get_all_files` for the archive.
+
+    Args:
+        store (str): Extract store path
+        days (int, optional)
+        hours (int, optional)
+
+    Returns:
+        List[str]
+    """
+    return [f for f in get_all_files(store, days=days, hours=hours) if f.endswith(EXTENSION)]
+
+
+def _source(filename):
+    """Size and modification time of an archive file.
+
+    Returns:
+        list
+    """
+    stat = os.stat(filename)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def extract_file(filename, output):
+    """Writes the extract of an archive file, unless an extract of the same
+    version of the file already exists.
+
+    Args:
+        filename (str): Archive file
+        output (str): Extract file
+
+    Returns:
+        tuple: Tweets and tweets with emoji in the file, None if it was up to date
+    """
+    source = _source(filename)
+    if os.path.exists(output):
+        try:
+            with ExtractFile(output) as existing:
+                if existing.source == source:
+                    return None
+        except ValueError:
+            pass
+
+    lang_ids = {}
+    ids, times, users, offsets, langs = array("q"), array("q"), array("q"), array("q", [0]), array("H")
+    tokens = array("H")
+    totals = {}
+    n_tweets = 0
+    for tweet in read_zip(filename):
+        n_tweets += 1
+        lang = tweet.get("lang")
+        lang_id = MISSING if lang is None else lang_ids.setdefault(lang, len(lang_ids))
+        t = tweet_time(tweet)
+        text_tokens = encode_text(tweet.get("text") or "")
+        if not text_tokens:
+            minute = -1 if t is None else t - t % TOTALS_RESOLUTION
+            totals[lang_id, minute] = totals.get((lang_id, minute), 0) + 1
+            continue
+        user = tweet.get("user")
+        ids.append(-1 if tweet.get("id") is None else tweet["id"])
+        if "timestamp_ms" in tweet:
+            times.append(int(tweet["timestamp_ms"]))
+        else:
+            times.append(-1 if t is None else t * 1000)
+        users.append(-1 if not user or user.get("id") is None else user["id"])
+        langs.append(lang_id)
+        tokens.extend(text_tokens)
+        offsets.append(len(tokens))
+
+    rows = sorted(totals.items(), key=lambda item: (item[0][1], item[0][0]))
+    header = json.dumps(
+        {
+            "catalog": catalog_hash(),
+            "langs": sorted(lang_ids, key=lang_ids.get),
+            "n": len(ids),
+            "tokens": len(tokens),
+            "totals": len(rows),
+            "source": source,
+        }
+    ).encode("utf-8")
+    header += b" " * (-(PREAMBLE.size + len(header)) % 8)
+    columns = [
+        ids,
+        times,
+        users,
+        offsets,
+        array("q", (minute for (_, minute), _ in rows)),
+        array("q", (n for _, n in rows)),
+        langs,
+        array("H", (lang_id for (lang_id, _), _ in rows)),
+        tokens,
+    ]
+
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    tmp = "{}.{}.tmp".format(output, os.getpid())
+    with open(tmp, "wb") as f:
+        f.write(PREAMBLE.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        for column in columns:
+            if sys.byteorder == "big":
+                column.byteswap()
+            column.tofile(f)
+    os.replace(tmp, output)
+    return n_tweets, len(ids)
+
+
+def _extract_task(root, store, filename):
+    return extract_file(filename, store_path(filename, root, store))
+
+
+def build_extract(filenames, root, store, processes=None, progress=True):
+    """Extracts archive files in a pool of worker processes. Files with an up to
+    date extract are skipped, so an interrupted build continues where it stopped.
+
+    Args:
+        filenames (List[str]): Archive files
+        root (str): Archive path
+        store (str): Extract store path
+        processes (int, optional): Number of worker processes, the cpu count by default
+        progress (bool, optional): Show a progress bar
+
+    Returns:
+        dict: Numbers of files extracted and skipped, tweets and tweets with emoji
+    """
+    stats = {"files": 0, "skipped": 0, "tweets": 0, "tweets_wemoji": 0}
+    pool = multiprocessing.Pool(processes or multiprocessing.cpu_count())
+    try:
+        task = partial(_extract_task, root, store)
+        for counts in tqdm(pool.imap_unordered(task, filenames), total=len(filenames), unit="files", disable=not progress):
+            if counts is None:
+                stats["skipped"] += 1
+                continue
+            stats["files"] += 1
+            stats["tweets"] += counts[0]
+            stats["tweets_wemoji"] += counts[1]
+    finally:
+        pool.terminate()
+        pool.join()
+    return stats
+
+
+class ExtractFile:
+
+    """Read only extract of one archive file, memory mapped.
+
+    Attributes:
+        langs (List[str]): Lang id to language code
+        n (int): Number of tweets with emoji
+        source (list): Size and modification time of the archive file
+    """
+
+    def __init__(self, filename):
+        """Memory map an extract file.
+
+        Args:
+            filename (str)
+
+        Raises:
+            ValueError: If the file is not an extract, or was made with another emoji catalog
+        """
+        with open(filename, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_len = PREAMBLE.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError("{} is not an extract file".format(filename))
+        header = json.loads(self._mmap[PREAMBLE.size:PREAMBLE.size + header_len].decode("utf-8"))
+        if header["catalog"] != catalog_hash():
+            self._mmap.close()
+            raise ValueError("{} was extracted with another emoji catalog".format(filename))
+        self.langs = header["langs"]
+        self.n = header["n"]
+        self.source = header["source"]
+        m = header["totals"]
+
+        buf = memoryview(self._mmap)
+        offset = PREAMBLE.size + header_len
+        self._columns = []
+        for code, size, length in (
+            ("q", 8, self.n),
+            ("q", 8, self.n),
+            ("q", 8, self.n),
+            ("q", 8, self.n + 1),
+            ("q", 8, m),
+            ("q", 8, m),
+            ("H", 2, self.n),
+            ("H", 2, m),
+            ("H", 2, header["tokens"]),
+        ):
+            column = buf[offset:offset + size * length].cast(code)
+            if sys.byteorder == "big":
+                column = array(code, column)
+                column.byteswap()
+            self._columns.append(column)
+            offset += size * length
+        (self._ids, self._times, self._users, self._offsets, self._total_times, self._total_counts,
+         self._langs, self._total_langs, self._tokens) = self._columns
+
+    def _skeleton(self, text, tweet_id, ms, user, lang_id):
+        tweet = {"text": text, "extract": True}
+        if tweet_id != -1:
+            tweet["id"] = tweet_id
+        if ms != -1:
+            tweet["timestamp_ms"] = str(ms)
+        if user != -1:
+            tweet["user"] = {"id": user}
+        if lang_id != MISSING:
+            tweet["lang"] = self.langs[lang_id]
+        return tweet
+
+    def tweets(self):
+        """Skeleton tweets with emoji, in the order of the archive file.
+
+        Yields:
+            dict
+        """
+        offsets, tokens = self._offsets, self._tokens
+        for i in range(self.n):
+            text = decode_tokens(tokens[offsets[i]:offsets[i + 1]])
+            yield self._skeleton(text, self._ids[i], self._times[i], self._users[i], self._langs[i])
+
+    def totals(self):
+        """Skeleton tweets without emoji, one per language and minute.
+
+        Yields:
+            tuple: Skeleton tweet and the number of tweets it stands for
+        """
+        for minute, n, lang_id in zip(self._total_times, self._total_counts, self._total_langs):
+            yield self._skeleton("", -1, -1 if minute == -1 else minute * 1000, -1, lang_id), n
+
+    def close(self):
+        """Release the memory map."""
+        for column in self._columns:
+            if isinstance(column, memoryview):
+                column.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,238 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File leases in a shared work directory for runs spread over several hosts
+
+Every node (a runner on any host which mounts the archive and the work
+directory) claims a file by atomically creating its lease file. A lease older
+than the time to live belongs to a node which died, and is re-claimed by the
+next node to try. A live node keeps renewing its leases with a `Heartbeat`
+while it processes the files and until their results are saved, however long
+that takes. Each node saves its merged partial results under `partials/`
+and only then marks its files done, so a file is either done and in exactly one
+partial, or will be processed again.
+
+    workdir/
+        leases/<key hash>.lease
+        done/<key hash>
+        partials/<node>.json
+
+"""
+import hashlib
+import os
+import socket
+import threading
+import time
+
+__all__ = ["Heartbeat", "LeaseDirectory"]
+
+# Renewals of a held lease within its time to live
+RENEWALS_PER_TTL = 4
+
+
+class LeaseDirectory:
+
+    """Lease, done marker and partial results files of one run.
+
+    Attributes:
+        workdir (str): Shared work directory
+        node (str): Name of this node, unique across hosts
+        ttl (float): Seconds after which a lease has expired
+        root (str): Archive path, file keys are relative to it so hosts can mount
+            the archive at different paths
+    """
+
+    def __init__(self, workdir, node=None, ttl=600, root=None):
+        """Use a work directory, created if needed.
+
+        Args:
+            workdir (str)
+            node (str, optional): Name of this node, host name and process id by default
+            ttl (float, optional): Seconds after which a lease has expired
+            root (str, optional): Archive path
+        """
+        self.workdir = workdir
+        self.node = node or "{}-{}".format(socket.gethostname(), os.getpid())
+        self.ttl = ttl
+        self.root = root
+        for subdir in ("leases", "done", "partials"):
+            os.makedirs(os.path.join(workdir, subdir), exist_ok=True)
+
+    def key(self, filename):
+        """Host independent key of a file.
+
+        Args:
+            filename (str)
+
+        Returns:
+            str
+        """
+        if self.root is None:
+            return filename
+        return os.path.relpath(filename, self.root)
+
+    def _path(self, subdir, key, suffix=""):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+        return os.path.join(self.workdir, subdir, digest + suffix)
+
+    def _expired(self, path):
+        """Whether a lease file is older than the time to live, or gone.
+
+        Returns:
+            bool
+        """
+        try:
+            return time.time() - os.stat(path).st_mtime > self.ttl
+        except FileNotFoundError:
+            return True
+
+    def claim(self, key):
+        """Try to take the lease of a file.
+
+        Args:
+            key (str)
+
+        Returns:
+            bool: Whether this node now holds the lease
+        """
+        path = self._path("leases", key, ".lease")
+        for _ in range(3):
+            try:
+                fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if not self._expired(path):
+                    return False
+                # Move the expired lease aside, only one node's rename can succeed
+                stale = "{}.{}.stale".format(path, self.node)
+                try:
+                    os.rename(path, stale)
+                except FileNotFoundError:
+                    continue
+                if not self._expired(stale):
+                    # Another node re-claimed it first, put its lease back
+                    try:
+                        os.link(stale, path)
+                    except FileExistsError:
+                        pass
+                    os.unlink(stale)
+                    return False
+                os.unlink(stale)
+                continue
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write("{}\n{}\n".format(self.node, key))
+            return True
+        return False
+
+    def renew(self, key):
+        """Restart the time to live of a lease held by this node.
+
+        Args:
+            key (str)
+
+        Returns:
+            bool: Whether this node still holds the lease
+        """
+        path = self._path("leases", key, ".lease")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                if f.readline().rstrip("\n") != self.node:
+                    return False
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def release(self, key):
+        """Give up the lease of a file.
+
+        Args:
+            key (str)
+        """
+        try:
+            os.unlink(self._path("leases", key, ".lease"))
+        except FileNotFoundError:
+            pass
+
+    def complete(self, key):
+        """Mark a file done and release its lease. Call only after the results of
+        the file have been saved in this node's partial.
+
+        Args:
+            key (str)
+        """
+        with open(self._path("done", key), "w", encoding="utf-8") as f:
+            f.write("{}\n{}\n".format(self.node, key))
+        self.release(key)
+
+    def is_done(self, key):
+        """Whether a file has been completed by any node.
+
+        Args:
+            key (str)
+
+        Returns:
+            bool
+        """
+        return os.path.exists(self._path("done", key))
+
+    def partial(self, node=None):
+        """Path of the partial results of a node.
+
+        Args:
+            node (str, optional): This node by default
+
+        Returns:
+            str
+        """
+        return os.path.join(self.workdir, "partials", "{}.json".format(node or self.node))
+
+    def partials(self):
+        """Paths of the partial results of all nodes.
+
+        Returns:
+            List[str]
+        """
+        directory = os.path.join(self.workdir, "partials")
+        return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".json"))
+
+
+class Heartbeat:
+
+    """Renews leases from a background thread, `RENEWALS_PER_TTL` times per time
+    to live, while it is entered as a context manager.
+
+        with Heartbeat(leases, lambda: [key]):
+            results = worker(filename)
+
+    Attributes:
+        leases (LeaseDirectory)
+        keys (function): Returns the keys of the leases to renew, called at every renewal
+        interval (float): Seconds between renewals
+    """
+
+    def __init__(self, leases, keys):
+        """Configure the leases to renew.
+
+        Args:
+            leases (LeaseDirectory)
+            keys (function)
+        """
+        self.leases = leases
+        self.keys = keys
+        self.interval = leases.ttl / RENEWALS_PER_TTL
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            for key in list(self.keys()):
+                self.leases.renew(key)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
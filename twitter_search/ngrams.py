@@ -0,0 +1,144 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Emoji n-gram counts
+
+Counts every run of adjacent emoji in a tweet as bigrams and trigrams, e.g.
+🔪🔫💣 gives 🔪🔫, 🔫💣 and 🔪🔫💣. Like `_list_clean`, spaces between emoji can
+be ignored, any other character breaks the run. N-grams are keyed by tuples
+of emoji ids.
+
+"""
+from twitter_search.aggregate import Field, scale_count
+from twitter_search.catalog import get_catalog
+from twitter_search.twitter_search_funcs import merge_counts
+
+__all__ = ["EmojiNgrams", "NgramTally", "emoji_runs"]
+
+
+def emoji_runs(text, ignore_spaces=True):
+    """Splits the emoji in a text into runs of adjacent emoji.
+
+    Args:
+        text (str): Tweet text
+        ignore_spaces (bool, optional): Treat emoji separated only by spaces as adjacent
+
+    Returns:
+        List[List[int]]: Emoji ids of each run
+    """
+    runs = []
+    run = []
+    prev_end = None
+    for start, end, eid in get_catalog().tokens(text):
+        # Any characters other than ignored spaces end the run
+        if prev_end is not None and start > prev_end:
+            if not (ignore_spaces and text[prev_end:start].strip(" ") == ""):
+                if len(run) > 1:
+                    runs.append(run)
+                run = []
+        run.append(eid)
+        prev_end = end
+    if len(run) > 1:
+        runs.append(run)
+    return runs
+
+
+class EmojiNgrams:
+
+    """Counts of emoji n-grams keyed by tuples of emoji ids.
+
+    Attributes:
+        sizes (tuple): N-gram lengths counted
+        ignore_spaces (bool): Treat emoji separated only by spaces as adjacent
+        counts (dict): Tuple of emoji ids to count
+    """
+
+    def __init__(self, sizes=(2, 3), ignore_spaces=True):
+        """Initialize with no counts.
+
+        Args:
+            sizes (tuple, optional): N-gram lengths counted
+            ignore_spaces (bool, optional): Treat emoji separated only by spaces as adjacent
+        """
+        self.sizes = tuple(sizes)
+        self.ignore_spaces = ignore_spaces
+        self.counts = {}
+
+    def add_text(self, text):
+        """Counts all n-grams in a tweet.
+
+        Args:
+            text (str): Tweet text
+        """
+        counts = self.counts
+        for run in emoji_runs(text, self.ignore_spaces):
+            for n in self.sizes:
+                for i in range(len(run) - n + 1):
+                    key = tuple(run[i:i + n])
+                    counts[key] = counts.get(key, 0) + 1
+
+    def __getitem__(self, ngram):
+        ids = get_catalog().ids
+        return self.counts.get(tuple(ids[c] for c in ngram), 0)
+
+    def top(self, k=200, n=None):
+        """Most common n-grams.
+
+        Args:
+            k (int, optional): Number of n-grams to return
+            n (int, optional): Only n-grams of this length
+
+        Returns:
+            List[tuple]: (n-gram string, count)
+        """
+        emoji = get_catalog().emoji
+        items = ((key, c) for key, c in self.counts.items() if n is None or len(key) == n)
+        ranked = sorted(items, key=lambda kv: (-kv[1], kv[0]))[:k]
+        return [("".join(emoji[i] for i in key), c) for key, c in ranked]
+
+    def merge(self, other):
+        """Merges another instance into this one in place.
+
+        Args:
+            other (EmojiNgrams)
+
+        Returns:
+            EmojiNgrams: self
+        """
+        merge_counts(self.counts, other.counts)
+        return self
+
+
+class NgramTally(Field):
+
+    """Counts of adjacent emoji sequences."""
+
+    scalable = True
+
+    def __init__(self, sizes=(2, 3), ignore_spaces=True):
+        """N-gram settings used for every value of the field.
+
+        Args:
+            sizes (tuple, optional): N-gram lengths counted
+            ignore_spaces (bool, optional): Treat emoji separated only by spaces as adjacent
+        """
+        self.sizes = tuple(sizes)
+        self.ignore_spaces = ignore_spaces
+
+    def new(self):
+        return EmojiNgrams(self.sizes, self.ignore_spaces)
+
+    def merge(self, a, b):
+        return a.merge(b)
+
+    def scale(self, value, factor):
+        value.counts = {key: scale_count(n, factor) for key, n in value.counts.items()}
+        return value
+
+    def dump(self, value):
+        return [[list(key), c] for key, c in value.counts.items()]
+
+    def load(self, data):
+        value = self.new()
+        value.counts = {tuple(key): c for key, c in data}
+        return value
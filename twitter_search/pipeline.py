@@ -0,0 +1,1346 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pipeline runner shared by all analyses
+
+An analysis declares its results class and how to process one tweet, and the
+runner takes care of the pool of worker processes, batching, merging, progress
+and timing. Scripts only define an `Analysis` subclass and call `main`.
+
+    class MyAnalysis(Analysis):
+        results_class = MyResults
+
+        def process(self, tweet, results):
+            results.counter_total_tweets += 1
+
+    if __name__ == "__main__":
+        main(MyAnalysis())
+
+"""
+import argparse
+import csv
+import hashlib
+import json
+import multiprocessing
+import os
+import signal
+import time
+from contextlib import contextmanager
+from functools import partial
+from timeit import default_timer as timer
+
+from tqdm import tqdm
+
+from twitter_search.aggregate import Counts, Results, batch_files, merge_counts, reduce_files, tree_merge
+from twitter_search.autotune import Autotuner
+from twitter_search.backpressure import Backpressure
+from twitter_search.cache import ResultCache
+from twitter_search.data import get_all_files, read_zip, unpack_files
+from twitter_search.extract import ExtractFile, store_files
+from twitter_search.lease import Heartbeat, LeaseDirectory
+from twitter_search.sampling import (
+    count_path,
+    count_values,
+    estimates,
+    file_key,
+    keep,
+    restore_units,
+    scaled,
+    swap_units,
+    tweet_key,
+    unscaled_fields,
+)
+from twitter_search.shared import SharedResults
+from twitter_search.staged import run_staged
+
+__all__ = [
+    "Analysis",
+    "Checkpoint",
+    "ExtractAnalysis",
+    "MultiAnalysis",
+    "MultiResults",
+    "SampledAnalysis",
+    "SampledResults",
+    "Runner",
+    "build_parser",
+    "main",
+]
+
+
+class Analysis:
+
+    """Base class for an analysis run over every tweet in the archive.
+
+    Instances are sent to the worker processes, so their attributes should be
+    small and picklable. Calling an instance with a filename processes that file,
+    which makes it usable anywhere a worker function is expected.
+
+    Attributes:
+        name (str): Short name of the analysis
+        version (str): Bumped whenever the results of the analysis change
+        results_class (type): Results subclass the analysis fills
+        stops_early (bool): Whether `finished` can end a run before every file is
+            processed, runs then merge results after every file to check it
+        extractable (bool): Whether the analysis can run over an extract, which
+            keeps emoji and their neighbours but not the words of the text
+    """
+
+    name = "analysis"
+    version = "1"
+    results_class = Results
+    stops_early = False
+    extractable = True
+
+    def new_results(self):
+        """Empty results.
+
+        Returns:
+            Results
+        """
+        return self.results_class()
+
+    def results_from_dict(self, data):
+        """Results from the output of their `to_dict`.
+
+        Args:
+            data (dict)
+
+        Returns:
+            Results
+        """
+        return self.results_class.from_dict(data)
+
+    def select(self, filenames):
+        """Files to run over and their order.
+
+        Args:
+            filenames (List[str]): All files of the archive in time order
+
+        Returns:
+            List[str]
+        """
+        return filenames
+
+    def finished(self, results):
+        """Whether the results are complete, so the rest of the files can be skipped.
+        Only checked when `stops_early` is set, by runs in a worker pool.
+
+        Args:
+            results (Results): Merged results so far
+
+        Returns:
+            bool
+        """
+        return False
+
+    def process(self, tweet, results):
+        """Adds one tweet to the results.
+
+        Args:
+            tweet (dict): Decoded tweet
+            results (Results): Updated in place
+        """
+        raise NotImplementedError
+
+    def process_many(self, tweet, n, results):
+        """Adds n copies of one tweet to the results, e.g. the tweets without emoji
+        of an extract which are only counted by language and time.
+
+        Args:
+            tweet (dict): Decoded tweet
+            n (int)
+            results (Results): Updated in place
+        """
+        for _ in range(n):
+            self.process(tweet, results)
+
+    def process_file(self, filename, digest=None):
+        """Processes every tweet in a zipped file.
+
+        Args:
+            filename (str)
+            digest (optional): Updated with the bytes of the file as it is read, see `read_zip`
+
+        Returns:
+            Results
+        """
+        results = self.new_results()
+        for tweet in read_zip(filename, digest):
+            self.process(tweet, results)
+        return results
+
+    def __call__(self, filename):
+        return self.process_file(filename)
+
+    def settings(self):
+        """Settings of this instance which determine the results, all of the
+        attributes by default. Override to leave out attributes which are not
+        json serializable, e.g. compiled patterns, and name their source instead.
+
+        Returns:
+            dict
+        """
+        return vars(self)
+
+    def fingerprint(self):
+        """Hash of everything which determines the results: the name, version,
+        results fields and their settings, and the `settings` of this instance.
+
+        Returns:
+            str: Hex digest
+
+        Raises:
+            TypeError: If a setting is not json serializable, as its repr may
+                differ between processes
+        """
+        fields = [(name, type(field).__name__, vars(field)) for name, field in self.results_class.fields()]
+        try:
+            state = json.dumps([self.name, self.version, fields, self.settings()], sort_keys=True)
+        except TypeError as e:
+            raise TypeError("Cannot fingerprint {} analysis, override settings: {}".format(self.name, e))
+        return hashlib.blake2b(state.encode("utf-8"), digest_size=8).hexdigest()
+
+    def summary(self, results):
+        """Totals printed at the end of a run.
+
+        Args:
+            results (Results)
+
+        Returns:
+            List[tuple]: (label, value)
+        """
+        return []
+
+    def save(self, results, output_dir="."):
+        """Save results to files.
+
+        Args:
+            results (Results)
+            output_dir (str, optional)
+        """
+        results.save(os.path.join(output_dir, "{}.json".format(self.name)))
+
+
+class MultiResults(Results):
+
+    """Results of each analysis of a `MultiAnalysis`.
+
+    Attributes:
+        parts (List[Results]): Results in the order of the analyses
+    """
+
+    def __init__(self, parts=()):
+        """Initialize with the results of each analysis.
+
+        Args:
+            parts (List[Results], optional)
+        """
+        self.parts = list(parts)
+
+    def merge(self, other):
+        for a, b in zip(self.parts, other.parts):
+            a.merge(b)
+        return self
+
+    def to_dict(self):
+        return {"parts": [part.to_dict() for part in self.parts]}
+
+
+class MultiAnalysis(Analysis):
+
+    """Several analyses run in a single pass, so each file is decompressed and
+    parsed once however many analyses there are. Each analysis keeps its own
+    results and saves them to a subdirectory named after it.
+
+    Attributes:
+        analyses (List[Analysis])
+    """
+
+    results_class = MultiResults
+
+    def __init__(self, analyses):
+        """Combine analyses with different names.
+
+        Args:
+            analyses (List[Analysis])
+        """
+        names = [analysis.name for analysis in analyses]
+        if len(set(names)) != len(names):
+            raise ValueError("Analyses must have different names: {}".format(names))
+        self.analyses = list(analyses)
+        self.name = "+".join(names)
+        self.version = "+".join(analysis.version for analysis in analyses)
+        self.stops_early = all(analysis.stops_early for analysis in analyses)
+        self.extractable = all(analysis.extractable for analysis in analyses)
+
+    def new_results(self):
+        return MultiResults(analysis.new_results() for analysis in self.analyses)
+
+    def results_from_dict(self, data):
+        return MultiResults(
+            analysis.results_from_dict(part) for analysis, part in zip(self.analyses, data["parts"])
+        )
+
+    def finished(self, results):
+        return all(analysis.finished(part) for analysis, part in zip(self.analyses, results.parts))
+
+    def process(self, tweet, results):
+        for analysis, part in zip(self.analyses, results.parts):
+            analysis.process(tweet, part)
+
+    def process_many(self, tweet, n, results):
+        for analysis, part in zip(self.analyses, results.parts):
+            analysis.process_many(tweet, n, part)
+
+    def fingerprint(self):
+        state = ",".join(analysis.fingerprint() for analysis in self.analyses)
+        return hashlib.blake2b(state.encode("utf-8"), digest_size=8).hexdigest()
+
+    def summary(self, results):
+        return [
+            ("{} {}".format(analysis.name, label), value)
+            for analysis, part in zip(self.analyses, results.parts)
+            for label, value in analysis.summary(part)
+        ]
+
+    def save(self, results, output_dir="."):
+        for analysis, part in zip(self.analyses, results.parts):
+            analysis_dir = os.path.join(output_dir, analysis.name)
+            os.makedirs(analysis_dir, exist_ok=True)
+            analysis.save(part, analysis_dir)
+
+
+class SampledResults(Results):
+
+    """Results of a `SampledAnalysis`.
+
+    Attributes:
+        sample (Results): Sums over the sampled units
+        squares (Counts): Sums of squared per-unit counts, by `count_path`
+        units (int): Number of sampled units
+    """
+
+    def __init__(self, sample=None, squares=None, units=0):
+        """Initialize with the sums over the sampled units.
+
+        Args:
+            sample (Results, optional)
+            squares (dict, optional)
+            units (int, optional)
+        """
+        self.sample = sample
+        self.squares = Counts(squares or {})
+        self.units = units
+
+    def add_unit(self, unit, counts):
+        """Adds the results of one sampled tweet or file.
+
+        Args:
+            unit (Results)
+            counts (Iterable[tuple]): Field name, key and count of each count in the unit
+        """
+        self.sample.merge(unit)
+        self.add_squares(counts)
+
+    def add_squares(self, counts):
+        """Counts one sampled unit whose results are already in the sample.
+
+        Args:
+            counts (Iterable[tuple]): Field name, key and count of each count in the unit
+        """
+        for name, key, n in counts:
+            self.squares.add(count_path(name, key), n * n)
+        self.units += 1
+
+    def merge(self, other):
+        self.sample.merge(other.sample)
+        merge_counts(self.squares, other.squares)
+        self.units += other.units
+        return self
+
+    def to_dict(self):
+        return {"sample": self.sample.to_dict(), "squares": dict(self.squares), "units": self.units}
+
+
+class SampledAnalysis(Analysis):
+
+    """An analysis run over a deterministic Bernoulli sample of the tweets or
+    files. Counts are saved scaled to full archive estimates, along with
+    `estimates.csv` of every count with its 95% confidence interval.
+
+    Attributes:
+        analysis (Analysis): Analysis run on the sample
+        rate (float): Probability of keeping each tweet or file
+        seed (int): Seed of the sample
+        unit (str): "tweets" or "files"
+        root (str): Archive path which file keys are relative to
+    """
+
+    results_class = SampledResults
+
+    def __init__(self, analysis, rate, seed=0, unit="tweets", root=None):
+        """Sample an analysis.
+
+        Args:
+            analysis (Analysis)
+            rate (float): Between 0 and 1
+            seed (int, optional)
+            unit (str, optional): "tweets" or "files"
+            root (str, optional): Archive path, so file samples are the same on every host
+
+        Raises:
+            ValueError: If the rate or unit is invalid
+        """
+        if not 0 < rate <= 1:
+            raise ValueError("Sample rate must be in (0, 1]: {}".format(rate))
+        if unit not in ("tweets", "files"):
+            raise ValueError("Sample unit must be tweets or files: {}".format(unit))
+        self.analysis = analysis
+        self.rate = rate
+        self.seed = seed
+        self.unit = unit
+        self.root = root
+        self.name = analysis.name
+        self.version = "{}+sample-{}-{}-{}".format(analysis.version, unit, rate, seed)
+
+    def new_results(self):
+        return SampledResults(self.analysis.new_results())
+
+    def results_from_dict(self, data):
+        return SampledResults(self.analysis.results_from_dict(data["sample"]), data["squares"], data["units"])
+
+    def select(self, filenames):
+        """Files which can contain sampled units.
+
+        Args:
+            filenames (List[str])
+
+        Returns:
+            List[str]
+        """
+        filenames = self.analysis.select(filenames)
+        if self.unit == "tweets":
+            return filenames
+        return [f for f in filenames if keep(file_key(f, self.root), self.rate, self.seed)]
+
+    def process(self, tweet, results):
+        if self.unit == "files":
+            raise ValueError("Sampling files requires whole files, use process_file")
+        if not keep(tweet_key(tweet), self.rate, self.seed):
+            return
+        # Process into the sample with the count fields swapped for ones of just this tweet
+        parts = results.sample.parts if isinstance(self.analysis, MultiAnalysis) else [results.sample]
+        saved = [swap_units(part) for part in parts]
+        try:
+            self.analysis.process(tweet, results.sample)
+            counts = list(self._count_values(results.sample))
+        finally:
+            for part, values in zip(parts, saved):
+                restore_units(part, values)
+        results.add_squares(counts)
+
+    def process_file(self, filename, digest=None):
+        if self.unit == "tweets":
+            return super().process_file(filename, digest)
+        results = self.new_results()
+        if keep(file_key(filename, self.root), self.rate, self.seed):
+            unit = self.analysis.process_file(filename, digest)
+            results.add_unit(unit, self._count_values(unit))
+        return results
+
+    def _count_values(self, results):
+        """Counts in results of the sampled analysis, see `count_values`. The
+        fields of multiple analyses are named `<analysis>.<field>`.
+
+        Yields:
+            tuple: Field name, key and count
+        """
+        if not isinstance(self.analysis, MultiAnalysis):
+            yield from count_values(results)
+            return
+        for analysis, part in zip(self.analysis.analyses, results.parts):
+            for name, key, n in count_values(part):
+                yield "{}.{}".format(analysis.name, name), key, n
+
+    def _scaled(self, results):
+        """Results of the sampled analysis with counts scaled to full archive estimates.
+
+        Returns:
+            Results
+        """
+        if isinstance(self.analysis, MultiAnalysis):
+            return MultiResults(scaled(part, self.rate) for part in results.parts)
+        return scaled(results, self.rate)
+
+    def fingerprint(self):
+        state = "{},{},{},{}".format(self.analysis.fingerprint(), self.unit, self.rate, self.seed)
+        return hashlib.blake2b(state.encode("utf-8"), digest_size=8).hexdigest()
+
+    def _unscaled_fields(self, results):
+        """Fields of the sampled analysis saved at their sample values, named as in
+        `_count_values`.
+
+        Returns:
+            List[str]
+        """
+        if not isinstance(self.analysis, MultiAnalysis):
+            return unscaled_fields(results)
+        return [
+            "{}.{}".format(analysis.name, name)
+            for analysis, part in zip(self.analysis.analyses, results.parts)
+            for name in unscaled_fields(part)
+        ]
+
+    def summary(self, results):
+        lines = [("Sample Rate", self.rate), ("Sampled {}".format(self.unit.capitalize()), results.units)]
+        unscaled = self._unscaled_fields(results.sample)
+        if unscaled:
+            lines.append(("Unscaled Fields", ", ".join(unscaled)))
+        return lines + self.analysis.summary(self._scaled(results.sample))
+
+    def save(self, results, output_dir="."):
+        """Save the sampled analysis with its counts scaled, `estimates.csv` and,
+        if any fields cannot be scaled, `unscaled_fields.txt` listing those saved
+        at their raw sample values."""
+        self.analysis.save(self._scaled(results.sample), output_dir)
+        unscaled = self._unscaled_fields(results.sample)
+        if unscaled:
+            with open(os.path.join(output_dir, "unscaled_fields.txt"), "w", encoding="utf-8") as f:
+                f.write("Saved at their raw sample values, not scaled to the full archive:\n")
+                f.write("".join("{}\n".format(name) for name in unscaled))
+        with open(os.path.join(output_dir, "estimates.csv"), "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["field", "key", "sample", "estimate", "lower", "upper"])
+            for row in estimates(self._count_values(results.sample), results.squares, self.rate):
+                writer.writerow(row)
+
+
+class ExtractAnalysis(Analysis):
+
+    """An analysis run over an extract store made by `extract.build_extract`
+    instead of the archive, so files are memory mapped columns rather than bz2
+    and JSON. Results depending only on emoji, their neighbours, languages,
+    times and ids are the same as on the archive. Words are not in the extract.
+
+    Attributes:
+        analysis (Analysis): Analysis run on the extract
+    """
+
+    def __init__(self, analysis):
+        """Run an analysis on extract files.
+
+        Args:
+            analysis (Analysis)
+
+        Raises:
+            ValueError: If the analysis is not `extractable`
+        """
+        if not analysis.extractable:
+            raise ValueError("The {} analysis needs the text of tweets, which an extract does not keep".format(analysis.name))
+        self.analysis = analysis
+        self.name = analysis.name
+        self.version = "{}+extract".format(analysis.version)
+        self.results_class = analysis.results_class
+        self.stops_early = analysis.stops_early
+
+    def new_results(self):
+        return self.analysis.new_results()
+
+    def results_from_dict(self, data):
+        return self.analysis.results_from_dict(data)
+
+    def select(self, filenames):
+        return self.analysis.select(filenames)
+
+    def finished(self, results):
+        return self.analysis.finished(results)
+
+    def process(self, tweet, results):
+        self.analysis.process(tweet, results)
+
+    def process_many(self, tweet, n, results):
+        self.analysis.process_many(tweet, n, results)
+
+    def process_file(self, filename, digest=None):
+        """Processes every tweet in an extract file.
+
+        Args:
+            filename (str): Extract file
+            digest (optional): Not updated, extracts are memory mapped rather than read
+
+        Returns:
+            Results
+        """
+        results = self.new_results()
+        with ExtractFile(filename) as extract:
+            for tweet in extract.tweets():
+                self.analysis.process(tweet, results)
+            for tweet, n in extract.totals():
+                self.analysis.process_many(tweet, n, results)
+        return results
+
+    def fingerprint(self):
+        state = "{},extract".format(self.analysis.fingerprint())
+        return hashlib.blake2b(state.encode("utf-8"), digest_size=8).hexdigest()
+
+    def summary(self, results):
+        return self.analysis.summary(results)
+
+    def save(self, results, output_dir="."):
+        self.analysis.save(results, output_dir)
+
+
+def _reduce_batch(worker, filenames):
+    """Reduces a batch of files in a worker process.
+
+    Args:
+        worker (function): Takes a filename and returns Results
+        filenames (List[str])
+
+    Returns:
+        tuple: The filenames and their merged results, which may be None
+    """
+    return filenames, reduce_files(worker, filenames)
+
+
+def _leased_task(leases, worker, filename):
+    """Processes a file if its lease can be taken and it is not done yet.
+
+    Args:
+        leases (LeaseDirectory)
+        worker (function): Takes a filename and returns Results
+        filename (str)
+
+    Returns:
+        tuple: Key of the file and its results, None if it was not processed
+    """
+    key = leases.key(filename)
+    if leases.is_done(key) or not leases.claim(key):
+        return key, None
+    # Another node may have completed it and released the lease just before the claim
+    if leases.is_done(key):
+        leases.release(key)
+        return key, None
+    # Files can take longer than the time to live, keep the lease while processing
+    with Heartbeat(leases, lambda: [key]):
+        return key, worker(filename)
+
+
+@contextmanager
+def _uninterrupted():
+    """Holds back a KeyboardInterrupt until the end of the block, so results and
+    the keys of their files are updated together. Outside the main thread, where
+    signal handlers cannot be set, the block runs as is.
+
+    Raises:
+        KeyboardInterrupt: After the block, if one was held back
+    """
+    interrupted = []
+    try:
+        previous = signal.signal(signal.SIGINT, lambda signum, frame: interrupted.append(signum))
+    except ValueError:
+        yield
+        return
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGINT, signal.default_int_handler if previous is None else previous)
+    if interrupted:
+        raise KeyboardInterrupt
+
+
+class Checkpoint:
+
+    """Periodic snapshot of merged results and the files they cover, so a long
+    run can be resumed after a crash or interrupt. Snapshots are written to a
+    temporary file and renamed, so the checkpoint file is always complete.
+
+    Completed files are recorded by their path relative to the archive root, so
+    a run resumed with the root spelled differently still skips them.
+
+    Attributes:
+        filename (str)
+        every_files (int): Files completed between checkpoints, 0 to only use time
+        every_seconds (float): Seconds between checkpoints, 0 to only use files
+        root (str): Archive path completed files are relative to, None to record them as given
+    """
+
+    def __init__(self, filename, every_files=100, every_seconds=300, root=None):
+        """Configure a checkpoint file.
+
+        Args:
+            filename (str)
+            every_files (int, optional): Files completed between checkpoints
+            every_seconds (float, optional): Seconds between checkpoints
+            root (str, optional): Archive path
+        """
+        self.filename = filename
+        self.every_files = every_files
+        self.every_seconds = every_seconds
+        self.root = root
+        self._last_files = 0
+        self._last_time = time.time()
+
+    def due(self, files_done):
+        """Whether enough files or time have passed since the last checkpoint.
+
+        Args:
+            files_done (int): Number of files completed so far
+
+        Returns:
+            bool
+        """
+        if self.every_files and files_done - self._last_files >= self.every_files:
+            return True
+        return bool(self.every_seconds) and time.time() - self._last_time >= self.every_seconds
+
+    def key(self, filename):
+        """Key a completed file is recorded by.
+
+        Args:
+            filename (str)
+
+        Returns:
+            str
+        """
+        if self.root is None:
+            return filename
+        return os.path.relpath(filename, self.root)
+
+    def save(self, analysis, results, done):
+        """Write a checkpoint.
+
+        Args:
+            analysis (Analysis)
+            results (Results): Merged results of all completed files
+            done (set): Keys of the completed files
+        """
+        data = {
+            "analysis": analysis.name,
+            "version": analysis.version,
+            "fingerprint": analysis.fingerprint(),
+            "done": sorted(done),
+            "results": results.to_dict(),
+        }
+        tmp = "{}.tmp".format(self.filename)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self.filename)
+        self._last_files = len(done)
+        self._last_time = time.time()
+
+    def load(self, analysis):
+        """Read the checkpoint, if there is one.
+
+        Args:
+            analysis (Analysis)
+
+        Returns:
+            tuple: Results and set of keys of the completed files, empty if there is no checkpoint
+
+        Raises:
+            ValueError: If the checkpoint is from another analysis, version or settings
+        """
+        if not os.path.exists(self.filename):
+            return analysis.new_results(), set()
+        with open(self.filename, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if (data["analysis"], data["version"]) != (analysis.name, analysis.version):
+            raise ValueError(
+                "Checkpoint {} is from {} version {}".format(self.filename, data["analysis"], data["version"])
+            )
+        if data.get("fingerprint") != analysis.fingerprint():
+            raise ValueError("Checkpoint {} is from {} with other settings".format(self.filename, data["analysis"]))
+        done = set(data["done"])
+        self._last_files = len(done)
+        return analysis.results_from_dict(data["results"]), done
+
+
+class Runner:
+
+    """Runs an analysis over a list of files in a pool of worker processes.
+
+    Attributes:
+        analysis (Analysis)
+        processes (int): Number of worker processes
+        batch_size (int): Files each worker reduces before sending back results, 0 for automatic
+        tree (bool): Merge worker results as a tree in the pool
+        shared (bool): Aggregate emoji counters in shared memory
+        progress (bool): Show a progress bar
+        checkpoint (Checkpoint): Where to save progress, None to not checkpoint
+        resume (bool): Skip files completed in the checkpoint and start from its results
+        cache (ResultCache): Per-file results to reuse, None to process every file
+        stages (tuple): Numbers of producer and consumer processes of a staged pipeline,
+            None to decode and analyse in the same worker
+        leases (LeaseDirectory): Shared work directory when several nodes split the
+            files, None to process every file here
+        poll (float): Seconds between checks for files leased by other nodes
+        autotune (Autotuner): Chooses the processes and batch size from trials over
+            the first files, None to use the configured settings
+        backpressure (Backpressure): Limits on tasks in flight, unmerged results and worker memory
+        elapsed (float): Seconds taken by the last run
+        log (dict): Settings and timing of the last run
+    """
+
+    def __init__(
+        self,
+        analysis,
+        processes=None,
+        batch_size=0,
+        tree=False,
+        shared=False,
+        progress=True,
+        checkpoint=None,
+        resume=False,
+        cache=None,
+        stages=None,
+        leases=None,
+        poll=5,
+        autotune=None,
+        backpressure=None,
+    ):
+        """Configure a runner.
+
+        Args:
+            analysis (Analysis)
+            processes (int, optional): Number of worker processes, the cpu count by default
+            batch_size (int, optional): Files each worker reduces before sending back results
+            tree (bool, optional): Merge worker results as a tree in the pool
+            shared (bool, optional): Aggregate emoji counters in shared memory
+            progress (bool, optional): Show a progress bar
+            checkpoint (Checkpoint, optional): Where to save progress
+            resume (bool, optional): Skip files completed in the checkpoint
+            cache (ResultCache, optional): Per-file results to reuse
+            stages (tuple, optional): Numbers of producer and consumer processes
+            leases (LeaseDirectory, optional): Shared work directory of several nodes
+            poll (float, optional): Seconds between checks for files leased by other nodes
+            autotune (Autotuner, optional): Chooses the processes and batch size
+            backpressure (Backpressure, optional): Limits on work in flight, defaults
+                to two tasks per process and one unmerged result per process
+
+        Raises:
+            ValueError: If shared memory results are used with checkpoints or multiple
+                analyses, or a staged pipeline, leases or autotuning with other modes
+        """
+        if autotune is not None and (shared or stages is not None or leases is not None):
+            # Trials run pools of whole file batches, shared slots are sized per process
+            raise ValueError("Autotuning does not support shared, staged or lease options")
+        if leases is not None and (shared or tree or stages is not None or checkpoint is not None or resume):
+            # Each node already saves its partial results to the work directory
+            raise ValueError("Leases do not support shared, tree, staged, checkpoint or resume options")
+        if stages is not None and (shared or tree or checkpoint is not None or cache is not None):
+            # Consumers see records from many files, so there are no per-file results
+            raise ValueError("A staged pipeline does not support shared, tree, checkpoint or cache options")
+        if checkpoint is not None and shared:
+            # Shared slots can hold counts of files which have not been reported back yet
+            raise ValueError("Checkpoints are not supported with shared memory results")
+        if shared and isinstance(analysis, (MultiAnalysis, SampledAnalysis)):
+            raise ValueError("Shared memory results are not supported with multiple or sampled analyses")
+        if stages is not None and isinstance(analysis, SampledAnalysis) and analysis.unit == "files":
+            raise ValueError("A staged pipeline does not support sampling files")
+        if stages is not None and isinstance(analysis, ExtractAnalysis):
+            # Producers decode archive files, an extract is already decoded
+            raise ValueError("A staged pipeline does not support extracts")
+        if resume and checkpoint is None:
+            raise ValueError("Resuming requires a checkpoint")
+        self.analysis = analysis
+        self.processes = processes or multiprocessing.cpu_count()
+        self.batch_size = batch_size
+        self.tree = tree
+        self.shared = shared
+        self.progress = progress
+        self.checkpoint = checkpoint
+        self.resume = resume
+        self.cache = cache
+        self.stages = stages
+        self.leases = leases
+        self.poll = poll
+        self.autotune = autotune
+        self.backpressure = backpressure or Backpressure()
+        self.elapsed = None
+        self.log = {}
+
+    @classmethod
+    def from_args(cls, analysis, args):
+        """Configure a runner from parsed CLI arguments.
+
+        Args:
+            analysis (Analysis)
+            args (argparse.Namespace): From a parser made by `build_parser`
+
+        Returns:
+            Runner
+        """
+        stages = None
+        if args.producers:
+            stages = (args.producers, args.consumers or max(multiprocessing.cpu_count() - args.producers, 1))
+        leases = None
+        if args.workdir:
+            leases = LeaseDirectory(args.workdir, args.node, args.lease_ttl, root=args.extract or args.data_path)
+        checkpoint = None
+        if args.checkpoint:
+            checkpoint = Checkpoint(
+                args.checkpoint, args.checkpoint_files, args.checkpoint_seconds, root=args.extract or args.data_path
+            )
+        return cls(
+            analysis,
+            processes=args.processes,
+            batch_size=args.batch_size,
+            tree=args.tree,
+            shared=args.shared,
+            checkpoint=checkpoint,
+            resume=args.resume,
+            cache=ResultCache(args.cache) if args.cache else None,
+            stages=stages,
+            leases=leases,
+            autotune=Autotuner(args.processes) if args.autotune else None,
+            backpressure=Backpressure(args.max_tasks, args.max_unmerged, int(args.max_rss * 1e6)),
+        )
+
+    def _worker(self):
+        """Function run on each file in the workers, through the cache if there is one.
+
+        Returns:
+            function
+        """
+        if self.cache is None:
+            return self.analysis
+        return partial(self.cache.process, self.analysis)
+
+    def _key(self, filename):
+        """Key a completed file is recorded by in the checkpoint, the filename without one.
+
+        Returns:
+            str
+        """
+        if self.checkpoint is None:
+            return filename
+        return self.checkpoint.key(filename)
+
+    def _batches(self, filenames):
+        """Splits files into batches, small enough for checkpoints to be written
+        as often as configured, and of one file if the analysis can stop early.
+
+        Returns:
+            List[List[str]]
+        """
+        if self.analysis.stops_early and not self.batch_size:
+            return batch_files(filenames, 1)
+        batches = batch_files(filenames, self.batch_size, self.processes)
+        if self.checkpoint is not None and self.checkpoint.every_files and not self.batch_size:
+            limit = max(self.checkpoint.every_files // self.processes, 1)
+            if batches and len(batches[0]) > limit:
+                batches = batch_files(filenames, limit)
+        return batches
+
+    def _snapshot(self, results, partials):
+        """Copy of the results merged with any partials held for a tree merge.
+
+        Returns:
+            Results
+        """
+        if not partials:
+            return results
+        snapshot = self.analysis.new_results().merge(results)
+        for partial_results in partials:
+            snapshot.merge(partial_results)
+        return snapshot
+
+    def _run_batches(self, pool, filenames, results, partials, done):
+        """Reduces batches of files in the workers and merges them into results.
+        With a tree merge the batch results are collected in partials instead.
+
+        Args:
+            pool (multiprocessing.Pool)
+            filenames (List[str])
+            results (Results): Updated in place
+            partials (list): Updated in place
+            done (set): Updated in place with the keys of the completed files
+        """
+        batches = self._batches(filenames)
+        processes = self.backpressure.imap(pool, partial(_reduce_batch, self._worker()), batches, self.processes)
+        for batch, partial_results in tqdm(processes, total=len(batches), unit="batches", disable=not self.progress):
+            self._merge_batch(batch, partial_results, results, partials, done)
+            if self.analysis.stops_early and self.analysis.finished(self._snapshot(results, partials)):
+                print("Finished early with {:d} of {:d} files done".format(len(done), len(filenames)))
+                break
+
+    def _merge_batch(self, batch, partial_results, results, partials, done):
+        """Merges the results of a batch, or keeps them in partials for a tree merge,
+        and saves a checkpoint when one is due. The results and the keys of the
+        batch are updated together, so a checkpoint never holds one without the other.
+
+        Args:
+            batch (List[str])
+            partial_results (Results): None if the batch had no results
+            results (Results): Updated in place
+            partials (list): Updated in place
+            done (set): Updated in place with the keys of the completed files
+        """
+        with _uninterrupted():
+            if partial_results is not None:
+                if self.tree:
+                    partials.append(partial_results)
+                else:
+                    results.merge(partial_results)
+            done.update(self._key(f) for f in batch)
+        if self.checkpoint is not None and self.checkpoint.due(len(done)):
+            self.checkpoint.save(self.analysis, self._snapshot(results, partials), done)
+
+    def run(self, filenames):
+        """Run the analysis over all files and print a summary. Results merged
+        before a KeyboardInterrupt are kept, and saved to the checkpoint if there
+        is one.
+
+        Args:
+            filenames (List[str])
+
+        Returns:
+            Results
+        """
+        start_t = timer()
+        results = self.analysis.new_results()
+        done = set()
+        if self.resume:
+            results, done = self.checkpoint.load(self.analysis)
+            filenames = [f for f in filenames if self._key(f) not in done]
+            print("Resuming with {:d} files done".format(len(done)))
+        multiprocessing.freeze_support()  # Prevent an error on Windows
+        if self.leases is not None:
+            results = self._run_leased(filenames)
+        elif self.stages is not None:
+            try:
+                run_staged(self.analysis, filenames, *self.stages, progress=self.progress, results=results)
+            except KeyboardInterrupt:
+                print("KeyboardInterrupt")
+        else:
+            results = self._run_pool(filenames, results, done)
+        if self.checkpoint is not None:
+            self.checkpoint.save(self.analysis, results, done)
+        self.elapsed = timer() - start_t
+        self.log = {
+            "files": len(filenames),
+            "elapsed": self.elapsed,
+            "processes": self.processes,
+            "batch_size": self.batch_size,
+            "peak_worker_rss": self.backpressure.peak_rss,
+            "memory_throttled": self.backpressure.throttled,
+        }
+        if self.autotune is not None:
+            self.log["autotune"] = self.autotune.settings()
+
+        summary = self.analysis.summary(results)
+        width = max([22] + [len(label) + 1 for label, _ in summary])
+        print("{:<{}}: {:.2f} min".format("Elapsed Time", width, self.elapsed / 60))
+        if self.autotune is not None:
+            print("{:<{}}: {}".format("Processes", width, self.processes))
+            print("{:<{}}: {}".format("Batch Size", width, self.batch_size))
+        for label, value in summary:
+            print("{:<{}}: {}".format(label, width, value))
+        return results
+
+    def _run_leased(self, filenames):
+        """Runs the analysis on the files this node can lease until every file is done
+        by some node, then merges the partial results of all nodes.
+
+        Args:
+            filenames (List[str])
+
+        Returns:
+            Results
+        """
+        leases = self.leases
+        # Save twice per lease time to live, so little finished work waits on renewed leases
+        checkpoint = Checkpoint(leases.partial(), every_seconds=leases.ttl / 2)
+        results, persisted = checkpoint.load(self.analysis)
+        # Results of processed files by key, kept apart until saved so files whose
+        # lease was lost to another node are dropped without being counted
+        pending = {}
+
+        def persist():
+            held = {key: file_results for key, file_results in pending.items() if leases.renew(key)}
+            lost = len(pending) - len(held)
+            if lost:
+                print("Dropped {} files whose lease expired, another node counts them".format(lost))
+            pending.clear()
+            with _uninterrupted():
+                for file_results in held.values():
+                    results.merge(file_results)
+                persisted.update(held)
+            checkpoint.save(self.analysis, results, persisted)
+            for key in held:
+                leases.complete(key)
+
+        remaining = [f for f in filenames if not leases.is_done(leases.key(f))]
+        bar = tqdm(total=len(filenames), initial=len(filenames) - len(remaining), unit="files", disable=not self.progress)
+        pool = multiprocessing.Pool(self.processes)
+        try:
+            # Processed files stay leased until their results are saved
+            with Heartbeat(leases, lambda: pending):
+                while remaining:
+                    task = partial(_leased_task, leases, self._worker())
+                    processed = 0
+                    for key, file_results in self.backpressure.imap(pool, task, remaining, self.processes):
+                        if file_results is None:
+                            continue
+                        pending[key] = file_results
+                        processed += 1
+                        bar.update()
+                        if checkpoint.due(len(persisted) + len(pending)):
+                            persist()
+                    persist()
+                    remaining = [f for f in remaining if not leases.is_done(leases.key(f))]
+                    if remaining and not processed:
+                        # The rest are leased by other nodes, wait for them or for their leases to expire
+                        time.sleep(self.poll)
+        except KeyboardInterrupt:
+            print("KeyboardInterrupt")
+            persist()
+        finally:
+            pool.terminate()
+            pool.join()
+            bar.close()
+
+        # Final merge of the partial results of every node
+        combined = self.analysis.new_results()
+        covered = set()
+        for path in leases.partials():
+            node_results, node_done = Checkpoint(path).load(self.analysis)
+            if covered & node_done:
+                raise RuntimeError("Files in more than one partial: {}".format(sorted(covered & node_done)[:5]))
+            covered |= node_done
+            combined.merge(node_results)
+        return combined
+
+    def _run_pool(self, filenames, results, done):
+        """Runs the analysis in a pool of workers which each decode and analyse whole files.
+
+        Args:
+            filenames (List[str])
+            results (Results): Updated in place
+            done (set): Updated in place with the keys of the completed files
+
+        Returns:
+            Results
+        """
+        partials = []
+        if self.autotune is not None:
+            task = partial(_reduce_batch, self._worker())
+            merge = partial(self._merge_batch, results=results, partials=partials, done=done)
+            try:
+                filenames = self.autotune.tune(task, filenames, merge)
+            except KeyboardInterrupt:
+                print("KeyboardInterrupt")
+                filenames = []
+            self.processes, self.batch_size = self.autotune.processes, self.autotune.batch_size
+        if self.shared:
+            shared = SharedResults(self.analysis.results_class, self.processes)
+            pool = shared.pool(self.processes)
+        else:
+            pool = multiprocessing.Pool(self.processes)
+        try:
+            if self.shared:
+                # Workers add to their own slot of shared memory, only unshared fields are returned
+                batches = self._batches(filenames)
+                processes = shared.imap(pool, self._worker(), batches, self.backpressure)
+                for unshared in tqdm(processes, total=len(batches), unit="batches", disable=not self.progress):
+                    shared.merge_unshared(results, unshared)
+            else:
+                self._run_batches(pool, filenames, results, partials, done)
+                if self.tree:
+                    merged = tree_merge([results] + partials, pool)
+                    with _uninterrupted():
+                        results, partials = merged, []
+        except KeyboardInterrupt:
+            print("KeyboardInterrupt")
+        finally:
+            pool.terminate()
+            pool.join()
+            if self.shared:
+                shared.collect(results)
+                shared.unlink()
+        for partial_results in partials:
+            results.merge(partial_results)
+        return results
+
+
+def build_parser():
+    """Parser of the CLI arguments common to all analyses.
+
+    Returns:
+        argparse.ArgumentParser
+    """
+    parser = argparse.ArgumentParser(
+        description="Search a Twitter archive (from archive.org)",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "-p",
+        "--data_path",
+        default="/your/data/path/archive-twitter-2016-08/",
+        help="Path to the Twitter archive",
+    )
+    parser.add_argument(
+        "-d", "--days", type=int, default=31, help="How many days to search (for testing)"
+    )
+    parser.add_argument(
+        "-hr", "--hours", type=int, default=24, help="How many hours to search (for testing)"
+    )
+    parser.add_argument(
+        "--extract",
+        default=None,
+        help="Extract store (from scripts/extract_archive.py) to run over instead of the archive",
+    )
+    parser.add_argument(
+        "--sample",
+        type=float,
+        default=0,
+        help="Fraction of tweets (or files) to sample, counts are scaled to full archive estimates (0 for no sampling)",
+    )
+    parser.add_argument(
+        "--sample_seed", type=int, default=0, help="Seed of the sample, the same seed gives the same sample"
+    )
+    parser.add_argument(
+        "--sample_files", default=False, action="store_true", help="Sample whole files instead of tweets"
+    )
+    parser.add_argument(
+        "-u", "--unpack", default=False, action="store_true", help="Unpack tar files"
+    )
+    parser.add_argument(
+        "-o", "--output_dir", default=".", help="Directory to save the results in"
+    )
+    parser.add_argument(
+        "-n",
+        "--processes",
+        type=int,
+        default=0,
+        help="Number of worker processes (0 for the cpu count)",
+    )
+    parser.add_argument(
+        "-b",
+        "--batch_size",
+        type=int,
+        default=0,
+        help="How many files each worker reduces before sending back results (0 for automatic)",
+    )
+    parser.add_argument(
+        "--autotune",
+        default=False,
+        action="store_true",
+        help="Choose the processes (up to -n) and batch size from timed trials over the first files",
+    )
+    parser.add_argument(
+        "--max_tasks",
+        type=int,
+        default=0,
+        help="Most tasks dispatched to the workers and not finished (0 for twice the processes)",
+    )
+    parser.add_argument(
+        "--max_unmerged",
+        type=int,
+        default=0,
+        help="Most finished results waiting to be merged (0 for the processes)",
+    )
+    parser.add_argument(
+        "--max_rss",
+        type=float,
+        default=0,
+        help="Resident MB per worker above which fewer tasks are dispatched (0 for no limit)",
+    )
+    parser.add_argument(
+        "--tree", default=False, action="store_true", help="Merge worker results as a tree in the pool"
+    )
+    parser.add_argument(
+        "-s",
+        "--shared",
+        default=False,
+        action="store_true",
+        help="Aggregate emoji counters in shared memory instead of sending them back",
+    )
+    parser.add_argument(
+        "--producers",
+        type=int,
+        default=0,
+        help="Decompress and parse processes of a staged pipeline (0 to not stage)",
+    )
+    parser.add_argument(
+        "--consumers",
+        type=int,
+        default=0,
+        help="Analysis processes of a staged pipeline (0 for the cpu count less the producers)",
+    )
+    parser.add_argument(
+        "--workdir", default=None, help="Shared work directory to split the files between several nodes"
+    )
+    parser.add_argument(
+        "--node", default=None, help="Unique name of this node (host name and process id by default)"
+    )
+    parser.add_argument(
+        "--lease_ttl", type=float, default=600, help="Seconds after which a node's lease on a file expires"
+    )
+    parser.add_argument(
+        "-c", "--checkpoint", default=None, help="File to save progress to, for --resume"
+    )
+    parser.add_argument(
+        "--checkpoint_files",
+        type=int,
+        default=100,
+        help="Files completed between checkpoints (0 to only use time)",
+    )
+    parser.add_argument(
+        "--checkpoint_seconds",
+        type=float,
+        default=300,
+        help="Seconds between checkpoints (0 to only use files)",
+    )
+    parser.add_argument(
+        "--cache", default=None, help="Directory of per-file results to reuse for unchanged files"
+    )
+    parser.add_argument(
+        "--resume",
+        default=False,
+        action="store_true",
+        help="Skip files completed in the checkpoint and continue from its results",
+    )
+    return parser
+
+
+def main(analysis, argv=None):
+    """Parse the CLI arguments, run an analysis over the archive and save its results.
+
+    Args:
+        analysis (Analysis)
+        argv (List[str], optional): Arguments, sys.argv by default
+
+    Returns:
+        Results
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.resume and not args.checkpoint:
+        parser.error("--resume requires --checkpoint")
+    if args.extract and args.sample:
+        parser.error("--sample is not supported with --extract")
+    if args.extract and not analysis.extractable:
+        parser.error("--extract is not supported by the {} analysis".format(analysis.name))
+
+    # Unpack and list all files
+    if args.unpack:
+        unpack_files(args.data_path)
+    if args.extract:
+        analysis = ExtractAnalysis(analysis)
+        filenames = store_files(args.extract, days=args.days, hours=args.hours)
+    else:
+        filenames = get_all_files(args.data_path, days=args.days, hours=args.hours)
+    if args.sample:
+        unit = "files" if args.sample_files else "tweets"
+        analysis = SampledAnalysis(analysis, args.sample, args.sample_seed, unit, root=args.data_path)
+    filenames = analysis.select(filenames)
+
+    runner = Runner.from_args(analysis, args)
+    results = runner.run(filenames)
+    os.makedirs(args.output_dir, exist_ok=True)
+    analysis.save(results, args.output_dir)
+    with open(os.path.join(args.output_dir, "run_log.json"), "w", encoding="utf-8") as f:
+        json.dump(runner.log, f, indent=2)
+    return results
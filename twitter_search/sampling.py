@@ -0,0 +1,379 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Deterministic Bernoulli sampling and scaled estimates
+
+Each tweet (by id) or file (by path) is kept with probability `rate`, decided
+by a keyed hash of the seed and the key, so a sample is the same on every run,
+host and process count, and samples at a lower rate are subsets of those at a
+higher rate with the same seed.
+
+Counts of the sample are scaled by `1 / rate` to estimate the full archive
+(the Horvitz-Thompson estimator), through the `scale` of each `scalable` field.
+Other fields, such as distinct counts, keep their sample values. Sampling units are independent, so the
+variance of an estimate is estimated from the sum of squared per-unit counts:
+
+    estimate = sum(y) / rate
+    variance = (1 - rate) * sum(y ** 2) / rate ** 2
+
+Sampling whole files is faster as unsampled files are never decompressed, but
+tweets in one file are correlated, so its intervals are wider than sampling
+tweets at the same rate.
+
+A `Reservoir` keeps a uniform sample of fixed size from a stream instead, as
+the items with the lowest hash priorities, so reservoirs filled in different
+workers merge into a uniform sample of everything they saw.
+
+"""
+import bisect
+import hashlib
+import heapq
+import math
+import os
+
+from twitter_search.aggregate import Counts, EmojiTally, Field, Tally, Total
+from twitter_search.catalog import get_catalog
+from twitter_search.twitter_search_funcs import merge_counts
+
+__all__ = [
+    "Z_95",
+    "Reservoir",
+    "ReservoirTally",
+    "UnitEmojiCounts",
+    "priority",
+    "keep",
+    "tweet_key",
+    "file_key",
+    "count_values",
+    "count_path",
+    "swap_units",
+    "restore_units",
+    "estimate",
+    "estimates",
+    "scaled",
+    "unscaled_fields",
+]
+
+# Normal quantile of a two sided 95% confidence interval
+Z_95 = 1.959963984540054
+
+
+def priority(key, seed=0):
+    """Pseudo random number of a sampling unit, uniform in [0, 1) and fixed by the seed.
+
+    Args:
+        key (str): Identity of the tweet or file
+        seed (int, optional)
+
+    Returns:
+        float
+    """
+    digest = hashlib.blake2b(str(key).encode("utf-8"), digest_size=8, key=str(seed).encode("utf-8")).digest()
+    return int.from_bytes(digest, "big") / 2 ** 64
+
+
+def keep(key, rate, seed=0):
+    """Whether a sampling unit is in the sample.
+
+    Args:
+        key (str): Identity of the tweet or file
+        rate (float): Probability of keeping each unit
+        seed (int, optional)
+
+    Returns:
+        bool
+    """
+    return rate >= 1 or priority(key, seed) < rate
+
+
+def tweet_key(tweet):
+    """Identity of a tweet for sampling, its id or else its text.
+
+    Args:
+        tweet (dict)
+
+    Returns:
+        str
+    """
+    key = tweet.get("id_str") or tweet.get("id")
+    if key is None:
+        return tweet.get("text", "")
+    return str(key)
+
+
+def file_key(filename, root=None):
+    """Host independent identity of a file for sampling.
+
+    Args:
+        filename (str)
+        root (str, optional): Archive path which keys are relative to
+
+    Returns:
+        str
+    """
+    if root is None:
+        return filename
+    return os.path.relpath(filename, root).replace(os.sep, "/")
+
+
+def count_values(results):
+    """Every count in the count fields (`Total`, `Tally` and `EmojiTally`) of results.
+    Other fields are not additive counts and are skipped.
+
+    Args:
+        results (Results)
+
+    Yields:
+        tuple: Field name, key (None for a `Total`) and count
+    """
+    for name, field in results.fields():
+        value = getattr(results, name)
+        if isinstance(field, Total):
+            yield name, None, value
+        elif isinstance(field, (Tally, EmojiTally)):
+            for key, n in value.items():
+                yield name, key, n
+
+
+class UnitEmojiCounts(Counts):
+
+    """Emoji counts of a single sampled tweet keyed by emoji, which stand in for
+    `EmojiCounts` while the tweet is processed. A tweet with a few emoji costs a
+    few dict entries instead of a whole array."""
+
+    def add_id(self, eid, n=1):
+        """Adds n to the count of an emoji id.
+
+        Args:
+            eid (int)
+            n (int, optional)
+        """
+        self.add(get_catalog().emoji[eid], n)
+
+    def __missing__(self, emoji):
+        return 0
+
+
+def swap_units(results):
+    """Replaces the count fields (see `count_values`) of results with empty values,
+    so the counts of one tweet can be read back after processing it without
+    allocating new results. Other fields keep accumulating in place.
+
+    Args:
+        results (Results): Updated in place
+
+    Returns:
+        dict: Field name to the replaced value, to pass to `restore_units`
+    """
+    saved = {}
+    for name, field in results.fields():
+        if isinstance(field, Total):
+            unit = 0
+        elif isinstance(field, Tally):
+            unit = Counts()
+        elif isinstance(field, EmojiTally):
+            unit = UnitEmojiCounts()
+        else:
+            continue
+        saved[name] = getattr(results, name)
+        setattr(results, name, unit)
+    return saved
+
+
+def restore_units(results, saved):
+    """Adds the counts of the unit to the values replaced by `swap_units` and puts
+    them back.
+
+    Args:
+        results (Results): Updated in place
+        saved (dict): From `swap_units`
+    """
+    for name, value in saved.items():
+        unit = getattr(results, name)
+        if isinstance(unit, UnitEmojiCounts):
+            for emoji, n in unit.items():
+                value.add(emoji, n)
+        elif isinstance(unit, Counts):
+            merge_counts(value, unit)
+        else:
+            value += unit
+        setattr(results, name, value)
+
+
+def count_path(name, key):
+    """Key of a count in the sums of squares.
+
+    Returns:
+        str
+    """
+    return name if key is None else "{}/{}".format(name, key)
+
+
+def estimate(total, squares, rate, z=Z_95):
+    """Full archive estimate of a sampled count and its confidence interval.
+
+    Args:
+        total (int): Sum of the count over the sampled units
+        squares (int): Sum of the squared count over the sampled units
+        rate (float): Sampling rate
+        z (float, optional): Normal quantile of the interval, 95% by default
+
+    Returns:
+        tuple: Estimate, lower and upper bounds
+    """
+    scaled_total = total / rate
+    half_width = z * math.sqrt((1 - rate) * squares) / rate
+    return scaled_total, max(scaled_total - half_width, 0.0), scaled_total + half_width
+
+
+def estimates(counts, squares, rate, z=Z_95):
+    """Estimates of every count in sampled results.
+
+    Args:
+        counts (Iterable[tuple]): Field name, key and sum over the sampled units,
+            as from `count_values`
+        squares (dict): Sums of squares by `count_path`
+        rate (float): Sampling rate
+        z (float, optional): Normal quantile of the intervals
+
+    Returns:
+        List[tuple]: Field name, key, sample count, estimate, lower and upper bounds
+    """
+    rows = []
+    for name, key, n in counts:
+        rows.append((name, key, n) + estimate(n, squares.get(count_path(name, key), 0), rate, z))
+    return rows
+
+
+def scaled(results, rate):
+    """Copy of results with every `scalable` field scaled to full archive estimates,
+    rounded to integers. Other fields keep their sample values, see `unscaled_fields`.
+
+    Args:
+        results (Results)
+        rate (float)
+
+    Returns:
+        Results
+    """
+    copy = type(results).from_dict(results.to_dict())
+    for name, field in copy.fields():
+        if field.scalable:
+            setattr(copy, name, field.scale(getattr(copy, name), 1 / rate))
+    return copy
+
+
+def unscaled_fields(results):
+    """Names of the fields which `scaled` leaves at their sample values.
+
+    Args:
+        results (Results)
+
+    Returns:
+        List[str]
+    """
+    return [name for name, field in results.fields() if not field.scalable]
+
+
+class Reservoir:
+
+    """Uniform sample without replacement of up to k items from a stream, kept as
+    the k items with the lowest priorities. Any two reservoirs merge into a
+    uniform sample of both streams, whatever order the items arrived in.
+
+    Attributes:
+        k (int): Sample size
+        seen (int): Items offered
+        items (List[tuple]): (priority, item) pairs in increasing priority
+    """
+
+    def __init__(self, k, seen=0, items=()):
+        """Initialize an empty reservoir, or one from `to_dict` values.
+
+        Args:
+            k (int)
+            seen (int, optional)
+            items (Iterable[tuple], optional)
+        """
+        self.k = k
+        self.seen = seen
+        self.items = sorted((p, item) for p, item in items)
+
+    def add(self, priority, item):
+        """Offers an item.
+
+        Args:
+            priority (float): From `priority`, uniform and independent of the item's order
+            item: Comparable and JSON serializable, e.g. a tweet text
+        """
+        self.seen += 1
+        if len(self.items) < self.k:
+            bisect.insort(self.items, (priority, item))
+        elif priority < self.items[-1][0]:
+            bisect.insort(self.items, (priority, item))
+            self.items.pop()
+
+    def full(self):
+        """Whether the reservoir holds k items.
+
+        Returns:
+            bool
+        """
+        return len(self.items) >= self.k
+
+    def sample(self):
+        """Items of the sample, in random order.
+
+        Returns:
+            list
+        """
+        return [item for _, item in self.items]
+
+    def merge(self, other):
+        """Merge another reservoir into this one in place.
+
+        Args:
+            other (Reservoir)
+
+        Returns:
+            Reservoir: self
+        """
+        self.seen += other.seen
+        self.items = heapq.nsmallest(self.k, self.items + other.items)
+        return self
+
+    def to_dict(self):
+        """Json serializable dict, see `__init__`.
+
+        Returns:
+            dict
+        """
+        return {"k": self.k, "seen": self.seen, "items": [list(pair) for pair in self.items]}
+
+    def __eq__(self, other):
+        return isinstance(other, Reservoir) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return "Reservoir(k={}, seen={}, items={})".format(self.k, self.seen, len(self.items))
+
+
+class ReservoirTally(Field):
+
+    """Reservoirs of arbitrary keys, e.g. example tweets of each pattern, stored in a dict."""
+
+    def new(self):
+        return {}
+
+    def merge(self, a, b):
+        for key, reservoir in b.items():
+            if key in a:
+                a[key].merge(reservoir)
+            else:
+                a[key] = Reservoir(reservoir.k).merge(reservoir)
+        return a
+
+    def dump(self, value):
+        return {key: reservoir.to_dict() for key, reservoir in value.items()}
+
+    def load(self, data):
+        return {key: Reservoir(**reservoir) for key, reservoir in data.items()}
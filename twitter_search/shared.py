@@ -0,0 +1,206 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared memory counters for zero-pickle aggregation
+
+The `EmojiTally` and `Total` fields of a results class are laid out as int64
+counters in one `multiprocessing.shared_memory` block with a slice (slot) per
+worker process. Workers add their results into their own slot after each batch
+of files and only fields which cannot be shared, such as a `Tally` of languages,
+are sent back to the parent, once per batch. The parent sums the slots once at the end, or at any
+time for a progress snapshot.
+
+Requires python 3.8 or later.
+
+"""
+import multiprocessing
+from functools import partial
+
+from twitter_search.aggregate import EmojiTally, Total, merge_arrays, reduce_files
+from twitter_search.backpressure import Backpressure
+from twitter_search.catalog import get_catalog
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # pragma: no cover
+    shared_memory = None
+
+__all__ = ["SharedResults"]
+
+# Shared results and slot of this worker process, set by the pool initializer
+_SHARED = None
+_SLOT = None
+
+
+def _init_worker(shared, counter):
+    """Pool initializer claiming the next free slot for this worker process.
+
+    Args:
+        shared (SharedResults)
+        counter (multiprocessing.Value): Next free slot
+    """
+    global _SHARED, _SLOT
+    with counter.get_lock():
+        _SLOT = counter.value
+        counter.value += 1
+    _SHARED = shared
+
+
+def _shared_task(worker, filenames):
+    """Runs the worker function on a batch of files and adds their merged results
+    to the slot of this worker process.
+
+    Args:
+        worker (function): Takes a filename and returns Results or None
+        filenames (List[str])
+
+    Returns:
+        dict: Values of the fields which are not shared, None if there are none
+    """
+    results = reduce_files(worker, filenames)
+    if results is None:
+        return None
+    _SHARED.add(_SLOT, results)
+    return {name: getattr(results, name) for name in _SHARED.unshared} or None
+
+
+class SharedResults:
+
+    """Shared memory counters for the `EmojiTally` and `Total` fields of a results class.
+
+    Attributes:
+        results_cls (type): Results subclass
+        slots (int): Number of worker slots
+        arrays (List[str]): Names of the shared `EmojiTally` fields
+        totals (List[str]): Names of the shared `Total` fields
+        unshared (List[str]): Names of the fields which are sent back to the parent
+        name (str): Name of the shared memory block
+    """
+
+    def __init__(self, results_cls, slots, name=None):
+        """Create a new zeroed block, or attach to an existing one if a name is given.
+
+        Args:
+            results_cls (type): Results subclass
+            slots (int): Number of worker slots
+            name (str, optional): Name of an existing block
+        """
+        if shared_memory is None:
+            raise RuntimeError("Shared memory results require python 3.8 or later")
+
+        self.results_cls = results_cls
+        self.slots = slots
+        fields = results_cls.fields()
+        self.arrays = [n for n, f in fields if isinstance(f, EmojiTally)]
+        self.totals = [n for n, f in fields if isinstance(f, Total)]
+        self.unshared = [n for n, f in fields if n not in self.arrays and n not in self.totals]
+
+        self._size = len(get_catalog())
+        self._slot_size = len(self.arrays) * self._size + len(self.totals)
+        nbytes = max(8 * self.slots * self._slot_size, 8)
+        if name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            self._shm.buf[:nbytes] = bytes(nbytes)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self.name = self._shm.name
+        self._buf = self._shm.buf[:nbytes].cast("q")
+
+    def __reduce__(self):
+        return SharedResults, (self.results_cls, self.slots, self.name)
+
+    def _offset(self, slot):
+        return slot * self._slot_size
+
+    def add(self, slot, results):
+        """Adds the shared fields of a results object into a slot.
+
+        Args:
+            slot (int)
+            results (Results)
+        """
+        offset = self._offset(slot)
+        for name in self.arrays:
+            view = self._buf[offset:offset + self._size]
+            merge_arrays(view, getattr(results, name).counts)
+            view.release()
+            offset += self._size
+        for name in self.totals:
+            self._buf[offset] += getattr(results, name)
+            offset += 1
+
+    def collect(self, results=None):
+        """Sums all slots into a results object. Can be called while workers are
+        running to get a progress snapshot.
+
+        Args:
+            results (Results, optional): Results to add to, a new one by default
+
+        Returns:
+            Results
+        """
+        if results is None:
+            results = self.results_cls()
+        for slot in range(self.slots):
+            offset = self._offset(slot)
+            for name in self.arrays:
+                view = self._buf[offset:offset + self._size]
+                merge_arrays(getattr(results, name).counts, view)
+                view.release()
+                offset += self._size
+            for name in self.totals:
+                setattr(results, name, getattr(results, name) + self._buf[offset])
+                offset += 1
+        return results
+
+    def merge_unshared(self, results, unshared):
+        """Merges the unshared field values returned by a worker into a results object.
+
+        Args:
+            results (Results)
+            unshared (dict): Field name to value, may be None
+        """
+        if not unshared:
+            return
+        fields = dict(self.results_cls.fields())
+        for name, value in unshared.items():
+            setattr(results, name, fields[name].merge(getattr(results, name), value))
+
+    def pool(self, processes):
+        """Creates a pool of worker processes which each claim one slot.
+
+        Args:
+            processes (int): Must not be more than the number of slots
+
+        Returns:
+            multiprocessing.Pool
+        """
+        if processes > self.slots:
+            raise ValueError("More processes ({}) than slots ({})".format(processes, self.slots))
+        counter = multiprocessing.Value("i", 0)
+        return multiprocessing.Pool(processes, initializer=_init_worker, initargs=(self, counter))
+
+    def imap(self, pool, worker, batches, backpressure=None):
+        """Runs the worker function over batches of files in a pool made by `pool`.
+
+        Args:
+            pool (multiprocessing.Pool)
+            worker (function): Takes a filename and returns Results or None
+            batches (List[List[str]]): Files each worker reduces before adding to its slot
+            backpressure (Backpressure, optional): Limits on work in flight
+
+        Returns:
+            Iterator[dict]: Unshared field values for each batch, to pass to `merge_unshared`
+        """
+        backpressure = backpressure or Backpressure()
+        return backpressure.imap(pool, partial(_shared_task, worker), batches, self.slots)
+
+    def close(self):
+        """Release this process's mapping of the block."""
+        self._buf.release()
+        self._shm.close()
+
+    def unlink(self):
+        """Close and free the block, called once by the process that created it."""
+        self.close()
+        self._shm.unlink()
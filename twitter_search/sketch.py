@@ -0,0 +1,429 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Mergeable approximate counters for high cardinality keys
+
+Sketches use a fixed amount of memory however many distinct keys are seen, and
+sketches with the same parameters built in different workers can be merged.
+Keys are hashed with blake2b so that hashes agree across processes and machines.
+
+"""
+import hashlib
+import math
+from array import array
+
+from twitter_search.aggregate import Field, scale_count
+from twitter_search.catalog import get_catalog
+
+__all__ = [
+    "SpaceSaving",
+    "TopKTally",
+    "HyperLogLog",
+    "EmojiHyperLogLogs",
+    "EmojiDistinctTally",
+]
+
+
+def _hash64(key):
+    """Stable 64 bit hash of a key.
+
+    Args:
+        key (str)
+
+    Returns:
+        int
+    """
+    return int.from_bytes(hashlib.blake2b(str(key).encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class SpaceSaving:
+
+    """Space-Saving summary of the k most common keys with per key error bounds.
+
+    The table holds at most 2k keys and is pruned back to the k largest counts
+    when full. Keys missing from the table have a true count of at most `floor`,
+    and a key entering the table starts from `floor` with that as its error, so
+    every reported count is between `count - error` and `count`. Summaries with
+    the same k merge as in Agarwal et al., "Mergeable Summaries".
+
+    Attributes:
+        k (int): Number of keys kept
+        total (int): Sum of all counts added
+        floor (int): Upper bound on the count of any key not in the table
+        counts (dict): Key to over-estimated count
+        errors (dict): Key to maximum over-estimate of its count
+    """
+
+    def __init__(self, k=200):
+        """Initialize an empty summary.
+
+        Args:
+            k (int, optional): Number of keys kept
+        """
+        self.k = k
+        self.total = 0
+        self.floor = 0
+        self.counts = {}
+        self.errors = {}
+
+    def add(self, key, n=1):
+        """Adds n to the count of a key.
+
+        Args:
+            key (str)
+            n (int, optional)
+        """
+        counts = self.counts
+        self.total += n
+        if key in counts:
+            counts[key] += n
+            return
+        counts[key] = self.floor + n
+        self.errors[key] = self.floor
+        if len(counts) > 2 * self.k:
+            self._prune()
+
+    def estimate(self, key):
+        """Upper bound on the count of a key.
+
+        Args:
+            key (str)
+
+        Returns:
+            int
+        """
+        return self.counts.get(key, self.floor)
+
+    def __getitem__(self, key):
+        return self.estimate(key)
+
+    def _prune(self):
+        """Keeps the k keys with the largest counts, raising the floor to the largest
+        count dropped."""
+        if len(self.counts) <= self.k:
+            return
+        ranked = sorted(self.counts.items(), key=lambda kv: (-kv[1], kv[0]))
+        self.floor = max(self.floor, ranked[self.k][1])
+        self.counts = dict(ranked[:self.k])
+        self.errors = {key: self.errors[key] for key in self.counts}
+
+    def top(self, n=None):
+        """Most common keys with their counts and error bounds.
+
+        Args:
+            n (int, optional): Number of keys to return, k by default
+
+        Returns:
+            List[tuple]: (key, count, error) with the true count between
+                `count - error` and `count`
+        """
+        ranked = sorted(self.counts.items(), key=lambda kv: (-kv[1], kv[0]))
+        errors = self.errors
+        return [(key, c, errors[key]) for key, c in ranked[:n or self.k]]
+
+    def merge(self, other):
+        """Merges another summary into this one in place. Keys missing from one
+        summary are counted at its floor.
+
+        Args:
+            other (SpaceSaving)
+
+        Returns:
+            SpaceSaving: self
+
+        Raises:
+            ValueError: If the summaries keep different numbers of keys
+        """
+        if self.k != other.k:
+            raise ValueError("Cannot merge summaries with different k")
+        counts, errors = {}, {}
+        for key in set(self.counts).union(other.counts):
+            counts[key] = self.counts.get(key, self.floor) + other.counts.get(key, other.floor)
+            errors[key] = self.errors.get(key, self.floor) + other.errors.get(key, other.floor)
+        self.counts, self.errors = counts, errors
+        self.floor += other.floor
+        self.total += other.total
+        self._prune()
+        return self
+
+    def to_dict(self):
+        """Json serializable dict of the summary, pruned to k keys.
+
+        Returns:
+            dict
+        """
+        self._prune()
+        return {
+            "k": self.k,
+            "total": self.total,
+            "floor": self.floor,
+            "counts": [[key, c, self.errors[key]] for key, c in self.counts.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a summary from the output of `to_dict`.
+
+        Args:
+            data (dict)
+
+        Returns:
+            SpaceSaving
+        """
+        summary = cls(data["k"])
+        summary.total = data["total"]
+        summary.floor = data["floor"]
+        summary.counts = {key: c for key, c, _ in data["counts"]}
+        summary.errors = {key: e for key, _, e in data["counts"]}
+        return summary
+
+    def __reduce__(self):
+        return SpaceSaving.from_dict, (self.to_dict(),)
+
+
+class TopKTally(Field):
+
+    """Top k keys of a long tailed distribution, e.g. words next to a target, in
+    constant memory."""
+
+    scalable = True
+
+    def __init__(self, k=200):
+        """Summary size used for every value of the field.
+
+        Args:
+            k (int, optional): Number of keys kept
+        """
+        self.k = k
+
+    def new(self):
+        return SpaceSaving(self.k)
+
+    def merge(self, a, b):
+        return a.merge(b)
+
+    def scale(self, value, factor):
+        value.total = scale_count(value.total, factor)
+        value.floor = scale_count(value.floor, factor)
+        value.counts = {key: scale_count(n, factor) for key, n in value.counts.items()}
+        value.errors = {key: scale_count(n, factor) for key, n in value.errors.items()}
+        return value
+
+    def dump(self, value):
+        return value.to_dict()
+
+    def load(self, data):
+        return SpaceSaving.from_dict(data)
+
+
+class HyperLogLog:
+
+    """HyperLogLog estimate of the number of distinct keys.
+
+    The relative standard error is about `1.04 / sqrt(2 ** p)`, e.g. 3% for p = 10
+    using 1 KB of registers.
+
+    Attributes:
+        p (int): Number of index bits
+        registers (array): 2 ** p registers
+    """
+
+    def __init__(self, p=10):
+        """Initialize an empty estimator.
+
+        Args:
+            p (int, optional): Number of index bits, between 4 and 16
+        """
+        if not 4 <= p <= 16:
+            raise ValueError("p must be between 4 and 16")
+        self.p = p
+        self.registers = array("B", bytes(1 << p))
+
+    def add(self, key):
+        """Adds a key.
+
+        Args:
+            key (str or int)
+        """
+        self.add_hash(_hash64(key))
+
+    def add_hash(self, h):
+        """Adds a key from its 64 bit hash, so a key added to many estimators is only
+        hashed once.
+
+        Args:
+            h (int)
+        """
+        bits = 64 - self.p
+        idx = h >> bits
+        rank = bits - (h & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def count(self):
+        """Estimated number of distinct keys.
+
+        Returns:
+            int
+        """
+        m = len(self.registers)
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def __len__(self):
+        return self.count()
+
+    def error(self):
+        """Relative standard error of the estimate.
+
+        Returns:
+            float
+        """
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def merge(self, other):
+        """Merges another estimator with the same p into this one in place.
+
+        Args:
+            other (HyperLogLog)
+
+        Returns:
+            HyperLogLog: self
+
+        Raises:
+            ValueError: If the estimators have different p
+        """
+        if self.p != other.p:
+            raise ValueError("Cannot merge HyperLogLog with different p")
+        self.registers = array("B", map(max, self.registers, other.registers))
+        return self
+
+    def to_dict(self):
+        """Json serializable dict of the estimator.
+
+        Returns:
+            dict
+        """
+        return {"p": self.p, "registers": self.registers.tobytes().hex()}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build an estimator from the output of `to_dict`.
+
+        Args:
+            data (dict)
+
+        Returns:
+            HyperLogLog
+        """
+        hll = cls(data["p"])
+        hll.registers = array("B", bytes.fromhex(data["registers"]))
+        return hll
+
+
+class EmojiHyperLogLogs:
+
+    """Distinct key estimators per emoji id, e.g. distinct users for each emoji.
+    Estimators are only created for emoji which are seen.
+
+    Attributes:
+        p (int): Number of index bits of each estimator
+        hlls (dict): Emoji id to HyperLogLog
+    """
+
+    def __init__(self, p=10):
+        """Initialize with no estimators.
+
+        Args:
+            p (int, optional): Number of index bits of each estimator
+        """
+        self.p = p
+        self.hlls = {}
+
+    def add(self, emoji, key):
+        """Adds a key to the estimator of an emoji unicode string.
+
+        Args:
+            emoji (str)
+            key (str or int)
+        """
+        self.add_many([emoji], key)
+
+    def add_many(self, emoji, key):
+        """Adds a key to the estimators of several emoji, hashing it once.
+
+        Args:
+            emoji (List[str])
+            key (str or int)
+        """
+        ids = get_catalog().ids
+        h = _hash64(key)
+        for c in emoji:
+            eid = ids[c]
+            hll = self.hlls.get(eid)
+            if hll is None:
+                hll = self.hlls[eid] = HyperLogLog(self.p)
+            hll.add_hash(h)
+
+    def __getitem__(self, emoji):
+        hll = self.hlls.get(get_catalog().ids[emoji])
+        return 0 if hll is None else hll.count()
+
+    def items(self):
+        """Emoji and estimated distinct counts of all emoji seen.
+
+        Returns:
+            List[tuple]
+        """
+        emoji = get_catalog().emoji
+        return [(emoji[eid], hll.count()) for eid, hll in sorted(self.hlls.items())]
+
+    def merge(self, other):
+        """Merges the estimators of another instance into this one in place.
+
+        Args:
+            other (EmojiHyperLogLogs)
+
+        Returns:
+            EmojiHyperLogLogs: self
+        """
+        for eid, hll in other.hlls.items():
+            if eid in self.hlls:
+                self.hlls[eid].merge(hll)
+            else:
+                self.hlls[eid] = HyperLogLog(hll.p).merge(hll)
+        return self
+
+
+class EmojiDistinctTally(Field):
+
+    """Approximate distinct counts per emoji, e.g. of user ids. Distinct counts are
+    not additive, so they are not `scalable`."""
+
+    def __init__(self, p=10):
+        """Estimator size used for every value of the field.
+
+        Args:
+            p (int, optional): Number of index bits of each estimator
+        """
+        self.p = p
+
+    def new(self):
+        return EmojiHyperLogLogs(self.p)
+
+    def merge(self, a, b):
+        return a.merge(b)
+
+    def dump(self, value):
+        emoji = get_catalog().emoji
+        return {emoji[eid]: hll.to_dict() for eid, hll in value.hlls.items()}
+
+    def load(self, data):
+        value = EmojiHyperLogLogs(self.p)
+        ids = get_catalog().ids
+        value.hlls = {ids[c]: HyperLogLog.from_dict(d) for c, d in data.items()}
+        return value
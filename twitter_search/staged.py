@@ -0,0 +1,356 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Staged pipeline with separate decode and analysis processes
+
+Producer processes decompress and parse files and project each tweet to the
+few keys the analyses use. Chunks of projected records are passed to consumer
+processes through a ring buffer of fixed size slots in shared memory, and the
+consumers run the analysis. The number of producers and consumers is set
+independently, so the bz2 and JSON work can be balanced against the matching.
+
+Analyses run in this mode see tweets with only the keys in `PROJECTION`.
+
+Stage processes ignore Ctrl-C. The first Ctrl-C stops the producers after the
+file they are decoding, the consumers analyse what is already in the ring and
+their results are merged before KeyboardInterrupt is raised. A second Ctrl-C
+stops at once.
+
+"""
+import multiprocessing
+import pickle
+import queue
+import signal
+
+from tqdm import tqdm
+
+from twitter_search.data import read_zip
+
+__all__ = ["PROJECTION", "RingBuffer", "project", "unproject", "run_staged"]
+
+# Top level tweet keys kept by producers, the user is kept as its id only
+PROJECTION = ("id", "timestamp_ms", "created_at", "lang", "text")
+
+# Records per chunk sent through the ring buffer
+CHUNK_RECORDS = 1000
+
+# Seconds between checks that the stage processes are still alive
+POLL_SECONDS = 1
+
+
+def project(tweet):
+    """Projects a tweet to a compact record.
+
+    Args:
+        tweet (dict)
+
+    Returns:
+        tuple: Values of the `PROJECTION` keys and the user id, None if missing
+    """
+    user = tweet.get("user")
+    return tuple(tweet.get(key) for key in PROJECTION) + (None if user is None else user.get("id"),)
+
+
+def unproject(record):
+    """Rebuilds a skeleton tweet from a projected record. Missing keys stay missing.
+
+    Args:
+        record (tuple)
+
+    Returns:
+        dict
+    """
+    tweet = {key: value for key, value in zip(PROJECTION, record) if value is not None}
+    if record[-1] is not None:
+        tweet["user"] = {"id": record[-1]}
+    return tweet
+
+
+class RingBuffer:
+
+    """Bounded multi-producer multi-consumer queue of byte strings stored in fixed
+    size slots of shared memory. Writers block while every slot is full and
+    readers block while every slot is empty.
+
+    Attributes:
+        slots (int): Number of slots
+        slot_size (int): Maximum bytes per item
+    """
+
+    def __init__(self, slots=64, slot_size=1 << 20):
+        """Allocate the shared memory. Must be created before the processes using it.
+
+        Args:
+            slots (int, optional): Number of slots
+            slot_size (int, optional): Maximum bytes per item
+        """
+        self.slots = slots
+        self.slot_size = slot_size
+        self._buf = multiprocessing.RawArray("B", slots * slot_size)
+        self._lengths = multiprocessing.RawArray("q", slots)
+        self._head = multiprocessing.RawValue("i", 0)
+        self._tail = multiprocessing.RawValue("i", 0)
+        self._lock = multiprocessing.Lock()
+        self._empty = multiprocessing.Semaphore(slots)
+        self._full = multiprocessing.Semaphore(0)
+
+    def put(self, data, timeout=None):
+        """Writes an item into the next free slot.
+
+        Args:
+            data (bytes)
+            timeout (float, optional): Seconds to wait for a free slot, forever by default
+
+        Raises:
+            ValueError: If the item is larger than a slot
+            queue.Full: If no slot was freed within the timeout
+        """
+        if len(data) > self.slot_size:
+            raise ValueError("Item of {} bytes does not fit a slot of {}".format(len(data), self.slot_size))
+        if not self._empty.acquire(timeout=timeout):
+            raise queue.Full
+        # Slots are filled in order under the lock, so a reader never sees a partial write
+        with self._lock:
+            i = self._head.value
+            self._head.value = (i + 1) % self.slots
+            offset = i * self.slot_size
+            view = memoryview(self._buf).cast("B")
+            view[offset:offset + len(data)] = data
+            view.release()
+            self._lengths[i] = len(data)
+        self._full.release()
+
+    def get(self):
+        """Reads the oldest item.
+
+        Returns:
+            bytes
+        """
+        self._full.acquire()
+        with self._lock:
+            i = self._tail.value
+            self._tail.value = (i + 1) % self.slots
+            offset = i * self.slot_size
+            view = memoryview(self._buf).cast("B")
+            data = bytes(view[offset:offset + self._lengths[i]])
+            view.release()
+        self._empty.release()
+        return data
+
+
+def _put_records(ring, records):
+    """Writes records to the ring as pickled chunks, halving any chunk too large for a slot.
+
+    Args:
+        ring (RingBuffer)
+        records (List[tuple])
+    """
+    data = pickle.dumps(records, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(data) <= ring.slot_size or len(records) == 1:
+        ring.put(data)
+        return
+    half = len(records) // 2
+    _put_records(ring, records[:half])
+    _put_records(ring, records[half:])
+
+
+def _producer(ring, files, done, stop):
+    """Producer process decompressing, parsing and projecting files.
+
+    Args:
+        ring (RingBuffer)
+        files (multiprocessing.Queue): Filenames, None to stop
+        done (multiprocessing.Queue): Filenames which have been fully written to the ring
+        stop (multiprocessing.Event): Set to skip the remaining files
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for filename in iter(files.get, None):
+        if stop.is_set():
+            # Drain the queue, so the process which filled it can exit
+            continue
+        records = []
+        for tweet in read_zip(filename):
+            records.append(project(tweet))
+            if len(records) == CHUNK_RECORDS:
+                _put_records(ring, records)
+                records = []
+        if records:
+            _put_records(ring, records)
+        done.put(filename)
+
+
+def _consumer(ring, analysis, output):
+    """Consumer process running an analysis on projected records.
+
+    Args:
+        ring (RingBuffer)
+        analysis (Analysis)
+        output (multiprocessing.Queue): Receives the results when an empty item is read
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    results = analysis.new_results()
+    while True:
+        data = ring.get()
+        if not data:
+            break
+        for record in pickle.loads(data):
+            analysis.process(unproject(record), results)
+    output.put(results)
+
+
+def _check(processes):
+    """Fails if any stage process has died.
+
+    Args:
+        processes (List[multiprocessing.Process])
+
+    Raises:
+        RuntimeError: If a stage process exited with an error
+    """
+    for process in processes:
+        if process.exitcode:
+            raise RuntimeError("{} exited with code {}".format(process.name, process.exitcode))
+
+
+def _get(q, processes):
+    """Gets an item from a queue, failing if any stage process has died.
+
+    Args:
+        q (multiprocessing.Queue)
+        processes (List[multiprocessing.Process])
+
+    Returns:
+        Item
+
+    Raises:
+        RuntimeError: If a stage process exited with an error
+    """
+    while True:
+        try:
+            return q.get(timeout=POLL_SECONDS)
+        except queue.Empty:
+            _check(processes)
+
+
+def _put(ring, data, processes):
+    """Writes an item to the ring, failing if any stage process has died rather
+    than waiting forever for a slot it would free.
+
+    Args:
+        ring (RingBuffer)
+        data (bytes)
+        processes (List[multiprocessing.Process])
+
+    Raises:
+        RuntimeError: If a stage process exited with an error
+    """
+    while True:
+        try:
+            return ring.put(data, timeout=POLL_SECONDS)
+        except queue.Full:
+            _check(processes)
+
+
+def _join(workers, done, processes):
+    """Waits for some stage processes to exit, failing if any stage process has died.
+
+    Args:
+        workers (List[multiprocessing.Process]): Processes to wait for
+        done (multiprocessing.Queue): Drained meanwhile, so producers can flush it and exit
+        processes (List[multiprocessing.Process])
+
+    Raises:
+        RuntimeError: If a stage process exited with an error
+    """
+    for worker in workers:
+        while worker.is_alive():
+            worker.join(POLL_SECONDS)
+            while True:
+                try:
+                    done.get_nowait()
+                except queue.Empty:
+                    break
+            _check(processes)
+
+
+def run_staged(analysis, filenames, producers, consumers, progress=True, ring=None, results=None):
+    """Runs an analysis with separate producer and consumer processes.
+
+    Args:
+        analysis (Analysis)
+        filenames (List[str])
+        producers (int): Number of decompress and parse processes
+        consumers (int): Number of analysis processes
+        progress (bool, optional): Show a progress bar of files decoded
+        ring (RingBuffer, optional): Buffer between the stages, 64 slots of 1 MB by default
+        results (Results, optional): Updated in place, including the counts made
+            before a KeyboardInterrupt, new results by default
+
+    Returns:
+        Results
+
+    Raises:
+        KeyboardInterrupt: After merging the results of the consumers, on Ctrl-C
+        RuntimeError: If a stage process exited with an error
+    """
+    if ring is None:
+        ring = RingBuffer()
+    if results is None:
+        results = analysis.new_results()
+    files, done, output = multiprocessing.Queue(), multiprocessing.Queue(), multiprocessing.Queue()
+    stop = multiprocessing.Event()
+    for filename in filenames:
+        files.put(filename)
+    for _ in range(producers):
+        files.put(None)
+
+    producer_processes = [
+        multiprocessing.Process(target=_producer, args=(ring, files, done, stop), name="producer-{}".format(i))
+        for i in range(producers)
+    ]
+    processes = producer_processes + [
+        multiprocessing.Process(target=_consumer, args=(ring, analysis, output), name="consumer-{}".format(i))
+        for i in range(consumers)
+    ]
+
+    def interrupt(signum, frame):
+        if stop.is_set():
+            raise KeyboardInterrupt
+        stop.set()
+
+    installed = True
+    try:
+        previous = signal.signal(signal.SIGINT, interrupt)
+    except ValueError:  # Not the main thread, which is the only one interrupted
+        installed = False
+    try:
+        for process in processes:
+            process.start()
+        received = 0
+        with tqdm(total=len(filenames), unit="files", disable=not progress) as bar:
+            while received < len(filenames) and not stop.is_set():
+                try:
+                    done.get(timeout=POLL_SECONDS)
+                except queue.Empty:
+                    _check(processes)
+                    continue
+                received += 1
+                bar.update()
+        if stop.is_set():
+            _join(producer_processes, done, processes)
+        # Every chunk is in the ring, an empty item stops each consumer
+        for _ in range(consumers):
+            _put(ring, b"", processes)
+        for _ in range(consumers):
+            results.merge(_get(output, processes))
+        for process in processes:
+            process.join()
+    finally:
+        if installed:
+            signal.signal(signal.SIGINT, signal.default_int_handler if previous is None else previous)
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+    if stop.is_set():
+        raise KeyboardInterrupt
+    return results
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+"""
+Unit tests for aggregate.py
+"""
+from __future__ import print_function, unicode_literals
+
+import os
+import pickle
+import tempfile
+import unittest
+from array import array
+
+from twitter_search.aggregate import (
+    EmojiTally,
+    FoldedEmojiTally,
+    Results,
+    Tally,
+    Total,
+    batch_files,
+    merge_arrays,
+    reduce_files,
+    tree_merge,
+)
+
+
+class ExampleResults(Results):
+    """Results with one field of each type"""
+
+    counter_total = Total()
+    counterdict_lang = Tally()
+    counterdict_emoji = EmojiTally()
+
+
+def example(total, langs, emoji):
+    """Build example results from lists of keys"""
+    results = ExampleResults()
+    results.counter_total += total
+    for lang in langs:
+        results.counterdict_lang.add(lang)
+    for c in emoji:
+        results.counterdict_emoji.add(c)
+    return results
+
+
+class TestResults(unittest.TestCase):
+    """Test declarative results"""
+
+    def test_fields(self):
+        """Test fields are collected in order of declaration"""
+        names = [name for name, _ in ExampleResults.fields()]
+
+        self.assertEqual(names, ["counter_total", "counterdict_lang", "counterdict_emoji"])
+
+    def test_new_instances_are_independent(self):
+        """Test each instance gets its own storage"""
+        a = example(1, ["en"], ["😂"])
+        b = ExampleResults()
+
+        self.assertEqual(b.counter_total, 0)
+        self.assertEqual(len(b.counterdict_lang), 0)
+        self.assertEqual(len(b.counterdict_emoji), 0)
+        self.assertEqual(a.counterdict_emoji["😂"], 1)
+
+    def test_merge(self):
+        """Test merging sums every field"""
+        a = example(2, ["en", "ja"], ["😂", "🔫"])
+        b = example(3, ["en"], ["😂", "😂"])
+        a.merge(b)
+
+        self.assertEqual(a.counter_total, 5)
+        self.assertEqual(dict(a.counterdict_lang), {"en": 2, "ja": 1})
+        self.assertCountEqual(a.counterdict_emoji.items(), [("😂", 3), ("🔫", 1)])
+
+    def test_pickle(self):
+        """Test results round trip through pickle"""
+        a = example(2, ["en"], ["😂", "🔫", "🔫"])
+        b = pickle.loads(pickle.dumps(a))
+
+        self.assertEqual(b.to_dict(), a.to_dict())
+
+    def test_save_and_load(self):
+        """Test results round trip through a json file"""
+        a = example(2, ["en"], ["😂", "🔫", "🔫"])
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "results.json")
+            a.save(filename)
+            b = ExampleResults.load(filename)
+
+        self.assertEqual(b.counter_total, 2)
+        self.assertEqual(b.counterdict_lang, a.counterdict_lang)
+        self.assertEqual(b.counterdict_emoji, a.counterdict_emoji)
+
+
+class TestFoldedEmojiTally(unittest.TestCase):
+    """Test raw and folded emoji counts"""
+
+    def test_add_text(self):
+        """Test one pass fills both views, which merge and round trip through json"""
+        field = FoldedEmojiTally()
+        a = field.new()
+        self.assertTrue(a.add_text("👍🏼 ❤️ 🏽"))
+        self.assertFalse(a.add_text("no emoji"))
+        b = field.new()
+        b.add_text("👍", 2)
+        field.merge(a, b)
+
+        self.assertCountEqual(a.raw.items(), [("👍🏼", 1), ("❤️", 1), ("🏽", 1), ("👍", 2)])
+        self.assertCountEqual(a.folded.items(), [("👍", 3), ("❤", 1), ("🏽", 1)])
+        self.assertEqual(field.load(field.dump(a)), a)
+        self.assertEqual(pickle.loads(pickle.dumps(a)), a)
+
+
+class TestMergeArrays(unittest.TestCase):
+    """Test in place array merge"""
+
+    def test_merge_arrays(self):
+        """Test merge arrays adds into the first array"""
+        a = array("q", [1, 0, 2])
+        b = array("q", [0, 3, 1])
+        merged = merge_arrays(a, b)
+
+        self.assertIs(merged, a)
+        self.assertEqual(list(a), [1, 3, 3])
+        self.assertEqual(list(b), [0, 3, 1])
+
+
+class TestReduction(unittest.TestCase):
+    """Test worker side reduction of results"""
+
+    def test_batch_files(self):
+        """Test batches cover all files in order"""
+        files = ["f{}".format(i) for i in range(10)]
+
+        self.assertEqual(batch_files(files, 4), [files[0:4], files[4:8], files[8:10]])
+        self.assertEqual(len(batch_files(files, processes=2)), 5)
+        self.assertEqual(batch_files([], processes=2), [])
+
+    def test_reduce_files(self):
+        """Test one result per batch skipping empty files"""
+        def worker(filename):
+            return None if filename == "empty" else example(1, [filename], ["😂"])
+
+        results = reduce_files(worker, ["en", "empty", "ja", "en"])
+
+        self.assertEqual(results.counter_total, 3)
+        self.assertEqual(dict(results.counterdict_lang), {"en": 2, "ja": 1})
+        self.assertIsNone(reduce_files(worker, ["empty"]))
+
+    def test_tree_merge(self):
+        """Test tree merge matches a sequential merge"""
+        partials = [example(i, ["en"], ["😂"] * i) for i in range(7)] + [None]
+        merged = tree_merge(partials)
+
+        self.assertEqual(merged.counter_total, 21)
+        self.assertEqual(merged.counterdict_lang["en"], 7)
+        self.assertEqual(merged.counterdict_emoji["😂"], 21)
+        self.assertIsNone(tree_merge([None]))
+
+
+if __name__ == "__main__":
+    unittest.main()
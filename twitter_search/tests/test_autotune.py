@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Unit tests for autotune.py
+"""
+from __future__ import print_function, unicode_literals
+
+import io
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from twitter_search.autotune import Autotuner
+from twitter_search.pipeline import Runner
+from twitter_search.tests.test_pipeline import CountAnalysis, write_archive
+
+
+class ScriptedTuner(Autotuner):
+    """Tuner with throughput given by a function of the settings instead of timed"""
+
+    def __init__(self, rate, **kwargs):
+        super().__init__(**kwargs)
+        self.rate = rate
+
+    def _trial(self, task, filenames, merge, processes, batch_size):
+        self.trials.append({"processes": processes, "batch_size": batch_size, "files": len(filenames)})
+        return self.rate(processes, batch_size)
+
+
+class TestAutotune(unittest.TestCase):
+    """Test worker count and batch size autotuning"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filenames = write_archive(self.tmpdir, days=2, hours=3, files=4)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_choice(self):
+        """Test the search keeps halving processes and growing batches only while faster"""
+        # Seek-bound disk, two readers are best and batching does not matter
+        tuner = ScriptedTuner(lambda p, b: {8: 10, 4: 20, 2: 30, 1: 25}[p], max_processes=8, batches_per_process=1)
+        remaining = tuner.tune(None, list(range(1000)), None)
+        self.assertEqual((tuner.processes, tuner.batch_size), (2, 1))
+        self.assertEqual([t["processes"] for t in tuner.trials], [8, 4, 2, 1, 2])
+        self.assertEqual(len(remaining), 1000 - sum(t["files"] for t in tuner.trials))
+
+        # Every core helps and merging is the bottleneck for small batches
+        tuner = ScriptedTuner(lambda p, b: p * min(b, 4), max_processes=4, batches_per_process=1)
+        tuner.tune(None, list(range(1000)), None)
+        self.assertEqual((tuner.processes, tuner.batch_size), (4, 4))
+
+        # Too few files for any trial
+        tuner = ScriptedTuner(lambda p, b: 1, max_processes=4)
+        self.assertEqual(tuner.tune(None, list(range(3)), None), [0, 1, 2])
+        self.assertEqual(tuner.trials, [])
+
+    def test_runner(self):
+        """Test an autotuned run covers every file once and logs the chosen settings"""
+        analysis = CountAnalysis()
+        expected = analysis.new_results()
+        for filename in self.filenames:
+            expected.merge(analysis(filename))
+
+        for tree in (False, True):
+            runner = Runner(analysis, processes=2, progress=False, tree=tree, autotune=Autotuner(2, batches_per_process=1))
+            with redirect_stdout(io.StringIO()) as stdout:
+                results = runner.run(self.filenames)
+            self.assertEqual(results.to_dict(), expected.to_dict())
+            self.assertIn("Autotune trial", stdout.getvalue())
+            self.assertEqual(runner.log["processes"], runner.autotune.processes)
+            self.assertEqual(runner.log["autotune"]["batch_size"], runner.batch_size)
+            self.assertTrue(runner.log["autotune"]["trials"])
+
+        with self.assertRaises(ValueError):
+            Runner(analysis, shared=True, autotune=Autotuner())
+
+
+if __name__ == "__main__":
+    unittest.main()
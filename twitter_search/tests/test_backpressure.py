@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+"""
+Unit tests for backpressure.py
+"""
+from __future__ import print_function, unicode_literals
+
+import io
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import redirect_stdout
+from multiprocessing.pool import ThreadPool
+
+from twitter_search.backpressure import Backpressure, worker_rss
+from twitter_search.pipeline import Runner
+from twitter_search.tests.test_pipeline import CountAnalysis, write_archive
+
+
+class Concurrency:
+    """Task which records the most calls running at once"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+
+    def __call__(self, item):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(0.01)
+        with self.lock:
+            self.running -= 1
+        if item == "fail":
+            raise ValueError(item)
+        return item * 2
+
+
+class CountingPool(ThreadPool):
+    """Thread pool counting submitted tasks"""
+
+    submitted = 0
+
+    def apply_async(self, *args, **kwargs):
+        self.submitted += 1
+        return super().apply_async(*args, **kwargs)
+
+
+class TestBackpressure(unittest.TestCase):
+    """Test bounded dispatch"""
+
+    def test_limits(self):
+        """Test tasks in flight and results held stay within the limits"""
+        task = Concurrency()
+        backpressure = Backpressure(max_tasks=2, max_unmerged=1)
+        with CountingPool(6) as pool:
+            results = []
+            for value in backpressure.imap(pool, task, range(30), 6):
+                # A slow merge in the parent, workers must wait rather than pile up results
+                time.sleep(0.005)
+                results.append(value)
+                self.assertLessEqual(pool.submitted - len(results), 3)
+        self.assertEqual(sorted(results), [i * 2 for i in range(30)])
+        self.assertLessEqual(task.peak, 2)
+
+        with ThreadPool(2) as pool:
+            with self.assertRaises(ValueError):
+                list(Backpressure().imap(pool, task, [1, "fail", 2], 2))
+
+    @unittest.skipIf(worker_rss() is None, "No /proc to read resident memory from")
+    def test_memory(self):
+        """Test a worker over the memory limit takes a slot off the running tasks"""
+        task = Concurrency()
+        # Threads share one process, so its one report is over the limit for all of them
+        backpressure = Backpressure(max_rss=1)
+        with ThreadPool(3) as pool:
+            results = list(backpressure.imap(pool, task, range(20), 3))
+        self.assertEqual(sorted(results), [i * 2 for i in range(20)])
+        self.assertLessEqual(task.peak, 3)
+        self.assertGreater(backpressure.throttled, 0)
+        self.assertGreater(backpressure.peak_rss, 0)
+
+    def test_runner(self):
+        """Test a run with tight limits matches a serial run"""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            filenames = write_archive(tmpdir, files=3)
+            analysis = CountAnalysis()
+            expected = analysis.new_results()
+            for filename in filenames:
+                expected.merge(analysis(filename))
+            backpressure = Backpressure(max_tasks=1, max_unmerged=1, max_rss=1)
+            runner = Runner(analysis, processes=2, batch_size=1, progress=False, backpressure=backpressure)
+            with redirect_stdout(io.StringIO()):
+                results = runner.run(filenames)
+            self.assertEqual(results.to_dict(), expected.to_dict())
+            self.assertEqual(runner.log["peak_worker_rss"], backpressure.peak_rss)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    unittest.main()
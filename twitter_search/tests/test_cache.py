@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+"""
+Unit tests for cache.py
+"""
+from __future__ import print_function, unicode_literals
+
+import bz2
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+from twitter_search.aggregate import Results, Tally, Total
+from twitter_search.cache import ResultCache
+from twitter_search.pipeline import Analysis, MultiAnalysis, Runner
+
+# Number of files processed by LangAnalysis in this process
+CALLS = []
+
+# Names of the analyses which processed each tweet in this process
+TWEETS = []
+
+
+class LangResults(Results):
+    """Example results"""
+
+    counter_total_tweets = Total()
+    counterdict_lang = Tally()
+
+
+class LangAnalysis(Analysis):
+    """Example analysis counting languages"""
+
+    name = "lang"
+    results_class = LangResults
+
+    def process_file(self, filename, digest=None):
+        CALLS.append(filename)
+        return super().process_file(filename, digest)
+
+    def process(self, tweet, results):
+        TWEETS.append(self.name)
+        results.counter_total_tweets += 1
+        results.counterdict_lang.add(tweet["lang"])
+
+
+class TotalAnalysis(LangAnalysis):
+    """Example analysis counting tweets"""
+
+    name = "total"
+
+    def process(self, tweet, results):
+        TWEETS.append(self.name)
+        results.counter_total_tweets += 1
+
+
+def write_file(filename, langs):
+    """Write a zipped file of tweets in the given languages"""
+    with bz2.open(filename, "wt", encoding="utf-8") as f:
+        f.write("\n".join(json.dumps({"text": "", "lang": lang}) for lang in langs))
+
+
+class TestResultCache(unittest.TestCase):
+    """Test per-file result cache"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = ResultCache(os.path.join(self.tmpdir, "cache"))
+        self.filename = os.path.join(self.tmpdir, "00.json.bz2")
+        write_file(self.filename, ["en", "ja", "en"])
+        del CALLS[:]
+        del TWEETS[:]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_hit_and_miss(self):
+        """Test unchanged files are reused and changed files reprocessed"""
+        analysis = LangAnalysis()
+        first = self.cache.process(analysis, self.filename)
+        second = self.cache.process(analysis, self.filename)
+
+        self.assertEqual(second.counterdict_lang, {"en": 2, "ja": 1})
+        self.assertEqual(second.to_dict(), first.to_dict())
+        self.assertEqual(len(CALLS), 1)
+
+        # Same content with a new modification time is still a hit
+        stat = os.stat(self.filename)
+        os.utime(self.filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNotNone(self.cache.get(analysis, self.filename))
+
+        # New content is a miss
+        write_file(self.filename, ["fr", "fr", "fr", "fr"])
+        self.assertIsNone(self.cache.get(analysis, self.filename))
+        self.assertEqual(self.cache.process(analysis, self.filename).counterdict_lang, {"fr": 4})
+
+    def test_hash_from_read(self):
+        """Test a miss hashes the file from the read which processes it instead of reading it again"""
+        analysis = LangAnalysis()
+        with mock.patch("twitter_search.cache.file_hash") as hashed:
+            self.cache.process(analysis, self.filename)
+            self.cache.process(MultiAnalysis([TotalAnalysis()]), self.filename)
+        hashed.assert_not_called()
+
+        # The hash is the file's, so a touched file is still a hit
+        stat = os.stat(self.filename)
+        os.utime(self.filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNotNone(self.cache.get(analysis, self.filename))
+        self.assertIsNotNone(self.cache.get(TotalAnalysis(), self.filename))
+
+    def test_analysis_fingerprint(self):
+        """Test a new analysis version or setting does not reuse old results"""
+        analysis = LangAnalysis()
+        self.cache.process(analysis, self.filename)
+
+        changed = LangAnalysis()
+        changed.version = "2"
+        self.assertNotEqual(changed.fingerprint(), analysis.fingerprint())
+        self.assertIsNone(self.cache.get(changed, self.filename))
+        changed = LangAnalysis()
+        changed.min_count = 2
+        self.assertIsNone(self.cache.get(changed, self.filename))
+        self.assertIsNotNone(self.cache.get(LangAnalysis(), self.filename))
+
+    def test_multi_analysis(self):
+        """Test each part of several analyses is cached on its own and only missing parts are run"""
+        self.cache.process(LangAnalysis(), self.filename)
+        del TWEETS[:]
+
+        multi = MultiAnalysis([LangAnalysis(), TotalAnalysis()])
+        results = self.cache.process(multi, self.filename)
+        self.assertEqual(TWEETS, ["total"] * 3)
+        self.assertEqual(results.parts[0].counterdict_lang, {"en": 2, "ja": 1})
+        self.assertEqual(results.parts[1].counter_total_tweets, 3)
+
+        del TWEETS[:]
+        self.assertEqual(self.cache.process(multi, self.filename).to_dict(), results.to_dict())
+        self.assertEqual(self.cache.process(TotalAnalysis(), self.filename).counter_total_tweets, 3)
+        self.assertEqual(TWEETS, [])
+
+        changed = TotalAnalysis()
+        changed.version = "2"
+        self.cache.process(MultiAnalysis([LangAnalysis(), changed]), self.filename)
+        self.assertEqual(TWEETS, ["total"] * 3)
+
+    def test_runner(self):
+        """Test the runner merges cached and new results"""
+        other = os.path.join(self.tmpdir, "01.json.bz2")
+        write_file(other, ["ja"])
+        self.cache.process(LangAnalysis(), self.filename)
+
+        runner = Runner(LangAnalysis(), processes=2, progress=False, cache=self.cache)
+        with redirect_stdout(io.StringIO()):
+            results = runner.run([self.filename, other])
+
+        self.assertEqual(results.counterdict_lang, {"en": 2, "ja": 2})
+        self.assertIsNotNone(self.cache.get(LangAnalysis(), other))
+
+
+if __name__ == "__main__":
+    unittest.main()
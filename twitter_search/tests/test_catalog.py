@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+"""
+Unit tests for catalog.py
+"""
+from __future__ import print_function, unicode_literals
+
+import unittest
+
+from twitter_search import EmojiCatalog, get_catalog
+from twitter_search.catalog import BOTH, FOLDED
+from twitter_search.unicode_codes import EMOJI_UNICODE
+
+
+class TestEmojiCatalog(unittest.TestCase):
+    """Test emoji catalog"""
+
+    def setUp(self):
+        self.catalog = get_catalog()
+
+    def test_shared_catalog(self):
+        """Test the shared catalog is only built once"""
+        self.assertIs(get_catalog(), self.catalog)
+        self.assertIsInstance(self.catalog, EmojiCatalog)
+
+    def test_membership(self):
+        """Test membership matches the unicode_codes data"""
+        self.assertEqual(len(self.catalog), len(set(EMOJI_UNICODE.values())))
+        self.assertIn("🔫", self.catalog)
+        self.assertNotIn("x", self.catalog)
+        self.assertNotIn(None, self.catalog)
+
+    def test_ids(self):
+        """Test ids round trip to emoji"""
+        eid = self.catalog.id_of("🔫")
+
+        self.assertEqual(self.catalog.emoji[eid], "🔫")
+        self.assertEqual(self.catalog.names[eid], ":pistol:")
+        self.assertIsNone(self.catalog.id_of("x"))
+
+    def test_lookup_name_and_alias(self):
+        """Test lookup by name and by alias"""
+        eid = self.catalog.lookup(":pistol:")
+
+        self.assertEqual(self.catalog.lookup(":gun:"), eid)
+        self.assertEqual(self.catalog.aliases[eid], ":gun:")
+        with self.assertRaises(KeyError):
+            self.catalog.lookup(":not_an_emoji:")
+
+    def test_groups(self):
+        """Test group and subgroup classification"""
+        self.assertEqual(self.catalog.group_of("😂"), "Emoticons")
+        self.assertEqual(self.catalog.subgroup_of("😂"), "single")
+        self.assertEqual(self.catalog.subgroup_of("👍🏼"), "skin_tone")
+        self.assertEqual(self.catalog.subgroup_of("🏼"), "modifier")
+        self.assertEqual(self.catalog.subgroup_of("🇬🇧"), "flag")
+
+    def test_members(self):
+        """Test all members of a group are in that group"""
+        members = self.catalog.members("flag")
+
+        self.assertIn(self.catalog.id_of("🇬🇧"), members)
+        self.assertNotIn(self.catalog.id_of("😂"), members)
+
+
+class TestMatch(unittest.TestCase):
+    """Test raw and folded emoji matching"""
+
+    def setUp(self):
+        self.catalog = get_catalog()
+
+    def emoji(self, ids):
+        """Convert ids back to emoji"""
+        return [self.catalog.emoji[i] for i in ids]
+
+    def test_match_not_found(self):
+        """Test for no emoji found"""
+        self.assertEqual(self.catalog.match("no emoji in text"), [])
+        self.assertEqual(self.catalog.match("", BOTH), ([], []))
+
+    def test_match_longest_sequence(self):
+        """Test sequences are matched whole"""
+        ids = self.catalog.match("flag 🇬🇧 and thumbs 👍🏼 😂😂")
+
+        self.assertEqual(self.emoji(ids), ["🇬🇧", "👍🏼", "😂", "😂"])
+
+    def test_fold_map(self):
+        """Test fold map from sequences to their base emoji"""
+        fold = self.catalog.fold
+
+        self.assertEqual(fold[self.catalog.id_of("👍🏼")], self.catalog.id_of("👍"))
+        self.assertEqual(fold[self.catalog.id_of("❤️")], self.catalog.id_of("❤"))
+        self.assertEqual(fold[self.catalog.id_of("😂")], self.catalog.id_of("😂"))
+
+    def test_match_folded(self):
+        """Test folding of listed and unlisted skin tone sequences"""
+        ids = self.catalog.match("👍🏼 🔫🏼 ❤️ x🏽", FOLDED)
+
+        self.assertEqual(self.emoji(ids), ["👍", "🔫", "❤", "🏽"])
+
+    def test_match_both(self):
+        """Test raw and folded ids from a single pass"""
+        raw, folded = self.catalog.match("🔫🏼", BOTH)
+
+        self.assertEqual(self.emoji(raw), ["🔫", "🏼"])
+        self.assertEqual(self.emoji(folded), ["🔫"])
+
+    def test_match_unknown_mode(self):
+        """Test an unknown mode is rejected"""
+        with self.assertRaises(ValueError):
+            self.catalog.match("🔫", "folding")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""
+Unit tests for cooccurrence.py
+"""
+from __future__ import print_function, unicode_literals
+
+import os
+import pickle
+import tempfile
+import unittest
+
+from twitter_search.cooccurrence import CooccurrenceMatrix, CooccurrenceTally
+
+
+def example():
+    """Matrix from three tweets"""
+    matrix = CooccurrenceMatrix()
+    matrix.add(["🔫", "😂"])
+    matrix.add(["🔫", "💣", "🔪", "🔫"])
+    matrix.add(["😂"])
+    return matrix
+
+
+class TestCooccurrenceMatrix(unittest.TestCase):
+    """Test emoji co-occurrence matrix"""
+
+    def test_counts(self):
+        """Test pair and diagonal counts"""
+        matrix = example()
+
+        self.assertEqual(matrix.count("🔫", "🔫"), 2)
+        self.assertEqual(matrix.count("😂", "🔫"), 1)
+        self.assertEqual(matrix.count("🔫", "😂"), 1)
+        self.assertEqual(matrix.count("😂", "💣"), 0)
+
+    def test_row(self):
+        """Test emoji when another emoji is present"""
+        matrix = example()
+        self.assertEqual(matrix.row("🔫"), {"😂": 1, "💣": 1, "🔪": 1})
+        self.assertEqual(matrix.row("👍"), {})
+
+    def test_row_after_update(self):
+        """Test rows include pairs counted or merged after an earlier row"""
+        matrix = example()
+        self.assertEqual(matrix.row("😂"), {"🔫": 1})
+        matrix.add(["😂", "💣"])
+        self.assertEqual(matrix.row("😂"), {"🔫": 1, "💣": 1})
+        matrix.merge(example())
+        self.assertEqual(matrix.row("😂"), {"🔫": 2, "💣": 1})
+        self.assertEqual(CooccurrenceTally().scale(matrix, 2).row("😂"), {"🔫": 4, "💣": 2})
+
+    def test_merge(self):
+        """Test merging sums the counts"""
+        matrix = example().merge(example())
+
+        self.assertEqual(matrix.count("🔫", "🔫"), 4)
+        self.assertEqual(len(matrix.pairs()), 4)
+
+    def test_save_and_load(self):
+        """Test round trip through the binary file"""
+        matrix = example()
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, "cooccurrence.bin")
+            matrix.save(filename)
+            loaded = CooccurrenceMatrix.load(filename)
+
+        self.assertEqual(loaded.counts, matrix.counts)
+
+    def test_serialization(self):
+        """Test round trips through pickle and the results field"""
+        matrix = example()
+        field = CooccurrenceTally()
+
+        self.assertEqual(pickle.loads(pickle.dumps(matrix)).counts, matrix.counts)
+        self.assertEqual(field.load(field.dump(matrix)).counts, matrix.counts)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Unit tests for cube.py
+"""
+from __future__ import print_function, unicode_literals
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from twitter_search.cube import AggregateCube, CubeFile, CubeTally
+from twitter_search.timeseries import HOUR
+
+# 2016-08-01 00:00 UTC
+T0 = 1470009600
+
+
+def example():
+    """Cube of a few tweets in two languages"""
+    cube = AggregateCube(HOUR)
+    cube.add_many("ja", T0 + 5, ["🔫", "😂"], [2, 1])
+    cube.add_many("ja", T0 + HOUR, ["😂"], [3])
+    cube.add_many("en", T0 + 10, ["🔫"], [1])
+    cube.add_many(None, T0 + 20, ["🔫"], [4])
+    return cube
+
+
+class TestAggregateCube(unittest.TestCase):
+    """Test language x emoji x time cube"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def check_queries(self, cube):
+        """Test slices and rollups of the example cube"""
+        self.assertEqual(cube.top("emoji", lang="ja"), [("😂", 4), ("🔫", 2)])
+        self.assertEqual(cube.top("lang", k=1, emoji="🔫"), [("und", 4)])
+        self.assertEqual(
+            cube.rollup(("lang", "time"), start=T0, end=T0 + HOUR),
+            {("ja", T0): 3, ("en", T0): 1, ("und", T0): 4},
+        )
+        self.assertCountEqual(
+            cube.slice(lang="ja", emoji="😂"), [("ja", T0, "😂", 1), ("ja", T0 + HOUR, "😂", 3)]
+        )
+        self.assertEqual(list(cube.slice(lang="fr")), [])
+
+    def test_queries(self):
+        """Test queries of an in memory cube"""
+        self.check_queries(example())
+
+    def test_save_and_mmap(self):
+        """Test queries of a saved cube opened with mmap"""
+        filename = os.path.join(self.tmpdir, "cube.bin")
+        example().save(filename)
+        with CubeFile(filename) as cube:
+            self.assertEqual(cube.n, 5)
+            self.assertEqual(cube.langs, ["en", "ja", "und"])
+            self.check_queries(cube)
+
+    def test_merge_and_serialization(self):
+        """Test merging cubes with different language ids and round trips"""
+        other = AggregateCube(HOUR)
+        other.add_many("en", T0, ["🔫"], [1])
+        other.add_many("ja", T0, ["😂"], [1])
+
+        field = CubeTally()
+        merged = field.merge(example(), other)
+        self.assertEqual(merged.top("emoji", lang="en"), [("🔫", 2)])
+        self.assertEqual(merged.top("emoji", lang="ja"), [("😂", 5), ("🔫", 2)])
+
+        for copy in (pickle.loads(pickle.dumps(merged)), field.load(field.dump(merged))):
+            self.assertCountEqual(copy.slice(), merged.slice())
+        with self.assertRaises(ValueError):
+            merged.merge(AggregateCube(2 * HOUR))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+Unit tests for examples.py
+"""
+from __future__ import print_function, unicode_literals
+
+import bz2
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+
+from twitter_search.examples import ExampleAnalysis
+from twitter_search.pipeline import ExtractAnalysis, MultiAnalysis, Runner, main
+
+
+class TestExamples(unittest.TestCase):
+    """Test the example extractor"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filenames = []
+        n = 0
+        for i in range(40):
+            filename = os.path.join(self.tmpdir, "{:02d}.json.bz2".format(i))
+            lines = []
+            for j in range(10):
+                # Every tweet has 🔫, one in ten has 💥🔫 and a few are in Japanese
+                text = "{} {}".format(n, "💥🔫" if j == 0 else "🔫")
+                lines.append(json.dumps({"id": n, "text": text, "lang": "ja" if j == 9 else "en"}))
+                n += 1
+            with bz2.open(filename, "wt", encoding="utf-8") as f:
+                f.write("\n".join(lines))
+            self.filenames.append(filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def run_quietly(self, analysis):
+        """Run over the files in the analysis' order and return the runner, results and output"""
+        runner = Runner(analysis, processes=2, progress=False)
+        with redirect_stdout(io.StringIO()) as out:
+            results = runner.run(analysis.select(self.filenames))
+        return runner, results, out.getvalue()
+
+    def test_full_scan(self):
+        """Test an unmet quota scans every file and keeps the same sample as a serial run"""
+        analysis = ExampleAnalysis(["🔫", "💥🔫", "🐓🔫"], max_examples=5)
+        expected = analysis.new_results()
+        for filename in self.filenames:
+            expected.merge(analysis(filename))
+
+        _, results, out = self.run_quietly(analysis)
+        self.assertNotIn("Finished early", out)
+        self.assertEqual(results.to_dict(), expected.to_dict())
+        self.assertEqual(results.examples["💥🔫"].seen, 40)
+        self.assertEqual(results.counterdict_matches["🔫"], 360)
+        self.assertNotIn("🐓🔫", results.examples)
+
+        analysis.save(results, self.tmpdir)
+        with open(os.path.join(self.tmpdir, "examples_💥🔫.txt"), encoding="utf-8") as f:
+            blocks = f.read().split("\n\n")[:-1]
+        self.assertEqual([block.split("\n")[0] for block in blocks], ["1", "2", "3", "4", "5"])
+        self.assertEqual([block.split("\n")[1] for block in blocks], results.examples["💥🔫"].sample())
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, "examples_🐓🔫.txt")))
+
+    def test_early_stop(self):
+        """Test the scan stops once every quota is met, in a seeded random file order"""
+        analysis = ExampleAnalysis(["🔫", "💥🔫"], max_examples=3, seed=1)
+        self.assertEqual(analysis.select(self.filenames), ExampleAnalysis([], seed=1).select(self.filenames))
+        self.assertNotEqual(analysis.select(self.filenames), self.filenames)
+
+        _, results, out = self.run_quietly(analysis)
+        self.assertIn("Finished early", out)
+        self.assertTrue(analysis.finished(results))
+        self.assertLess(results.counter_total_tweets, 400)
+        for text in results.examples["💥🔫"].sample():
+            self.assertIn("💥🔫", text)
+
+    def test_extract_rejected(self):
+        """Test examples are not taken from an extract, which does not keep the text"""
+        analysis = ExampleAnalysis(["🔫"])
+        with self.assertRaises(ValueError):
+            ExtractAnalysis(analysis)
+        with self.assertRaises(ValueError):
+            ExtractAnalysis(MultiAnalysis([analysis]))
+        with redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            main(analysis, ["-p", self.tmpdir, "--extract", self.tmpdir, "-o", self.tmpdir])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+"""
+Unit tests for extract.py
+"""
+from __future__ import print_function, unicode_literals
+
+import bz2
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from twitter_search import find_all, find_context, get_catalog
+from twitter_search.aggregate import EmojiTally, Results, Tally, Total
+from twitter_search.data import get_all_files, tweet_time
+from twitter_search.extract import ExtractFile, build_extract, decode_tokens, encode_text, store_files, store_path
+from twitter_search.ngrams import NgramTally, emoji_runs
+from twitter_search.pipeline import Analysis, ExtractAnalysis, Runner, main
+
+TEXTS = [
+    "no emoji at all",
+    "hi 🔫",
+    "🔫😂 lol\n😂  😂",
+    "a🔫b 💥🔫 #1 1️⃣ 🇺🇸🇺🇸",
+    "👍🏽 ok 👨‍👩‍👧 ©\t🔫 end ",
+    "🔫",
+]
+
+
+class ContextResults(Results):
+    """Example results"""
+
+    counter_total_tweets = Total()
+    counterdict_lang = Tally()
+    counterdict_hours = Tally()
+    counterdict_users = Tally()
+    counterdict_ids = Tally()
+    counterdict_all_emoji = EmojiTally()
+    counterdict_before = EmojiTally()
+    counterdict_after = EmojiTally()
+    ngrams_emoji = NgramTally()
+
+
+class ContextAnalysis(Analysis):
+    """Example analysis using every kept part of a tweet"""
+
+    name = "context"
+    results_class = ContextResults
+
+    def process(self, tweet, results):
+        results.counter_total_tweets += 1
+        results.counterdict_lang.add(tweet.get("lang"))
+        t = tweet_time(tweet)
+        results.counterdict_hours.add(None if t is None else t - t % 3600)
+        all_emoji, all_count = find_all(tweet["text"])
+        if not all_emoji:
+            return
+        results.counterdict_ids.add(tweet["id"])
+        if "user" in tweet:
+            results.counterdict_users.add(tweet["user"]["id"])
+        for c, n in zip(all_emoji, all_count):
+            results.counterdict_all_emoji.add(c, n)
+        results.ngrams_emoji.add_text(tweet["text"])
+        before, _, after, _ = find_context(tweet["text"], "🔫")
+        if before in get_catalog():
+            results.counterdict_before.add(before)
+        if after in get_catalog():
+            results.counterdict_after.add(after)
+
+
+class TestExtract(unittest.TestCase):
+    """Test the columnar emoji extract"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmpdir, "archive")
+        self.store = os.path.join(self.tmpdir, "store")
+        n = 0
+        for day in range(2):
+            for hour in range(2):
+                path = os.path.join(self.root, "{:02d}".format(day + 1), "{:02d}".format(hour))
+                os.makedirs(path)
+                for i in range(2):
+                    lines = []
+                    for j in range(30):
+                        tweet = {"id": n, "text": TEXTS[n % len(TEXTS)], "timestamp_ms": str(1470009600000 + n * 97000)}
+                        if n % 4:
+                            tweet["lang"] = ["en", "ja", "es"][n % 3]
+                        if n % 5:
+                            tweet["user"] = {"id": n % 7}
+                        lines.append(json.dumps(tweet))
+                        n += 1
+                    lines.append(json.dumps({"delete": {"status": {"id": 0}}}))
+                    with bz2.open(os.path.join(path, "{:02d}.json.bz2".format(i)), "wt", encoding="utf-8") as f:
+                        f.write("\n".join(lines))
+        self.filenames = sorted(get_all_files(self.root))
+        self.n = n
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_tokens(self):
+        """Test skeleton texts keep emoji, their neighbours and runs but not words"""
+        catalog = get_catalog()
+        for text in TEXTS:
+            skeleton = decode_tokens(encode_text(text))
+            self.assertEqual([eid for _, _, eid in catalog.tokens(skeleton)], [eid for _, _, eid in catalog.tokens(text)])
+            self.assertEqual(sorted(zip(*find_all(skeleton))) if find_all(skeleton)[0] else None,
+                             sorted(zip(*find_all(text))) if find_all(text)[0] else None)
+            self.assertEqual(emoji_runs(skeleton), emoji_runs(text))
+            self.assertEqual(emoji_runs(skeleton, ignore_spaces=False), emoji_runs(text, ignore_spaces=False))
+            for char in "🔫😂":
+                expected = [c if c in catalog else None for c in find_context(text, char)[::2]]
+                self.assertEqual([c if c in catalog else None for c in find_context(skeleton, char)[::2]], expected)
+            self.assertNotIn("lol", skeleton)
+        self.assertEqual(len(encode_text(TEXTS[0])), 0)
+
+    def test_extract_file(self):
+        """Test an extract keeps tweets with emoji and counts the rest, and is only rebuilt when stale"""
+        stats = build_extract(self.filenames, self.root, self.store, processes=2, progress=False)
+        self.assertEqual(stats["files"], len(self.filenames))
+        self.assertEqual(stats["tweets"], self.n)
+        self.assertEqual(stats["tweets_wemoji"], self.n - self.n // len(TEXTS))
+        self.assertEqual(sorted(store_files(self.store)), sorted(store_path(f, self.root, self.store) for f in self.filenames))
+        self.assertTrue(store_path(self.filenames[0], self.root, self.store).endswith(os.path.join("00", "00.tse")))
+
+        with ExtractFile(store_path(self.filenames[0], self.root, self.store)) as extract:
+            tweets = list(extract.tweets())
+            totals = list(extract.totals())
+        self.assertEqual(len(tweets), 25)
+        self.assertEqual(sum(n for _, n in totals), 5)
+        first = tweets[0]
+        self.assertEqual((first["id"], first["timestamp_ms"], first["text"]), (1, "1470009697000", "\ufffd🔫"))
+        self.assertEqual((first["lang"], first["user"]), ("ja", {"id": 1}))
+        self.assertNotIn("lang", tweets[3])
+        self.assertNotIn("user", tweets[4])
+
+        self.assertEqual(build_extract(self.filenames, self.root, self.store, processes=2, progress=False)["skipped"], 8)
+        os.utime(self.filenames[0], (0, 0))
+        self.assertEqual(build_extract(self.filenames, self.root, self.store, processes=2, progress=False)["files"], 1)
+
+        with open(os.path.join(self.tmpdir, "other.tse"), "wb") as f:
+            f.write(b"TSCU" + bytes(8))
+        with self.assertRaises(ValueError):
+            ExtractFile(os.path.join(self.tmpdir, "other.tse"))
+
+    def test_extract_analysis(self):
+        """Test an analysis gives the same results on the extract as on the archive"""
+        analysis = ContextAnalysis()
+        expected = analysis.new_results()
+        for filename in self.filenames:
+            expected.merge(analysis(filename))
+        self.assertGreater(len(expected.counterdict_after), 0)
+
+        build_extract(self.filenames, self.root, self.store, processes=2, progress=False)
+        runner = Runner(ExtractAnalysis(analysis), processes=2, progress=False)
+        with redirect_stdout(io.StringIO()):
+            results = runner.run(store_files(self.store))
+        self.assertEqual(results.to_dict(), expected.to_dict())
+        self.assertNotEqual(ExtractAnalysis(analysis).fingerprint(), analysis.fingerprint())
+
+        output_dir = os.path.join(self.tmpdir, "output")
+        with redirect_stdout(io.StringIO()):
+            results = main(analysis, ["-p", self.root, "--extract", self.store, "-o", output_dir, "-n", "2"])
+        self.assertEqual(results.to_dict(), expected.to_dict())
+        with self.assertRaises(ValueError):
+            Runner(ExtractAnalysis(analysis), stages=(1, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+"""
+Unit tests for lease.py
+"""
+from __future__ import print_function, unicode_literals
+
+import bz2
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from contextlib import redirect_stdout
+
+from twitter_search.aggregate import Results, Tally, Total
+from twitter_search.lease import Heartbeat, LeaseDirectory
+from twitter_search.pipeline import Analysis, Checkpoint, Runner
+
+
+class LangResults(Results):
+    """Example results"""
+
+    counter_total_tweets = Total()
+    counterdict_lang = Tally()
+
+
+class LangAnalysis(Analysis):
+    """Example analysis counting languages"""
+
+    name = "lang"
+    results_class = LangResults
+
+    def process(self, tweet, results):
+        results.counter_total_tweets += 1
+        results.counterdict_lang.add(tweet["lang"])
+
+
+class SlowLangAnalysis(LangAnalysis):
+    """Example analysis taking 0.1 seconds per tweet"""
+
+    def process(self, tweet, results):
+        time.sleep(0.1)
+        super().process(tweet, results)
+
+
+class StolenLangAnalysis(LangAnalysis):
+    """Example analysis during which the lease of one file expires and is stolen by
+    another node, which counts the file and completes it"""
+
+    def __init__(self, workdir, root, stolen):
+        self.workdir = workdir
+        self.root = root
+        self.stolen = stolen
+
+    def process_file(self, filename, digest=None):
+        results = super().process_file(filename, digest)
+        marker = os.path.join(self.workdir, "stolen")
+        if os.path.basename(filename) == self.stolen and not os.path.exists(marker):
+            open(marker, "w").close()
+            thief = LeaseDirectory(self.workdir, node="thief", root=self.root)
+            key = thief.key(filename)
+            os.utime(thief._path("leases", key, ".lease"), (0, 0))
+            assert thief.claim(key)
+            Checkpoint(thief.partial()).save(self, super().process_file(filename), {key})
+            thief.complete(key)
+        return results
+
+
+def run_node(workdir, root, filenames, node, output, ttl=600, analysis=None):
+    """One node of a run, standing in for a runner on another host"""
+    leases = LeaseDirectory(workdir, node=node, ttl=ttl, root=root)
+    runner = Runner(analysis or LangAnalysis(), processes=1, progress=False, leases=leases, poll=0.05)
+    with redirect_stdout(io.StringIO()):
+        results = runner.run(filenames)
+    output.put((node, results.to_dict()))
+
+
+class TestLeases(unittest.TestCase):
+    """Test file leases over a shared work directory"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmpdir, "archive")
+        self.workdir = os.path.join(self.tmpdir, "work")
+        os.makedirs(self.root)
+        self.filenames = []
+        for i in range(12):
+            filename = os.path.join(self.root, "{:02d}.json.bz2".format(i))
+            with bz2.open(filename, "wt", encoding="utf-8") as f:
+                f.write("\n".join(json.dumps({"text": "", "lang": ["en", "ja", "es"][i % 3]}) for _ in range(i + 1)))
+            self.filenames.append(filename)
+        self.expected = {"en": 22, "ja": 26, "es": 30}
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_claim(self):
+        """Test leases are exclusive until they expire or are completed"""
+        a = LeaseDirectory(self.workdir, node="a", ttl=60, root=self.root)
+        b = LeaseDirectory(self.workdir, node="b", ttl=60, root=self.root)
+        key = a.key(self.filenames[0])
+
+        self.assertEqual(key, "00.json.bz2")
+        self.assertTrue(a.claim(key))
+        self.assertFalse(b.claim(key))
+
+        # Node a died, its lease expires
+        lease = a._path("leases", key, ".lease")
+        os.utime(lease, (time.time() - 120, time.time() - 120))
+        self.assertTrue(b.claim(key))
+        self.assertFalse(a.claim(key))
+
+        b.complete(key)
+        self.assertTrue(a.is_done(key))
+        self.assertFalse(os.path.exists(lease))
+
+    def test_renew(self):
+        """Test a heartbeat keeps a lease from expiring and only renews leases of this node"""
+        a = LeaseDirectory(self.workdir, node="a", ttl=0.4, root=self.root)
+        b = LeaseDirectory(self.workdir, node="b", ttl=0.4, root=self.root)
+        key = a.key(self.filenames[0])
+        self.assertTrue(a.claim(key))
+        with Heartbeat(a, lambda: [key]):
+            time.sleep(1)
+            self.assertFalse(b.claim(key))
+        self.assertFalse(b.renew(key))
+
+        time.sleep(0.5)
+        self.assertTrue(b.claim(key))
+        self.assertFalse(a.renew(key))
+
+    def run_nodes(self, filenames, count, **kwargs):
+        """Run several nodes over the files and return their results"""
+        output = multiprocessing.Queue()
+        nodes = [
+            multiprocessing.Process(
+                target=run_node, args=(self.workdir, self.root, filenames, "n{}".format(i), output), kwargs=kwargs
+            )
+            for i in range(count)
+        ]
+        for node in nodes:
+            node.start()
+        merged = [output.get(timeout=60) for _ in nodes]
+        for node in nodes:
+            node.join()
+        return merged
+
+    def test_nodes(self):
+        """Test several nodes split the files, each file is counted once and every
+        node ends with the merged results"""
+        merged = self.run_nodes(self.filenames, 3)
+
+        for _, results in merged:
+            self.assertEqual(results["counterdict_lang"], self.expected)
+        leases = LeaseDirectory(self.workdir, node="check")
+        covered = [key for path in leases.partials() for key in Checkpoint(path).load(LangAnalysis())[1]]
+        self.assertEqual(sorted(covered), sorted(os.path.basename(f) for f in self.filenames))
+
+    def test_files_longer_than_ttl(self):
+        """Test files which take longer than the lease time to live are not re-claimed by another node"""
+        merged = self.run_nodes(self.filenames[:6], 2, ttl=0.3, analysis=SlowLangAnalysis())
+
+        for _, results in merged:
+            self.assertEqual(results["counterdict_lang"], {"en": 5, "ja": 7, "es": 9})
+
+    def test_stolen_lease(self):
+        """Test a file whose lease expired and was taken by another node while it was
+        processed is dropped rather than counted twice"""
+        leases = LeaseDirectory(self.workdir, node="slow", root=self.root)
+        analysis = StolenLangAnalysis(self.workdir, self.root, "03.json.bz2")
+        runner = Runner(analysis, processes=2, progress=False, leases=leases, poll=0.05)
+        out = io.StringIO()
+        with redirect_stdout(out):
+            results = runner.run(self.filenames)
+
+        self.assertEqual(results.counterdict_lang, self.expected)
+        self.assertIn("Dropped 1 files", out.getvalue())
+        _, done = Checkpoint(leases.partial()).load(analysis)
+        self.assertNotIn("03.json.bz2", done)
+        self.assertEqual(len(done), 11)
+
+    def test_reclaim_dead_node(self):
+        """Test a lease left by a dead node is re-claimed once it expires"""
+        dead = LeaseDirectory(self.workdir, node="dead", ttl=0.5, root=self.root)
+        self.assertTrue(dead.claim(dead.key(self.filenames[3])))
+
+        leases = LeaseDirectory(self.workdir, node="alive", ttl=0.5, root=self.root)
+        runner = Runner(LangAnalysis(), processes=2, progress=False, leases=leases, poll=0.1)
+        with redirect_stdout(io.StringIO()):
+            results = runner.run(self.filenames)
+
+        self.assertEqual(results.counterdict_lang, self.expected)
+        with self.assertRaises(ValueError):
+            Runner(LangAnalysis(), leases=leases, tree=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
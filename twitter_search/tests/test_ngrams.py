@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""
+Unit tests for ngrams.py
+"""
+from __future__ import print_function, unicode_literals
+
+import unittest
+
+from twitter_search import get_catalog
+from twitter_search.ngrams import EmojiNgrams, NgramTally, emoji_runs
+
+
+class TestEmojiRuns(unittest.TestCase):
+    """Test splitting emoji into runs"""
+
+    def emoji(self, runs):
+        """Convert runs of ids back to emoji"""
+        emoji = get_catalog().emoji
+        return ["".join(emoji[i] for i in run) for run in runs]
+
+    def test_no_runs(self):
+        """Test single emoji are not runs"""
+        self.assertEqual(emoji_runs("no emoji"), [])
+        self.assertEqual(emoji_runs("one 🔫 emoji"), [])
+
+    def test_runs_ignoring_spaces(self):
+        """Test spaces are ignored and other characters break runs"""
+        runs = emoji_runs("😶 🔫 then 🔫👮 and 🔪🔫💣")
+
+        self.assertEqual(self.emoji(runs), ["😶🔫", "🔫👮", "🔪🔫💣"])
+
+    def test_runs_with_spaces(self):
+        """Test spaces break runs when not ignored"""
+        runs = emoji_runs("😶 🔫 and 🔪🔫💣", ignore_spaces=False)
+
+        self.assertEqual(self.emoji(runs), ["🔪🔫💣"])
+
+
+class TestEmojiNgrams(unittest.TestCase):
+    """Test emoji n-gram counts"""
+
+    def test_counts(self):
+        """Test bigram and trigram counts"""
+        ngrams = EmojiNgrams()
+        ngrams.add_text("🔪🔫💣 and 🔪🔫")
+
+        self.assertEqual(ngrams["🔪🔫"], 2)
+        self.assertEqual(ngrams["🔫💣"], 1)
+        self.assertEqual(ngrams["🔪🔫💣"], 1)
+        self.assertEqual(ngrams.top(1), [("🔪🔫", 2)])
+        self.assertEqual(ngrams.top(n=3), [("🔪🔫💣", 1)])
+
+    def test_ties(self):
+        """Test n-grams with the same count are ranked the same whatever order they were merged in"""
+        a, b = EmojiNgrams(), EmojiNgrams()
+        a.add_text("🔪🔫")
+        b.add_text("😶🔫")
+
+        self.assertEqual(EmojiNgrams().merge(a).merge(b).top(), EmojiNgrams().merge(b).merge(a).top())
+
+    def test_merge_and_serialization(self):
+        """Test merging and round trip through the results field"""
+        field = NgramTally()
+        a, b = field.new(), field.new()
+        a.add_text("😶🔫")
+        b.add_text("😶🔫🔫")
+        merged = field.merge(a, b)
+
+        self.assertEqual(merged["😶🔫"], 2)
+        self.assertEqual(field.load(field.dump(merged)).counts, merged.counts)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+"""
+Unit tests for pipeline.py
+"""
+from __future__ import print_function, unicode_literals
+
+import bz2
+import io
+import json
+import os
+import re
+import shutil
+import signal
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+from twitter_search.aggregate import EmojiTally, Results, Tally, Total
+from twitter_search.backpressure import Backpressure
+from twitter_search.pipeline import Analysis, Checkpoint, MultiAnalysis, Runner, main
+
+TEXTS = ["hi 🔫", "no emoji", "🔫😂 lol", "😂"]
+
+
+def write_archive(data_path, days=2, hours=2, files=2, tweets=10):
+    """Write a small archive structured by `day/hour/file.json.bz2`
+
+    Returns:
+        List[str]: All filenames in the order of `get_all_files`
+    """
+    filenames = []
+    n = 0
+    for day in range(days):
+        for hour in range(hours):
+            path = os.path.join(data_path, "{:02d}".format(day + 1), "{:02d}".format(hour))
+            os.makedirs(path)
+            for i in range(files):
+                lines = []
+                for _ in range(tweets):
+                    tweet = {"id": n, "text": TEXTS[n % len(TEXTS)], "lang": ["en", "ja"][n % 2]}
+                    lines.append(json.dumps(tweet))
+                    n += 1
+                lines.append(json.dumps({"delete": {"status": {"id": 0}}}))
+                filename = os.path.join(path, "{:02d}.json.bz2".format(i))
+                with bz2.open(filename, "wt", encoding="utf-8") as f:
+                    f.write("\n".join(lines))
+                filenames.append(filename)
+    return filenames
+
+
+class CountResults(Results):
+    """Example results"""
+
+    counter_total_tweets = Total()
+    counterdict_lang = Tally()
+    counterdict_all_emoji = EmojiTally()
+
+
+class CountAnalysis(Analysis):
+    """Example analysis counting tweets, languages and emoji"""
+
+    name = "count"
+    results_class = CountResults
+
+    def process(self, tweet, results):
+        results.counter_total_tweets += 1
+        results.counterdict_lang.add(tweet["lang"])
+        for c in tweet["text"]:
+            if c in "🔫😂":
+                results.counterdict_all_emoji.add(c)
+
+    def summary(self, results):
+        return [("Total Tweets", results.counter_total_tweets)]
+
+
+class IdAnalysis(Analysis):
+    """Example analysis summing tweet ids"""
+
+    name = "ids"
+    results_class = CountResults
+
+    def process(self, tweet, results):
+        results.counter_total_tweets += tweet["id"]
+
+
+class InterruptedResults(CountResults):
+    """Example results interrupted by Ctrl-C while the first batch is merged in the given process"""
+
+    pid = None
+
+    def merge(self, other):
+        super().merge(other)
+        if os.getpid() == InterruptedResults.pid:
+            InterruptedResults.pid = None
+            os.kill(os.getpid(), signal.SIGINT)
+        return self
+
+
+class InterruptedAnalysis(CountAnalysis):
+    """Example analysis with results which are interrupted"""
+
+    results_class = InterruptedResults
+
+
+class PatternAnalysis(CountAnalysis):
+    """Example analysis holding a compiled pattern"""
+
+    name = "pattern"
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.regex = re.compile(pattern)
+
+    def settings(self):
+        return {"pattern": self.pattern}
+
+
+class TestPipeline(unittest.TestCase):
+    """Test the pipeline runner"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.data_path = os.path.join(self.tmpdir, "archive")
+        self.filenames = write_archive(self.data_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def expected(self):
+        """Results of processing every file in this process"""
+        analysis = CountAnalysis()
+        results = analysis.new_results()
+        for filename in self.filenames:
+            results.merge(analysis(filename))
+        return results
+
+    def run_quietly(self, runner):
+        """Run over all files and return the results and printed output"""
+        return self.run_quietly_on(runner, self.filenames)
+
+    def run_quietly_on(self, runner, filenames):
+        """Run over some files and return the results and printed output"""
+        out = io.StringIO()
+        with redirect_stdout(out):
+            results = runner.run(filenames)
+        return results, out.getvalue()
+
+    def test_process_file(self):
+        """Test processing one file skips deleted tweets"""
+        results = CountAnalysis()(self.filenames[0])
+
+        self.assertEqual(results.counter_total_tweets, 10)
+        self.assertEqual(results.counterdict_lang, {"en": 5, "ja": 5})
+
+    def test_fingerprint(self):
+        """Test fingerprints are the same in every process and settings which are not json are rejected"""
+        self.assertEqual(PatternAnalysis("🔫").fingerprint(), PatternAnalysis("🔫").fingerprint())
+        self.assertNotEqual(PatternAnalysis("🔫").fingerprint(), PatternAnalysis("😂").fingerprint())
+        analysis = CountAnalysis()
+        analysis.regex = re.compile("🔫")
+        with self.assertRaises(TypeError):
+            analysis.fingerprint()
+
+    def test_runner_modes(self):
+        """Test every runner mode gives the same results as a serial run"""
+        expected = self.expected().to_dict()
+        modes = [{}, {"batch_size": 1}, {"tree": True}]
+        if shared_memory is not None:
+            modes.append({"shared": True})
+            modes.append({"shared": True, "batch_size": 3, "backpressure": Backpressure(max_tasks=1, max_unmerged=1)})
+        for mode in modes:
+            runner = Runner(CountAnalysis(), processes=2, progress=False, **mode)
+            results, out = self.run_quietly(runner)
+
+            self.assertEqual(results.to_dict(), expected, mode)
+            self.assertIn("Total Tweets          : 80", out)
+            self.assertGreater(runner.elapsed, 0)
+
+    def test_main(self):
+        """Test the CLI runs the analysis and saves its results"""
+        output_dir = os.path.join(self.tmpdir, "output")
+        argv = ["-p", self.data_path, "-d", "1", "-o", output_dir, "-n", "2"]
+        with redirect_stdout(io.StringIO()):
+            results = main(CountAnalysis(), argv)
+
+        self.assertEqual(results.counter_total_tweets, 40)
+        saved = CountResults.load(os.path.join(output_dir, "count.json"))
+        self.assertEqual(saved.to_dict(), results.to_dict())
+
+    def test_checkpoint_and_resume(self):
+        """Test resuming from a checkpoint skips completed files without double counting"""
+        filename = os.path.join(self.tmpdir, "checkpoint.json")
+        half = self.filenames[:3]
+        runner = Runner(CountAnalysis(), processes=2, batch_size=1, progress=False, checkpoint=Checkpoint(filename, 1))
+        self.run_quietly_on(runner, half)
+
+        results, done = Checkpoint(filename).load(CountAnalysis())
+        self.assertEqual(done, set(half))
+        self.assertEqual(results.counter_total_tweets, 30)
+        shutil.copy(filename, filename + ".half")
+
+        for tree in (False, True):
+            shutil.copy(filename + ".half", filename)
+            runner = Runner(
+                CountAnalysis(), processes=2, tree=tree, progress=False, checkpoint=Checkpoint(filename), resume=True
+            )
+            results, out = self.run_quietly(runner)
+            self.assertEqual(results.to_dict(), self.expected().to_dict())
+            self.assertIn("Resuming with 3 files done", out)
+
+    def test_interrupted_merge(self):
+        """Test an interrupt while a batch is merged checkpoints the batch with its files, so resuming counts it once"""
+        filename = os.path.join(self.tmpdir, "checkpoint.json")
+        InterruptedResults.pid = os.getpid()
+        runner = Runner(InterruptedAnalysis(), processes=2, batch_size=1, progress=False, checkpoint=Checkpoint(filename))
+        _, out = self.run_quietly(runner)
+        self.assertIn("KeyboardInterrupt", out)
+
+        results, done = Checkpoint(filename).load(InterruptedAnalysis())
+        self.assertEqual(results.counter_total_tweets, 10 * len(done))
+        runner = Runner(InterruptedAnalysis(), processes=2, progress=False, checkpoint=Checkpoint(filename), resume=True)
+        results, _ = self.run_quietly(runner)
+        self.assertEqual(results.to_dict(), self.expected().to_dict())
+
+    def test_resume_with_other_root(self):
+        """Test completed files are recorded relative to the archive, so another spelling of it skips them"""
+        filename = os.path.join(self.tmpdir, "checkpoint.json")
+        runner = Runner(CountAnalysis(), processes=2, progress=False, checkpoint=Checkpoint(filename, root=self.data_path))
+        self.run_quietly_on(runner, self.filenames[:3])
+        _, done = Checkpoint(filename).load(CountAnalysis())
+        self.assertEqual(done, {os.path.relpath(f, self.data_path) for f in self.filenames[:3]})
+
+        other = os.path.join(self.tmpdir, ".", "archive")
+        filenames = [os.path.join(other, os.path.relpath(f, self.data_path)) for f in self.filenames]
+        runner = Runner(CountAnalysis(), processes=2, progress=False, checkpoint=Checkpoint(filename, root=other), resume=True)
+        results, out = self.run_quietly_on(runner, filenames)
+        self.assertEqual(results.to_dict(), self.expected().to_dict())
+        self.assertIn("Resuming with 3 files done", out)
+
+    def test_checkpoint_errors(self):
+        """Test checkpoints of another analysis version or settings and with shared memory are rejected"""
+        filename = os.path.join(self.tmpdir, "checkpoint.json")
+        Checkpoint(filename).save(CountAnalysis(), CountAnalysis().new_results(), set())
+        analysis = CountAnalysis()
+        analysis.version = "2"
+
+        with self.assertRaises(ValueError):
+            Checkpoint(filename).load(analysis)
+        analysis = CountAnalysis()
+        analysis.match = "🔫"
+        with self.assertRaises(ValueError):
+            Checkpoint(filename).load(analysis)
+        with self.assertRaises(ValueError):
+            Runner(analysis, checkpoint=Checkpoint(filename), shared=True)
+        with self.assertRaises(ValueError):
+            Runner(analysis, resume=True)
+
+    def test_multi_analysis(self):
+        """Test several analyses in one pass match separate runs and save separately"""
+        multi = MultiAnalysis([CountAnalysis(), IdAnalysis()])
+        runner = Runner(multi, processes=2, progress=False)
+        results, out = self.run_quietly(runner)
+
+        count, ids = results.parts
+        self.assertEqual(count.to_dict(), self.expected().to_dict())
+        self.assertEqual(ids.counter_total_tweets, sum(range(80)))
+        self.assertIn("count Total Tweets    : 80", out)
+
+        multi.save(results, self.tmpdir)
+        saved = CountResults.load(os.path.join(self.tmpdir, "count", "count.json"))
+        self.assertEqual(saved.to_dict(), count.to_dict())
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, "ids", "ids.json")))
+
+        filename = os.path.join(self.tmpdir, "checkpoint.json")
+        Checkpoint(filename).save(multi, results, set())
+        loaded, _ = Checkpoint(filename).load(multi)
+        self.assertEqual(loaded.to_dict(), results.to_dict())
+
+        with self.assertRaises(ValueError):
+            MultiAnalysis([CountAnalysis(), CountAnalysis()])
+        with self.assertRaises(ValueError):
+            Runner(multi, shared=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
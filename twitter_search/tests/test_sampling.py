@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+"""
+Unit tests for sampling.py
+"""
+from __future__ import print_function, unicode_literals
+
+import csv
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+from twitter_search.aggregate import EmojiTally, FoldedEmojiTally, Results, Tally, Total
+from twitter_search.cooccurrence import CooccurrenceTally
+from twitter_search.cube import CubeTally
+from twitter_search.data import read_zip
+from twitter_search.ngrams import NgramTally
+from twitter_search.pipeline import Analysis, Checkpoint, MultiAnalysis, Runner, SampledAnalysis, main
+from twitter_search.sampling import Reservoir, ReservoirTally, estimate, keep, priority, scaled, tweet_key, unscaled_fields
+from twitter_search.sketch import EmojiDistinctTally, TopKTally
+from twitter_search.tests.test_pipeline import TEXTS, CountAnalysis, IdAnalysis, write_archive
+from twitter_search.timeseries import BucketedEmojiTally, TimeTally
+
+
+class EveryResults(Results):
+    """Example results with a field of every kind"""
+
+    counter_total_tweets = Total()
+    counterdict_lang = Tally()
+    counterdict_hours = TimeTally()
+    counterdict_emoji = EmojiTally()
+    counterdict_emoji_views = FoldedEmojiTally()
+    series_emoji = BucketedEmojiTally()
+    cube_emoji = CubeTally()
+    cooccurrence_emoji = CooccurrenceTally()
+    ngrams_emoji = NgramTally()
+    topk_words = TopKTally()
+    distinct_users = EmojiDistinctTally()
+    examples = ReservoirTally()
+
+
+class EveryAnalysis(Analysis):
+    """Example analysis filling a field of every kind"""
+
+    name = "every"
+    results_class = EveryResults
+
+    def process(self, tweet, results):
+        text = tweet["text"]
+        t = 1470009600 + tweet["id"] * 97
+        results.counter_total_tweets += 1
+        results.counterdict_lang.add(tweet.get("lang"))
+        results.counterdict_hours.add(t - t % 3600)
+        emoji = [c for c in text if c in "🔫😂💥"]
+        for c in emoji:
+            results.counterdict_emoji.add(c)
+            results.series_emoji.add(t, c)
+        results.counterdict_emoji_views.add_text(text)
+        if emoji:
+            results.cube_emoji.add_many(tweet.get("lang"), t, emoji, [1] * len(emoji))
+            results.distinct_users.add_many(emoji, tweet["id"])
+        results.cooccurrence_emoji.add(emoji)
+        results.ngrams_emoji.add_text(text)
+        for word in text.split():
+            results.topk_words.add(word)
+        results.examples.setdefault(tweet.get("lang"), Reservoir(3)).add(priority(tweet["id"]), text)
+
+
+def unordered(value):
+    """Value of `to_dict` with the order of lists ignored, e.g. of cube rows"""
+    if isinstance(value, dict):
+        return {key: unordered(v) for key, v in value.items()}
+    if isinstance(value, list):
+        return sorted((unordered(v) for v in value), key=repr)
+    return value
+
+
+class TestSampling(unittest.TestCase):
+    """Test sampling and scaled estimates"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.data_path = os.path.join(self.tmpdir, "archive")
+        self.filenames = write_archive(self.data_path, days=2, hours=4, files=4, tweets=25)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_keep(self):
+        """Test samples are deterministic, nested across rates and close to the rate"""
+        keys = [str(i) for i in range(20000)]
+        ten = {key for key in keys if keep(key, 0.1, seed=3)}
+        five = {key for key in keys if keep(key, 0.05, seed=3)}
+
+        self.assertEqual(ten, {key for key in keys if keep(key, 0.1, seed=3)})
+        self.assertLessEqual(five, ten)
+        self.assertNotEqual(ten, {key for key in keys if keep(key, 0.1, seed=4)})
+        self.assertAlmostEqual(len(ten) / len(keys), 0.1, delta=0.01)
+        self.assertTrue(all(keep(key, 1) for key in keys[:10]))
+
+    def test_estimate(self):
+        """Test scaling and interval width, with no width for a full sample"""
+        self.assertEqual(estimate(10, 10, 1.0), (10.0, 10.0, 10.0))
+        value, lower, upper = estimate(10, 10, 0.1)
+        self.assertEqual(value, 100.0)
+        self.assertAlmostEqual(upper - value, 1.959963984540054 * (0.9 * 10) ** 0.5 / 0.1)
+        self.assertAlmostEqual(lower, value - (upper - value))
+
+    def test_reservoir(self):
+        """Test reservoirs filled in any split and order merge to the same uniform sample"""
+        items = ["tweet {}".format(i) for i in range(500)]
+        whole = Reservoir(20)
+        for item in items:
+            whole.add(priority(item), item)
+        self.assertEqual(whole.seen, 500)
+        self.assertEqual(whole.sample(), [item for _, item in sorted((priority(item), item) for item in items)[:20]])
+
+        parts = [Reservoir(20) for _ in range(3)]
+        for i, item in enumerate(reversed(items)):
+            parts[i % 3].add(priority(item), item)
+        field = ReservoirTally()
+        merged = field.new()
+        for part in parts:
+            field.merge(merged, {"a": part})
+        self.assertEqual(merged["a"], whole)
+        self.assertEqual(field.load(field.dump(merged)), {"a": whole})
+        self.assertTrue(whole.full())
+
+    def test_sampled_tweets(self):
+        """Test a tweet sample is the same in every run mode and its interval covers the total"""
+        analysis = SampledAnalysis(CountAnalysis(), 0.2, seed=1)
+        expected = analysis.new_results()
+        for filename in self.filenames:
+            expected.merge(analysis(filename))
+        self.assertEqual(expected.units, expected.sample.counter_total_tweets)
+        self.assertEqual(expected.squares["counter_total_tweets"], expected.units)
+
+        for mode in ({}, {"tree": True}, {"stages": (1, 2)}):
+            runner = Runner(analysis, processes=2, progress=False, **mode)
+            with redirect_stdout(io.StringIO()) as out:
+                results = runner.run(self.filenames)
+            self.assertEqual(results.to_dict(), expected.to_dict(), mode)
+            self.assertIn("Sample Rate", out.getvalue())
+
+        total = len(self.filenames) * 25
+        _, lower, upper = estimate(expected.units, expected.units, 0.2)
+        self.assertLess(lower, total)
+        self.assertGreater(upper, total)
+
+        filename = os.path.join(self.tmpdir, "checkpoint.json")
+        Checkpoint(filename).save(analysis, expected, set())
+        with self.assertRaises(ValueError):
+            Checkpoint(filename).load(SampledAnalysis(CountAnalysis(), 0.2, seed=2))
+        with self.assertRaises(ValueError):
+            Runner(analysis, shared=True)
+
+    def test_scaled_fields(self):
+        """Test every scalable field is scaled as if each tweet was counted 1 / rate times,
+        and the others are listed and kept at their sample values"""
+        analysis = EveryAnalysis()
+        tweets = [{"id": i, "text": TEXTS[i % len(TEXTS)], "lang": ["en", "ja"][i % 2]} for i in range(40)]
+        once, twice = analysis.new_results(), analysis.new_results()
+        for tweet in tweets:
+            analysis.process(tweet, once)
+            analysis.process(tweet, twice)
+            analysis.process(tweet, twice)
+
+        copy = scaled(once, 0.5)
+        self.assertEqual(unscaled_fields(once), ["distinct_users", "examples"])
+        for name, field in once.fields():
+            expected = twice if field.scalable else once
+            self.assertEqual(unordered(field.dump(getattr(copy, name))), unordered(field.dump(getattr(expected, name))), name)
+        self.assertEqual(list(copy.counterdict_hours), list(once.counterdict_hours))
+        with self.assertRaises(NotImplementedError):
+            EveryResults.examples.scale(once.examples, 2)
+
+    def test_sampled_every_field(self):
+        """Test sampled tweets are counted in place with the same results and squares
+        as processing each tweet into its own results, and unscaled fields are labelled"""
+        analysis = SampledAnalysis(MultiAnalysis([EveryAnalysis(), CountAnalysis()]), 0.3, seed=2)
+        results = analysis.new_results()
+        expected = analysis.new_results()
+        for filename in self.filenames[:4]:
+            results.merge(analysis(filename))
+            for tweet in read_zip(filename):
+                if keep(tweet_key(tweet), 0.3, seed=2):
+                    unit = analysis.analysis.new_results()
+                    analysis.analysis.process(tweet, unit)
+                    expected.add_unit(unit, analysis._count_values(unit))
+        self.assertGreater(results.units, 0)
+        self.assertEqual(unordered(results.to_dict()), unordered(expected.to_dict()))
+        self.assertIn("every.counterdict_emoji/🔫", results.squares)
+
+        output_dir = os.path.join(self.tmpdir, "output")
+        os.makedirs(output_dir)
+        self.assertIn(("Unscaled Fields", "every.distinct_users, every.examples"), analysis.summary(results))
+        analysis.save(results, output_dir)
+        with open(os.path.join(output_dir, "unscaled_fields.txt"), encoding="utf-8") as f:
+            self.assertEqual(f.read().splitlines()[1:], ["every.distinct_users", "every.examples"])
+
+    def test_sampled_files(self):
+        """Test a file sample only opens sampled files and counts files as units"""
+        analysis = SampledAnalysis(CountAnalysis(), 0.5, unit="files", root=self.data_path)
+        selected = analysis.select(self.filenames)
+        self.assertTrue(0 < len(selected) < len(self.filenames))
+
+        results = analysis.new_results()
+        for filename in self.filenames:
+            results.merge(analysis(filename))
+        self.assertEqual(results.units, len(selected))
+        self.assertEqual(results.sample.counter_total_tweets, 25 * len(selected))
+        self.assertEqual(results.squares["counter_total_tweets"], 25 ** 2 * len(selected))
+
+        with self.assertRaises(ValueError):
+            Runner(analysis, stages=(1, 1))
+
+    def test_main(self):
+        """Test the CLI saves scaled results and estimates of multiple analyses"""
+        output_dir = os.path.join(self.tmpdir, "output")
+        argv = ["-p", self.data_path, "-o", output_dir, "-n", "2", "--sample", "0.25", "--sample_seed", "7"]
+        with redirect_stdout(io.StringIO()):
+            results = main(MultiAnalysis([CountAnalysis(), IdAnalysis()]), argv)
+
+        with open(os.path.join(output_dir, "estimates.csv"), encoding="utf-8") as f:
+            rows = {(row["field"], row["key"]): row for row in csv.DictReader(f)}
+        row = rows[("count.counter_total_tweets", "")]
+        self.assertEqual(int(row["sample"]), results.units)
+        self.assertEqual(float(row["estimate"]), results.units / 0.25)
+        self.assertIn(("ids.counter_total_tweets", ""), rows)
+
+        with open(os.path.join(output_dir, "count", "count.json"), encoding="utf-8") as f:
+            self.assertIn('"counter_total_tweets": {}'.format(results.units * 4), f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""
+Unit tests for shared.py
+"""
+from __future__ import print_function, unicode_literals
+
+import unittest
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+from twitter_search.aggregate import EmojiTally, Results, Tally, Total
+from twitter_search.backpressure import Backpressure
+from twitter_search.shared import SharedResults
+
+
+class ExampleResults(Results):
+    """Results with shared and unshared fields"""
+
+    counter_total = Total()
+    counterdict_lang = Tally()
+    counterdict_emoji = EmojiTally()
+
+
+def worker(filename):
+    """Example worker counting the characters of the filename"""
+    results = ExampleResults()
+    for c in filename:
+        results.counter_total += 1
+        results.counterdict_lang.add(c)
+        results.counterdict_emoji.add(c)
+    return results
+
+
+@unittest.skipIf(shared_memory is None, "Requires multiprocessing.shared_memory")
+class TestSharedResults(unittest.TestCase):
+    """Test shared memory results"""
+
+    def setUp(self):
+        self.shared = SharedResults(ExampleResults, 2)
+
+    def tearDown(self):
+        self.shared.unlink()
+
+    def test_layout(self):
+        """Test fields are split into shared and unshared"""
+        self.assertEqual(self.shared.arrays, ["counterdict_emoji"])
+        self.assertEqual(self.shared.totals, ["counter_total"])
+        self.assertEqual(self.shared.unshared, ["counterdict_lang"])
+
+    def test_add_and_collect(self):
+        """Test slots are summed on collect"""
+        self.shared.add(0, worker("😂🔫"))
+        self.shared.add(1, worker("😂"))
+        results = self.shared.collect()
+
+        self.assertEqual(results.counter_total, 3)
+        self.assertCountEqual(results.counterdict_emoji.items(), [("😂", 2), ("🔫", 1)])
+
+    def test_pool(self):
+        """Test workers in a pool add batches to shared memory within the backpressure limits"""
+        results = ExampleResults()
+        pool = self.shared.pool(2)
+        try:
+            for unshared in self.shared.imap(pool, worker, [["😂🔫", "😂"], ["🔫🔫"]], Backpressure(max_tasks=1)):
+                self.shared.merge_unshared(results, unshared)
+        finally:
+            pool.terminate()
+            pool.join()
+        self.shared.collect(results)
+
+        self.assertEqual(results.counter_total, 5)
+        self.assertEqual(dict(results.counterdict_lang), {"😂": 2, "🔫": 3})
+        self.assertCountEqual(results.counterdict_emoji.items(), [("😂", 2), ("🔫", 3)])
+
+
+if __name__ == "__main__":
+    unittest.main()
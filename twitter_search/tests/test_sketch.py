@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+"""
+Unit tests for sketch.py
+"""
+from __future__ import print_function, unicode_literals
+
+import pickle
+import random
+import unittest
+
+from twitter_search.sketch import EmojiDistinctTally, HyperLogLog, SpaceSaving, TopKTally
+
+
+def zipf_words(n, seed):
+    """Random words with a long tail"""
+    rng = random.Random(seed)
+    return ["w{}".format(int(rng.paretovariate(1.0))) for _ in range(n)]
+
+
+class TestSpaceSaving(unittest.TestCase):
+    """Test Space-Saving top k summary"""
+
+    def check_bounds(self, summary, words):
+        """Test every reported count bounds the true count"""
+        for key, c, err in summary.top():
+            self.assertLessEqual(c - err, words.count(key))
+            self.assertGreaterEqual(c, words.count(key))
+        for w in set(words) - set(summary.counts):
+            self.assertLessEqual(words.count(w), summary.floor)
+
+    def test_bounds_and_size(self):
+        """Test counts are within their error bounds and the table stays small"""
+        words = zipf_words(5000, 5)
+        summary = SpaceSaving(k=10)
+        for w in words:
+            summary.add(w)
+            self.assertLessEqual(len(summary.counts), 20)
+
+        self.assertEqual(summary.total, 5000)
+        self.assertEqual([key for key, _, _ in summary.top(3)], ["w1", "w2", "w3"])
+        self.check_bounds(summary, words)
+
+    def test_exact_when_small(self):
+        """Test counts are exact when there are fewer than 2k keys"""
+        summary = SpaceSaving(k=5)
+        for w in ["a", "b", "a", "c", "a", "b"]:
+            summary.add(w)
+
+        self.assertEqual(summary.top(), [("a", 3, 0), ("b", 2, 0), ("c", 1, 0)])
+        self.assertEqual(summary["d"], 0)
+
+    def test_ties(self):
+        """Test keys with the same count are ranked and pruned by key, whatever order they were added in"""
+        forward, backward = SpaceSaving(k=2), SpaceSaving(k=2)
+        for w in ["c", "b", "a"]:
+            forward.add(w)
+        for w in ["a", "b", "c"]:
+            backward.add(w)
+
+        self.assertEqual(forward.to_dict(), backward.to_dict())
+        self.assertEqual([key for key, _, _ in forward.top()], ["a", "b"])
+
+    def test_merge(self):
+        """Test merged summaries bound the counts of all keys"""
+        words_a, words_b = zipf_words(3000, 6), zipf_words(3000, 7)
+        a, b = SpaceSaving(k=10), SpaceSaving(k=10)
+        for w in words_a:
+            a.add(w)
+        for w in words_b:
+            b.add(w)
+        a.merge(b)
+
+        self.assertEqual(a.total, 6000)
+        self.assertLessEqual(len(a.counts), 10)
+        self.check_bounds(a, words_a + words_b)
+        with self.assertRaises(ValueError):
+            a.merge(SpaceSaving(k=5))
+
+    def test_serialization(self):
+        """Test round trips through the results field and pickle"""
+        field = TopKTally(k=5)
+        summary = field.new()
+        for w in zipf_words(500, 8):
+            summary.add(w)
+
+        for copy in (field.load(field.dump(summary)), pickle.loads(pickle.dumps(summary))):
+            self.assertEqual(copy.top(), summary.top())
+            self.assertEqual(copy.floor, summary.floor)
+
+
+class TestHyperLogLog(unittest.TestCase):
+    """Test HyperLogLog distinct counting"""
+
+    def test_count_within_error(self):
+        """Test estimates are close to the true distinct counts"""
+        for n in (10, 1000, 50000):
+            hll = HyperLogLog(p=12)
+            for i in range(n):
+                hll.add(i)
+                hll.add(i)
+
+            self.assertAlmostEqual(hll.count(), n, delta=max(4 * hll.error() * n, 1))
+
+    def test_merge(self):
+        """Test merging matches a single estimator of all keys"""
+        a, b, c = HyperLogLog(), HyperLogLog(), HyperLogLog()
+        for i in range(3000):
+            (a if i % 2 else b).add(i)
+            c.add(i)
+        a.merge(b)
+
+        self.assertEqual(a.registers, c.registers)
+        with self.assertRaises(ValueError):
+            a.merge(HyperLogLog(p=8))
+
+    def test_emoji_distinct_tally(self):
+        """Test distinct users per emoji through a results field"""
+        field = EmojiDistinctTally(p=8)
+        a, b = field.new(), field.new()
+        for user in range(100):
+            a.add_many(["🔫", "😂"], user)
+            b.add("🔫", user + 50)
+        merged = field.merge(a, b)
+        copy = field.load(field.dump(merged))
+
+        self.assertAlmostEqual(merged["🔫"], 150, delta=20)
+        self.assertAlmostEqual(merged["😂"], 100, delta=15)
+        self.assertEqual(merged["💣"], 0)
+        self.assertEqual(copy.items(), merged.items())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+"""
+Unit tests for staged.py
+"""
+from __future__ import print_function, unicode_literals
+
+import bz2
+import io
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import redirect_stdout
+
+from twitter_search.aggregate import EmojiTally, Results, Tally, Total
+from twitter_search.data import tweet_time
+from twitter_search.pipeline import Analysis, Runner
+from twitter_search.staged import RingBuffer, _put, project, run_staged, unproject
+
+TWEETS = [
+    {"id": 1, "text": "🔫 hi", "lang": "en", "timestamp_ms": "1470009600000", "user": {"id": 7, "name": "a"}},
+    {"id": 2, "text": "😂😂", "created_at": "Mon Aug 01 00:05:00 +0000 2016", "extra": [1, 2]},
+]
+
+
+class TweetResults(Results):
+    """Example results"""
+
+    counter_total_tweets = Total()
+    counterdict_lang = Tally()
+    counterdict_users = Tally()
+    counterdict_all_emoji = EmojiTally()
+
+
+class TweetAnalysis(Analysis):
+    """Example analysis using every projected key"""
+
+    name = "tweets"
+    results_class = TweetResults
+
+    def process(self, tweet, results):
+        results.counter_total_tweets += tweet["id"] + tweet_time(tweet) % 1000
+        results.counterdict_lang.add(tweet.get("lang"))
+        if "user" in tweet:
+            results.counterdict_users.add(tweet["user"]["id"])
+        for c in tweet["text"]:
+            if c in "🔫😂":
+                results.counterdict_all_emoji.add(c)
+
+
+class SlowAnalysis(TweetAnalysis):
+    """Example analysis taking 10 ms per tweet"""
+
+    def process(self, tweet, results):
+        time.sleep(0.01)
+        super().process(tweet, results)
+
+
+def echo(ring_in, ring_out, n):
+    """Reads n items from one ring and writes them reversed to another"""
+    for _ in range(n):
+        ring_out.put(ring_in.get()[::-1])
+
+
+class TestStaged(unittest.TestCase):
+    """Test staged pipeline"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filenames = []
+        for i in range(6):
+            filename = os.path.join(self.tmpdir, "{:02d}.json.bz2".format(i))
+            with bz2.open(filename, "wt", encoding="utf-8") as f:
+                f.write("\n".join(json.dumps(TWEETS[(i + j) % 2]) for j in range(50)))
+            self.filenames.append(filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_projection(self):
+        """Test records keep the projected keys and leave missing keys missing"""
+        for tweet in TWEETS:
+            skeleton = unproject(project(tweet))
+            self.assertEqual(skeleton["text"], tweet["text"])
+            self.assertEqual(tweet_time(skeleton), tweet_time(tweet))
+            self.assertEqual("lang" in skeleton, "lang" in tweet)
+            self.assertEqual("user" in skeleton, "user" in tweet)
+            self.assertNotIn("extra", skeleton)
+
+    def test_ring_buffer(self):
+        """Test items pass between processes in order and oversize items are refused"""
+        ring_in, ring_out = RingBuffer(slots=2, slot_size=16), RingBuffer(slots=2, slot_size=16)
+        process = multiprocessing.Process(target=echo, args=(ring_in, ring_out, 5))
+        process.start()
+        for i in range(5):
+            ring_in.put("item{}".format(i).encode("utf-8"))
+        # The fifth put needed the echo process to free slots of the first ring
+        for i in range(5):
+            self.assertEqual(ring_out.get(), "{}meti".format(i).encode("utf-8"))
+        process.join()
+
+        with self.assertRaises(ValueError):
+            ring_in.put(b"x" * 17)
+
+    def test_put_with_dead_process(self):
+        """Test a put on a full ring fails when a stage process has died instead of waiting forever"""
+        ring = RingBuffer(slots=1, slot_size=16)
+        ring.put(b"full")
+        with self.assertRaises(queue.Full):
+            ring.put(b"more", timeout=0.01)
+
+        process = multiprocessing.Process(target=sys.exit, args=(3,), name="consumer-0")
+        process.start()
+        process.join()
+        with self.assertRaisesRegex(RuntimeError, "consumer-0 exited with code 3"):
+            _put(ring, b"", [process])
+
+    def test_interrupt(self):
+        """Test Ctrl-C stops decoding new files and keeps the counts of the files decoded before it"""
+        analysis = SlowAnalysis()
+        per_file = sum(TweetAnalysis()(self.filenames[0]).counterdict_all_emoji.counts)
+        results = analysis.new_results()
+        timer = threading.Timer(0.3, os.kill, (os.getpid(), signal.SIGINT))
+        timer.start()
+        with self.assertRaises(KeyboardInterrupt):
+            run_staged(analysis, self.filenames, 1, 2, progress=False, ring=RingBuffer(slots=1), results=results)
+        timer.join()
+
+        # Whole files only, some but not all of them
+        emoji = sum(results.counterdict_all_emoji.counts)
+        self.assertEqual(emoji % per_file, 0)
+        self.assertTrue(0 < emoji < per_file * len(self.filenames))
+
+    def test_run_staged(self):
+        """Test staged results match a serial run, with chunks split to fit small slots"""
+        analysis = TweetAnalysis()
+        expected = analysis.new_results()
+        for filename in self.filenames:
+            expected.merge(analysis(filename))
+
+        ring = RingBuffer(slots=4, slot_size=2048)
+        results = run_staged(analysis, self.filenames, 2, 3, progress=False, ring=ring)
+        self.assertEqual(results.to_dict(), expected.to_dict())
+
+        runner = Runner(analysis, progress=False, stages=(1, 2))
+        with redirect_stdout(io.StringIO()):
+            results = runner.run(self.filenames)
+        self.assertEqual(results.to_dict(), expected.to_dict())
+
+        with self.assertRaises(ValueError):
+            Runner(analysis, stages=(1, 2), tree=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
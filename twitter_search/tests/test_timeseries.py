@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+"""
+Unit tests for timeseries.py
+"""
+from __future__ import print_function, unicode_literals
+
+import json
+import os
+import pickle
+import tempfile
+import unittest
+
+from twitter_search.aggregate import Results
+from twitter_search.data import tweet_time
+from twitter_search.pipeline import Analysis, Checkpoint
+from twitter_search.timeseries import DAY, HOUR, BucketedEmojiCounts, BucketedEmojiTally, TimeTally
+
+# 2016-08-01 00:00 UTC
+T0 = 1470009600
+
+
+def example():
+    """Counts over two days"""
+    counts = BucketedEmojiCounts(HOUR)
+    counts.add(T0 + 5, "🔫")
+    counts.add_many(T0 + 10, ["🔫", "😂"], [2, 1])
+    counts.add(T0 + HOUR + 1, "😂", 3)
+    counts.add(T0 + DAY, "🔫")
+    return counts
+
+
+class HourlyResults(Results):
+    """Results with tweets counted per hour"""
+
+    timeseries_tweets = TimeTally()
+
+
+class HourlyAnalysis(Analysis):
+    """Analysis counting tweets per hour"""
+
+    name = "hourly"
+    results_class = HourlyResults
+
+
+class TestTweetTime(unittest.TestCase):
+    """Test tweet time function"""
+
+    def test_tweet_time(self):
+        """Test time from timestamp_ms and created_at"""
+        self.assertEqual(tweet_time({"timestamp_ms": "1470009900123"}), T0 + 300)
+        self.assertEqual(tweet_time({"created_at": "Mon Aug 01 00:05:00 +0000 2016"}), T0 + 300)
+        self.assertIsNone(tweet_time({}))
+
+
+class TestBucketedEmojiCounts(unittest.TestCase):
+    """Test time bucketed emoji counts"""
+
+    def test_series(self):
+        """Test counts per hour"""
+        counts = example()
+
+        self.assertEqual(counts.buckets(), [T0, T0 + HOUR, T0 + DAY])
+        self.assertEqual(counts.series("🔫"), [(T0, 3), (T0 + HOUR, 0), (T0 + DAY, 1)])
+        self.assertCountEqual(counts.totals().items(), [("🔫", 4), ("😂", 4)])
+
+    def test_rollup(self):
+        """Test rolling hours up to days"""
+        daily = example().rollup(DAY)
+
+        self.assertEqual(daily.series("😂"), [(T0, 4), (T0 + DAY, 0)])
+        with self.assertRaises(ValueError):
+            example().rollup(HOUR + 1)
+
+    def test_merge_and_serialization(self):
+        """Test merging and round trips through pickle and the results field"""
+        field = BucketedEmojiTally()
+        merged = field.merge(example(), example())
+
+        self.assertEqual(merged.series("🔫")[0], (T0, 6))
+        self.assertEqual(field.load(field.dump(merged)).items(), merged.items())
+        self.assertEqual(pickle.loads(pickle.dumps(merged)).items(), merged.items())
+
+    def test_sparse_pickle(self):
+        """Test buckets pickle as their non-zero entries, not as whole rows"""
+        counts = BucketedEmojiCounts(HOUR)
+        for hour in range(100):
+            counts.add(T0 + hour * HOUR, "🔫", hour + 1)
+        copy = pickle.loads(pickle.dumps(counts))
+
+        self.assertEqual(copy.items(), counts.items())
+        self.assertEqual(copy.resolution, HOUR)
+        self.assertEqual(copy.series("😂"), [(T0 + hour * HOUR, 0) for hour in range(100)])
+        self.assertLess(len(pickle.dumps(counts)), 100 * 40)
+
+    def test_time_tally(self):
+        """Test time keys stay ints through json and a checkpoint, so restored counts merge with new ones"""
+        field = TimeTally()
+        value = field.new()
+        value.add(T0, 2)
+        value.add(T0 + HOUR)
+        self.assertEqual(field.load(json.loads(json.dumps(field.dump(value)))), value)
+
+        analysis = HourlyAnalysis()
+        results = analysis.new_results()
+        results.timeseries_tweets.add(T0, 2)
+        with tempfile.TemporaryDirectory() as tmp:
+            checkpoint = Checkpoint(os.path.join(tmp, "checkpoint.json"))
+            checkpoint.save(analysis, results, set())
+            restored, _ = checkpoint.load(analysis)
+        new = analysis.new_results()
+        new.timeseries_tweets.add(T0, 1)
+        new.timeseries_tweets.add(T0 + HOUR)
+        restored.merge(new)
+
+        self.assertEqual(sorted(restored.timeseries_tweets.items()), [(T0, 3), (T0 + HOUR, 1)])
+
+
+if __name__ == "__main__":
+    unittest.main()
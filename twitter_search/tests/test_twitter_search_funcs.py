@@ -6,7 +6,14 @@ from __future__ import print_function, unicode_literals
 
 import unittest
 
-from twitter_search import find_all, find_all_if, find_context, smoothed_relative_freq
+from twitter_search import (
+    find_all,
+    find_all_if,
+    find_context,
+    merge_counts,
+    smoothed_relative_freq,
+    sum_dicts,
+)
 
 
 class TestFindContext(unittest.TestCase):
@@ -161,5 +168,27 @@ class TestSmoothedRelativeFreq(unittest.TestCase):
         self.assertAlmostEqual(rel_freq_100, 0.8478425435)
 
 
+class TestMergeDicts(unittest.TestCase):
+    """Test dictionary merge functions"""
+
+    def test_sum_dicts(self):
+        """Test sum dicts returns a new dict"""
+        a = {"x": 1, "y": 1}
+        b = {"x": 1, "z": 1}
+
+        self.assertEqual(sum_dicts(a, b), {"x": 2, "y": 1, "z": 1})
+        self.assertEqual(a, {"x": 1, "y": 1})
+
+    def test_merge_counts(self):
+        """Test merge counts updates the first dict in place"""
+        a = {"x": 1, "y": 1}
+        b = {"x": 1, "z": 1}
+        merged = merge_counts(a, b)
+
+        self.assertIs(merged, a)
+        self.assertEqual(a, {"x": 2, "y": 1, "z": 1})
+        self.assertEqual(b, {"x": 1, "z": 1})
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,247 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Time bucketed emoji counts
+
+Counts are kept as a 2-D table of time bucket x emoji id, with one int64 row
+per bucket that has been seen, so a single pass over the archive can answer
+hourly or daily trend questions. Buckets are numbered from the epoch, e.g. the
+hour bucket of a tweet is its time in seconds // 3600. Like `EmojiCounts`, the
+table pickles as its non-zero entries only, so workers send back a few entries
+per bucket rather than whole rows.
+
+"""
+from array import array
+
+from twitter_search.aggregate import Counts, EmojiCounts, Field, Tally, merge_arrays, scale_array
+from twitter_search.catalog import get_catalog
+
+__all__ = ["HOUR", "DAY", "BucketedEmojiCounts", "BucketedEmojiTally", "TimeTally"]
+
+# Bucket widths in seconds
+HOUR = 3600
+DAY = 86400
+
+
+class BucketedEmojiCounts:
+
+    """Emoji counts per time bucket.
+
+    Attributes:
+        resolution (int): Width of each bucket in seconds
+        rows (dict): Bucket number to an array of counts indexed by emoji id
+    """
+
+    def __init__(self, resolution=HOUR):
+        """Initialize with no buckets.
+
+        Args:
+            resolution (int, optional): Width of each bucket in seconds
+        """
+        self.resolution = resolution
+        self.rows = {}
+
+    def _row(self, t):
+        """Counts array of the bucket containing a time, created if needed.
+
+        Args:
+            t (int): Seconds since the epoch
+
+        Returns:
+            array
+        """
+        bucket = t // self.resolution
+        row = self.rows.get(bucket)
+        if row is None:
+            row = self.rows[bucket] = array("q", bytes(8 * len(get_catalog())))
+        return row
+
+    def add(self, t, emoji, n=1):
+        """Adds n to the count of an emoji unicode string at a time.
+
+        Args:
+            t (int): Seconds since the epoch
+            emoji (str)
+            n (int, optional)
+        """
+        self._row(t)[get_catalog().ids[emoji]] += n
+
+    def add_many(self, t, emoji, counts):
+        """Adds the counts of several emoji at the same time.
+
+        Args:
+            t (int): Seconds since the epoch
+            emoji (List[str])
+            counts (List[int])
+        """
+        row = self._row(t)
+        ids = get_catalog().ids
+        for c, n in zip(emoji, counts):
+            row[ids[c]] += n
+
+    def buckets(self):
+        """Start times of all buckets in order.
+
+        Returns:
+            List[int]: Seconds since the epoch
+        """
+        return [b * self.resolution for b in sorted(self.rows)]
+
+    def series(self, emoji):
+        """Counts of an emoji in every bucket.
+
+        Args:
+            emoji (str)
+
+        Returns:
+            List[tuple]: (bucket start time, count)
+        """
+        eid = get_catalog().ids[emoji]
+        return [(b * self.resolution, self.rows[b][eid]) for b in sorted(self.rows)]
+
+    def table(self):
+        """All buckets as a 2-D table.
+
+        Returns:
+            tuple: Bucket start times and a list of count arrays indexed by emoji id
+        """
+        order = sorted(self.rows)
+        return [b * self.resolution for b in order], [self.rows[b] for b in order]
+
+    def totals(self):
+        """Counts over all buckets.
+
+        Returns:
+            EmojiCounts
+        """
+        totals = EmojiCounts()
+        for row in self.rows.values():
+            merge_arrays(totals.counts, row)
+        return totals
+
+    def rollup(self, resolution):
+        """Counts in wider buckets, e.g. daily from hourly.
+
+        Args:
+            resolution (int): Multiple of the current resolution
+
+        Returns:
+            BucketedEmojiCounts
+        """
+        if resolution % self.resolution:
+            raise ValueError("Resolution must be a multiple of {}".format(self.resolution))
+        rolled = BucketedEmojiCounts(resolution)
+        for b, row in self.rows.items():
+            merge_arrays(rolled._row(b * self.resolution), row)
+        return rolled
+
+    def items(self):
+        """Non-zero counts in long format.
+
+        Returns:
+            List[tuple]: (bucket start time, emoji, count)
+        """
+        emoji = get_catalog().emoji
+        return [
+            (b * self.resolution, emoji[i], n)
+            for b in sorted(self.rows)
+            for i, n in enumerate(self.rows[b])
+            if n
+        ]
+
+    def merge(self, other):
+        """Merges another instance with the same resolution into this one in place.
+
+        Args:
+            other (BucketedEmojiCounts)
+
+        Returns:
+            BucketedEmojiCounts: self
+        """
+        if self.resolution != other.resolution:
+            raise ValueError("Cannot merge counts with different resolutions")
+        for b, row in other.rows.items():
+            if b in self.rows:
+                merge_arrays(self.rows[b], row)
+            else:
+                self.rows[b] = array("q", row)
+        return self
+
+    def __reduce__(self):
+        buckets, lengths, ids, values = array("q"), array("q"), array("H"), array("q")
+        for b, row in self.rows.items():
+            nonzero = [i for i, n in enumerate(row) if n]
+            buckets.append(b)
+            lengths.append(len(nonzero))
+            ids.extend(nonzero)
+            values.extend(row[i] for i in nonzero)
+        return _bucketed_from_sparse, (self.resolution, buckets, lengths, ids, values)
+
+
+def _bucketed_from_sparse(resolution, buckets, lengths, ids, values):
+    """Rebuilds `BucketedEmojiCounts` from the non-zero entries of each bucket.
+
+    Args:
+        resolution (int)
+        buckets (array): Bucket numbers
+        lengths (array): Number of non-zero entries of each bucket
+        ids (array): Emoji ids of the entries, bucket after bucket
+        values (array): Counts of the entries
+
+    Returns:
+        BucketedEmojiCounts
+    """
+    result = BucketedEmojiCounts(resolution)
+    size = len(get_catalog())
+    start = 0
+    for b, length in zip(buckets, lengths):
+        row = result.rows[b] = array("q", bytes(8 * size))
+        for i, n in zip(ids[start:start + length], values[start:start + length]):
+            row[i] = n
+        start += length
+    return result
+
+
+class BucketedEmojiTally(Field):
+
+    """Emoji counts per time bucket."""
+
+    scalable = True
+
+    def __init__(self, resolution=HOUR):
+        """Bucket width used for every value of the field.
+
+        Args:
+            resolution (int, optional): Width of each bucket in seconds
+        """
+        self.resolution = resolution
+
+    def new(self):
+        return BucketedEmojiCounts(self.resolution)
+
+    def merge(self, a, b):
+        return a.merge(b)
+
+    def scale(self, value, factor):
+        for row in value.rows.values():
+            scale_array(row, factor)
+        return value
+
+    def dump(self, value):
+        return [list(item) for item in value.items()]
+
+    def load(self, data):
+        value = self.new()
+        for t, emoji, n in data:
+            value.add(t, emoji, n)
+        return value
+
+
+class TimeTally(Tally):
+
+    """Counts keyed by a time in seconds, e.g. the start of each hour. Json turns
+    the keys into strings, so they are turned back into ints when loaded and
+    results restored from a checkpoint or another node merge with new ones."""
+
+    def load(self, data):
+        return Counts((int(t), n) for t, n in data.items())
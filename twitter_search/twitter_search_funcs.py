@@ -8,7 +8,14 @@ from collections import Counter
 
 from twitter_search.unicode_codes import EMOJI_UNICODE_SET
 
-__all__ = ["find_context", "find_all", "find_all_if", "smoothed_relative_freq", "sum_dicts"]
+__all__ = [
+    "find_context",
+    "find_all",
+    "find_all_if",
+    "smoothed_relative_freq",
+    "sum_dicts",
+    "merge_counts",
+]
 
 
 def _list_clean(tweet):
@@ -183,3 +190,25 @@ def sum_dicts(a, b):
         dict
     """
     return Counter(a) + Counter(b)
+
+
+def merge_counts(a, b):
+    """Merge dictionary b into dictionary a in place, summing their values.
+    Only the keys of b are touched so the cost does not depend on the size of a.
+
+    For example:
+        a = {"x": 1, "y": 1}
+        b = {"x": 1, "z": 1}
+        a becomes {"x": 2, "y": 1, "z": 1}
+
+    Args:
+        a (dict): Accumulator, updated in place
+        b (dict)
+
+    Returns:
+        dict: a
+    """
+    get = a.get
+    for key, val in b.items():
+        a[key] = get(key, 0) + val
+    return a